@@ -0,0 +1,4 @@
+"""
+Benchmark suite timing the git commands covered by the functional tests across repo scales,
+kept separate from tests/ so it never runs as part of the regular pytest run
+"""
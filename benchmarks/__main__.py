@@ -0,0 +1,188 @@
+"""
+Runs the git command benchmark suite, e.g.
+
+    python -m benchmarks --scales small,medium --scenarios status,add --repeat 10 --json out.json
+    python -m benchmarks --scales large --scenarios status --memory-budget status=512
+    python -m benchmarks --scenarios add_large,commit_large,push_large --large-file-size 1024
+    python -m benchmarks --scenarios clone,push --network 3g
+    python -m benchmarks --clone-matrix --scales medium,large
+    python -m benchmarks --history --scales history,deep --history-features none,graph_bloom
+
+Each scenario is timed at each scale on repos built by helpers/repo_generator.py, clone and
+push go over smart-HTTP to the bundled local GitHub stand-in, optionally through a network
+emulator applying one of the profiles of helpers/net_emulator.py (--network). The clone
+scenarios also report the bytes received as metered by the stand-in, the objects and the
+on-disk size of the clone. The history scenarios (--history) time log, rev-list, merge-base,
+branch --contains and status over deep histories, once per commit-graph and multi-pack-index
+variant. The run exits with status 1 if the peak RSS of a scenario exceeds one of its
+--memory-budget limits
+"""
+
+import argparse
+import dataclasses
+import logging
+import os
+import shutil
+import tempfile
+from benchmarks import harness, scenarios
+from helpers import large_files, local_github, net_emulator
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line of the benchmark runner
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scales", default=None,
+                        help=f"Comma separated scales out of: {', '.join(scenarios.SCALES)} "
+                             "(defaults to small, history with --history)")
+    parser.add_argument("--scenarios", default=",".join(scenarios.SCENARIOS),
+                        help="Comma separated scenarios (defaults to all of them)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded runs per scenario")
+    parser.add_argument("--repeat", type=int, default=5, help="Recorded runs per scenario")
+    parser.add_argument("--modified-files", type=int, default=100,
+                        help="Files modified by the add/commit/stash/restore scenarios")
+    parser.add_argument("--work-dir", default=None,
+                        help="Directory for the per-run copies (defaults to a temporary one)")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="Write the results as JSON to this file")
+    parser.add_argument("--large-file-size", type=int, default=256,
+                        help="Size in MB of the file of the add/commit/push_large scenarios")
+    parser.add_argument("--large-file-content", default=large_files.INCOMPRESSIBLE,
+                        choices=large_files.CONTENTS,
+                        help="Content of the file of the *_large scenarios")
+    parser.add_argument("--memory-budget", dest="memory_budgets", action="append", default=[],
+                        metavar="SCENARIO[:SCALE]=MB",
+                        help="Fail if the peak RSS of a scenario exceeds MB (repeatable)")
+    parser.add_argument("--network", default=None, choices=net_emulator.PROFILES,
+                        help="Emulate this network profile between git and the local server")
+    parser.add_argument("--clone-matrix", action="store_true",
+                        help="Run the clone strategies only: "
+                             f"{', '.join(scenarios.CLONE_MATRIX)}")
+    parser.add_argument("--history", action="store_true",
+                        help="Run the history scenarios only: "
+                             f"{', '.join(scenarios.HISTORY_SCENARIOS)}")
+    parser.add_argument("--history-features", default=",".join(scenarios.HISTORY_FEATURES),
+                        help="Comma separated commit-graph/multi-pack-index variants the "
+                             "history scenarios run with (defaults to all of them)")
+    return parser.parse_args()
+
+
+def select_runs(args: argparse.Namespace) -> tuple:
+    """
+    Validates the selected scales, scenarios and history features
+
+    Returns:
+    - (scales, the scenario callables to run by name, history features or None)
+    """
+    scales = (args.scales or ("history" if args.history else "small")).split(",")
+    for scale in scales:
+        if scale not in scenarios.SCALES:
+            raise SystemExit(f"Unknown scale: {scale}")
+    if not args.history:
+        names = list(scenarios.CLONE_MATRIX) if args.clone_matrix else args.scenarios.split(",")
+        for name in names:
+            if name not in scenarios.SCENARIOS:
+                raise SystemExit(f"Unknown scenario: {name}")
+        return scales, {name: scenarios.SCENARIOS[name] for name in names}, None
+
+    features = args.history_features.split(",")
+    for name in features:
+        if name not in scenarios.HISTORY_FEATURES:
+            raise SystemExit(f"Unknown history features: {name}")
+    # Every history scenario once per variant, named e.g. history_log[graph_bloom]
+    runs = {f"{name}[{variant}]": (lambda ctx, scenario=scenario, variant=variant:
+                                     scenario(ctx, variant))
+            for name, scenario in scenarios.HISTORY_SCENARIOS.items()
+            for variant in features}
+    return scales, runs, features
+
+
+def run_scenarios(args: argparse.Namespace, scales: list, runs: dict) -> list:
+    """
+    Measures the scenarios at each scale against a local server, through the network
+    emulator if one was selected
+
+    Returns:
+    - The BenchmarkResult objects, in the order they were measured
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="git_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    harness.isolate_git_config(work_dir)
+    server = local_github.LocalGitHubServer()
+    server.start()
+    emulator = None
+    if args.network:
+        emulator = net_emulator.NetworkEmulator(server.base_url,
+                                                net_emulator.get_profile(args.network))
+        emulator.start()
+        server.public_url = emulator.base_url
+    results = []
+    try:
+        for position, scale in enumerate(scales):
+            ctx = scenarios.BenchContext(scale, work_dir, server, args.modified_files,
+                                         args.large_file_size * 1024 * 1024,
+                                         args.large_file_content)
+            for name, scenario in runs.items():
+                if name in scenarios.SCALE_INDEPENDENT and position > 0:
+                    continue
+                results.append(harness.measure(
+                    name, scale, lambda scenario=scenario, ctx=ctx: scenario(ctx),
+                    args.warmup, args.repeat
+                ))
+    finally:
+        if emulator:
+            emulator.stop()
+        server.stop()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    """
+    Runs the selected scenarios at the selected scales and reports the results
+    """
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    scales, runs, features = select_runs(args)
+    try:
+        budgets = [harness.parse_memory_budget(budget) for budget in args.memory_budgets]
+    except ValueError as error:
+        raise SystemExit(str(error)) from error
+
+    results = run_scenarios(args, scales, runs)
+
+    print(harness.format_table(results))
+    clone_table = harness.format_clone_table(results)
+    if clone_table:
+        print()
+        print(clone_table)
+    if args.json_path:
+        harness.write_json(args.json_path, results, {
+            "scales": {scale: dataclasses.asdict(scenarios.SCALES[scale]) for scale in scales},
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "scenarios": list(runs),
+            "modified_files": args.modified_files,
+            "large_file_size": args.large_file_size,
+            "large_file_content": args.large_file_content,
+            "memory_budgets": args.memory_budgets,
+            "network": args.network,
+            "network_profile": (dataclasses.asdict(net_emulator.get_profile(args.network))
+                                if args.network else None),
+            "history_features": ({name: scenarios.HISTORY_FEATURES[name][0] for name in features}
+                                 if features else None),
+        })
+
+    violations = harness.check_memory_budgets(results, budgets)
+    for violation in violations:
+        logging.error(violation)
+    if violations:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
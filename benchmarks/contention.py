@@ -0,0 +1,312 @@
+"""
+Push contention stress test: N clients, each with a clone of its own, push to the same bare
+remote on the local GitHub stand-in at a controlled rate. Some clients push to a branch of
+their own, the others race on the default branch and fetch, rebase and retry when they are
+rejected. Reports the push throughput, the p50/p99 latency of the push attempts, the rate of
+ref lock and stale (non-fast-forward) rejections and the time from the first attempt to a
+successful push, as the number of clients grows, e.g.
+
+    python -m benchmarks.contention --clients 1,2,4,8,16 --pushes 20 --rate 2
+"""
+
+import argparse
+import dataclasses
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import config
+from benchmarks import harness
+from helpers import local_github
+
+# Kinds of push rejections, told apart by the messages of git
+LOCK = "lock"
+STALE = "stale"
+LOCK_MESSAGES = ("cannot lock ref", "failed to lock", "unable to lock", "failed to update ref")
+STALE_MESSAGES = ("fetch first", "non-fast-forward", "stale info", "[rejected]")
+
+
+@dataclasses.dataclass
+class ContentionResult:
+    """
+    The pushes of one run with a given number of clients
+
+    Attributes:
+    - clients: Number of concurrent clients
+    - duration: Wall time of the run in seconds
+    - pushes: Successful pushes
+    - latencies: Duration in seconds of every push attempt, rejected ones included
+    - retry_times: Time in seconds from the first attempt to the successful push, for the
+      pushes that needed more than one attempt
+    - rejections: Number of rejected attempts by kind (LOCK, STALE)
+    - failures: Pushes that did not succeed within the retries, or failed otherwise
+    """
+    clients: int
+    duration: float = 0
+    pushes: int = 0
+    latencies: list = dataclasses.field(default_factory=list)
+    retry_times: list = dataclasses.field(default_factory=list)
+    rejections: dict = dataclasses.field(default_factory=lambda: {LOCK: 0, STALE: 0})
+    failures: int = 0
+
+    @property
+    def attempts(self) -> int:
+        """Push attempts, rejected ones included"""
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Successful pushes per second"""
+        return self.pushes / self.duration if self.duration else 0
+
+    def rejection_rate(self, kind: str) -> float:
+        """Share of the attempts rejected for the given reason"""
+        return self.rejections[kind] / self.attempts if self.attempts else 0
+
+    def to_dict(self) -> dict:
+        """
+        Returns the machine-readable representation of the result
+        """
+        return {
+            **dataclasses.asdict(self),
+            "attempts": self.attempts,
+            "throughput": self.throughput,
+            "latency_p50": harness.percentile(self.latencies, 50) if self.latencies else None,
+            "latency_p99": harness.percentile(self.latencies, 99) if self.latencies else None,
+            "retry_p50": harness.percentile(self.retry_times, 50) if self.retry_times else None,
+            "retry_p99": harness.percentile(self.retry_times, 99) if self.retry_times else None,
+        }
+
+
+def classify_rejection(stderr: str) -> str:
+    """
+    Returns the kind of a push rejection (LOCK or STALE), None for any other error
+    """
+    if any(message in stderr for message in LOCK_MESSAGES):
+        return LOCK
+    if any(message in stderr for message in STALE_MESSAGES):
+        return STALE
+    return None
+
+
+def _git(command: list, cwd: str) -> subprocess.CompletedProcess:
+    return subprocess.run(['git', *command], cwd=cwd, capture_output=True, text=True)
+
+
+class _Client:
+    """
+    A clone pushing commits to a branch of the remote
+    """
+
+    def __init__(self, index: int, path: str, branch: str, result: ContentionResult,
+                 lock: threading.Lock, max_retries: int):
+        self.index = index
+        self.path = path
+        self.branch = branch
+        self.result = result
+        self.lock = lock
+        self.max_retries = max_retries
+
+    def commit(self, number: int):
+        """
+        Commits the given push number to the clone
+        """
+        # Every client appends to a file of its own, so rebasing onto the others never conflicts
+        with open(os.path.join(self.path, f"client-{self.index}.txt"), 'a',
+                  encoding='utf-8') as f:
+            f.write(f"push {number}\n")
+        _git(['add', '-A'], self.path)
+        _git(['commit', '--quiet', '-m', f"client {self.index} push {number}"], self.path)
+
+    def push(self):
+        """
+        Pushes the current commit, fetching, rebasing and retrying when it is rejected
+        """
+        first_attempt = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            result = _git(['push', '--quiet', 'origin', f"HEAD:refs/heads/{self.branch}"],
+                          self.path)
+            end = time.perf_counter()
+            kind = classify_rejection(result.stderr) if result.returncode else None
+            with self.lock:
+                self.result.latencies.append(end - start)
+                if result.returncode == 0:
+                    self.result.pushes += 1
+                    if attempt:
+                        self.result.retry_times.append(end - first_attempt)
+                    return
+                if kind is None:
+                    self.result.failures += 1
+                    logging.error(f"Client {self.index} push failed: {result.stderr}")
+                    return
+                self.result.rejections[kind] += 1
+            if kind == STALE:
+                pull = _git(['pull', '--quiet', '--rebase', 'origin', self.branch], self.path)
+                if pull.returncode:
+                    # Leaves the clone usable for the next push if the rebase stopped halfway
+                    _git(['rebase', '--abort'], self.path)
+                    with self.lock:
+                        self.result.failures += 1
+                    logging.error(f"Client {self.index} could not pull: {pull.stderr}")
+                    return
+        with self.lock:
+            self.result.failures += 1
+        logging.error(f"Client {self.index} gave up after {self.max_retries} retries")
+
+    def run(self, pushes: int, rate: float, start: float):
+        """
+        Commits and pushes the given number of times, starting the pushes at the given rate
+        (per second, 0 for back to back) from the start time
+        """
+        for number in range(pushes):
+            if rate:
+                delay = start + number / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.commit(number)
+            self.push()
+
+
+def run(server: local_github.LocalGitHubServer, work_dir: str, clients: int, pushes: int,
+        shared_fraction: float = 0.5, rate: float = 0, max_retries: int = 20,
+        repo_name: str = None) -> ContentionResult:
+    """
+    Runs the clients concurrently against a new repo on the local stand-in
+
+    Parameters:
+    - server: A running local_github.LocalGitHubServer
+    - work_dir: The directory the clones are created in
+    - clients: Number of concurrent clients
+    - pushes: Number of pushes of every client
+    - shared_fraction: Share of the clients racing on the default branch, the others push to
+      a branch of their own (at least one client races when the fraction is above 0)
+    - rate: Pushes per second of every client, 0 pushes back to back
+    - max_retries: Retries of a rejected push before it counts as a failure
+    - repo_name: The name of the remote repo, derived from the number of clients if None
+
+    Returns:
+    - ContentionResult: The pushes of the run
+    """
+    owner = "stress"
+    repo_name = repo_name or f"contention-{clients}"
+    server.create_repo(owner, repo_name)
+    url = f"{server.public_url or server.base_url}/{owner}/{repo_name}.git"
+
+    seed = os.path.join(work_dir, f"{repo_name}-seed")
+    subprocess.run(['git', 'init', '--quiet', f'--initial-branch={config.DEFAULT_BRANCH}', seed],
+                   check=True)
+    subprocess.run(['git', 'commit', '--quiet', '--allow-empty', '-m', "initial commit"],
+                   cwd=seed, check=True)
+    subprocess.run(['git', 'push', '--quiet', url, config.DEFAULT_BRANCH], cwd=seed, check=True)
+
+    shared = round(clients * shared_fraction)
+    if shared_fraction and not shared:
+        shared = 1
+    result = ContentionResult(clients)
+    lock = threading.Lock()
+    workers = []
+    for index in range(clients):
+        path = os.path.join(work_dir, f"{repo_name}-client-{index}")
+        subprocess.run(['git', 'clone', '--quiet', url, path], check=True)
+        branch = config.DEFAULT_BRANCH if index < shared else f"client-{index}"
+        workers.append(_Client(index, path, branch, result, lock, max_retries))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker.run, args=(pushes, rate, start), daemon=True)
+               for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.duration = time.perf_counter() - start
+    logging.info(
+        f"{clients} clients: {result.pushes} pushes in {result.duration:.2f}s, "
+        f"{result.rejections[LOCK]} lock and {result.rejections[STALE]} stale rejections, "
+        f"{result.failures} failures"
+    )
+    return result
+
+
+def format_table(results: list) -> str:
+    """
+    Formats the results as a human-readable table with latencies in milliseconds
+    """
+    lines = [f"{'clients':>7} {'pushes':>7} {'push/s':>8} {'p50':>9} {'p99':>9} {'lock %':>7} "
+             f"{'stale %':>8} {'retry p50':>10} {'retry p99':>10} {'failed':>7}"]
+    for result in results:
+        summary = result.to_dict()
+        retry_p50 = (f"{summary['retry_p50'] * 1000:>10.1f}" if summary['retry_p50'] is not None
+                     else f"{'-':>10}")
+        retry_p99 = (f"{summary['retry_p99'] * 1000:>10.1f}" if summary['retry_p99'] is not None
+                     else f"{'-':>10}")
+        lines.append(
+            f"{result.clients:>7} {result.pushes:>7} {result.throughput:>8.2f} "
+            f"{(summary['latency_p50'] or 0) * 1000:>9.1f} "
+            f"{(summary['latency_p99'] or 0) * 1000:>9.1f} "
+            f"{result.rejection_rate(LOCK) * 100:>7.1f} {result.rejection_rate(STALE) * 100:>8.1f} "
+            f"{retry_p50} {retry_p99} {result.failures:>7}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line options
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.contention",
+                                     description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--clients", default="1,2,4,8",
+                        help="Comma-separated numbers of concurrent clients, one run each")
+    parser.add_argument("--pushes", type=int, default=10, help="Pushes of every client")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Pushes per second of every client, 0 pushes back to back")
+    parser.add_argument("--shared-fraction", type=float, default=0.5,
+                        help="Share of the clients racing on the default branch")
+    parser.add_argument("--max-retries", type=int, default=20,
+                        help="Retries of a rejected push before it counts as failed")
+    parser.add_argument("--work-dir", default=None,
+                        help="Keep the clones in this directory instead of a temporary one")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="Write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    """
+    Runs the stress test with every number of clients and reports the results
+    """
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="git_contention_")
+    os.makedirs(work_dir, exist_ok=True)
+    harness.isolate_git_config(work_dir)
+    server = local_github.LocalGitHubServer()
+    server.start()
+    try:
+        results = [run(server, work_dir, int(clients), args.pushes, args.shared_fraction,
+                       args.rate, args.max_retries)
+                   for clients in args.clients.split(",")]
+    finally:
+        server.stop()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(format_table(results))
+    if args.json_path:
+        harness.write_json(args.json_path, results, {
+            "clients": args.clients,
+            "pushes": args.pushes,
+            "rate": args.rate,
+            "shared_fraction": args.shared_fraction,
+            "max_retries": args.max_retries,
+        })
+    if any(result.failures for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
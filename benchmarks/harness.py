@@ -0,0 +1,307 @@
+"""
+This module provides the measurement harness of the benchmark suite: it runs a command a
+number of times after a warmup, times only the command itself (not the per-run setup) and
+summarizes the samples as min/median/p95/mean, along with the peak memory, page faults and
+block I/O of the command, which memory budgets can be checked against
+"""
+
+import collections
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+from helpers import command_metrics, common
+
+# A single measured run: the shell command to time, the directory to run it in, the paths to
+# remove once it has been measured, the number of bytes it processes (for throughput) and a
+# callable returning scenario-specific metrics of the run (e.g. the size of a clone), called
+# after the command and before the cleanup
+Iteration = collections.namedtuple("Iteration", ["command", "cwd", "cleanup", "bytes", "inspect"],
+                                   defaults=[(), 0, None])
+
+# Resource usage of the measured command kept per run
+USAGE_KEYS = ("user", "sys", "max_rss", "minor_faults", "major_faults", "block_in", "block_out")
+
+
+class BenchmarkResult:
+    """
+    Timing samples of one scenario at one scale, with their summary statistics and the
+    resource usage (see command_metrics.record) of every recorded run
+    """
+
+    def __init__(self, scenario: str, scale: str, samples: list, usage: list = None,
+                 size: int = 0, metrics: list = None):
+        self.scenario = scenario
+        self.scale = scale
+        self.samples = samples
+        self.usage = usage or []
+        self.size = size
+        self.metrics = metrics or []
+
+    @property
+    def min(self) -> float:
+        """Fastest run in seconds"""
+        return min(self.samples)
+
+    @property
+    def median(self) -> float:
+        """Median run in seconds"""
+        return statistics.median(self.samples)
+
+    @property
+    def p95(self) -> float:
+        """95th percentile run in seconds (nearest-rank)"""
+        return percentile(self.samples, 95)
+
+    @property
+    def mean(self) -> float:
+        """Mean run in seconds"""
+        return statistics.fmean(self.samples)
+
+    @property
+    def throughput(self) -> float:
+        """Bytes processed per second at the median run, None if the scenario has no size"""
+        return self.size / self.median if self.size else None
+
+    @property
+    def max_rss(self) -> int:
+        """Highest peak RSS of the runs in bytes, None if it could not be measured"""
+        values = [run["max_rss"] for run in self.usage if run["max_rss"] is not None]
+        return max(values) if values else None
+
+    def metric(self, name: str):
+        """Median of a scenario-specific metric over the runs, None if it was not measured"""
+        values = [run[name] for run in self.metrics if run.get(name) is not None]
+        return statistics.median(values) if values else None
+
+    def to_dict(self) -> dict:
+        """
+        Returns the machine-readable representation of the result
+        """
+        return {
+            "scenario": self.scenario,
+            "scale": self.scale,
+            "runs": len(self.samples),
+            "min": self.min,
+            "median": self.median,
+            "p95": self.p95,
+            "mean": self.mean,
+            "max_rss": self.max_rss,
+            "bytes": self.size,
+            "throughput": self.throughput,
+            "samples": self.samples,
+            "usage": self.usage,
+            "metrics": self.metrics,
+        }
+
+
+def percentile(samples: list, pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of the samples
+
+    Parameters:
+    - samples: The measured values
+    - pct: The percentile, from 0 to 100
+    """
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(scenario: str, scale: str, setup, warmup: int, repeat: int) -> BenchmarkResult:
+    """
+    Measures a scenario, the warmup runs are executed but not recorded
+
+    Parameters:
+    - scenario: The name of the scenario
+    - scale: The name of the scale the scenario runs at
+    - setup: Callable returning a fresh Iteration for every run
+    - warmup: The number of unrecorded runs
+    - repeat: The number of recorded runs
+
+    Returns:
+    - BenchmarkResult: The recorded samples
+    """
+    samples, usage, metrics, size = [], [], [], 0
+    for run in range(warmup + repeat):
+        iteration = setup()
+        command_metrics.pop_records()
+        start = time.perf_counter()
+        result = common.run_shell_command(
+            iteration.command, with_errors=True, with_logging=False, cwd=iteration.cwd
+        )
+        elapsed = time.perf_counter() - start
+        entry = command_metrics.pop_records()[-1]
+        assert result.returncode == 0, (
+            f"{scenario} failed with code {result.returncode}: {result.stderr}"
+        )
+        run_metrics = iteration.inspect() if iteration.inspect else None
+        for path in iteration.cleanup:
+            shutil.rmtree(path, ignore_errors=True)
+        if run >= warmup:
+            samples.append(elapsed)
+            size = iteration.bytes
+            usage.append({key: entry[key] for key in USAGE_KEYS})
+            if run_metrics is not None:
+                metrics.append(run_metrics)
+
+    benchmark = BenchmarkResult(scenario, scale, samples, usage, size, metrics)
+    throughput = (f", {command_metrics.megabytes(benchmark.throughput):.1f} MB/s"
+                  if benchmark.throughput else "")
+    logging.info(
+        f"{scenario} [{scale}]: median {benchmark.median * 1000:.1f} ms, "
+        f"p95 {benchmark.p95 * 1000:.1f} ms, min {benchmark.min * 1000:.1f} ms, "
+        f"peak RSS {command_metrics.format_megabytes(benchmark.max_rss)} MB{throughput}"
+    )
+    return benchmark
+
+
+def parse_memory_budget(budget: str) -> tuple:
+    """
+    Parses a memory budget of the form 'scenario[:scale]=MB', e.g. 'status:large=512'
+
+    Returns:
+    - (scenario, scale or None for all scales, limit in bytes)
+    """
+    target, _, limit = budget.partition("=")
+    scenario, _, scale = target.partition(":")
+    try:
+        return scenario, scale or None, int(float(limit) * 1024 * 1024)
+    except ValueError as error:
+        raise ValueError(f"Invalid memory budget '{budget}', expected scenario[:scale]=MB") \
+            from error
+
+
+def check_memory_budgets(results: list, budgets: list) -> list:
+    """
+    Checks the peak RSS of the results against memory budgets
+
+    Parameters:
+    - results: The BenchmarkResult objects
+    - budgets: (scenario, scale or None, limit in bytes) tuples, see parse_memory_budget
+
+    Returns:
+    - A message per result exceeding its budget, or whose peak RSS could not be measured so
+      the budget cannot be checked (empty if all of them stay within)
+    """
+    violations = []
+    for scenario, scale, limit in budgets:
+        for result in results:
+            if result.scenario != scenario or scale not in (None, result.scale):
+                continue
+            if result.max_rss is None:
+                violations.append(
+                    f"{result.scenario} [{result.scale}]: peak RSS not measured (at or below "
+                    f"the runner's own on Linux), the budget of "
+                    f"{command_metrics.megabytes(limit):.1f} MB cannot be checked"
+                )
+            elif result.max_rss > limit:
+                violations.append(
+                    f"{result.scenario} [{result.scale}]: peak RSS "
+                    f"{command_metrics.megabytes(result.max_rss):.1f} MB exceeds the budget of "
+                    f"{command_metrics.megabytes(limit):.1f} MB"
+                )
+    return violations
+
+
+def isolate_git_config(work_dir: str):
+    """
+    Keeps the user's and the system git config from skewing the results
+    """
+    global_config = os.path.join(work_dir, "gitconfig")
+    with open(global_config, 'w', encoding='utf-8'):
+        pass
+    os.environ.update({
+        "GIT_CONFIG_GLOBAL": global_config,
+        "GIT_CONFIG_NOSYSTEM": "1",
+        "GIT_AUTHOR_NAME": "Benchmark",
+        "GIT_AUTHOR_EMAIL": "benchmark@localhost",
+        "GIT_COMMITTER_NAME": "Benchmark",
+        "GIT_COMMITTER_EMAIL": "benchmark@localhost",
+    })
+
+
+def environment() -> dict:
+    """
+    Describes the machine and git build the benchmarks ran on
+    """
+    git_version = subprocess.run(['git', '--version'], capture_output=True, text=True)
+    return {
+        "git": git_version.stdout.strip(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_json(path: str, results: list, settings: dict):
+    """
+    Writes the results with the environment and settings they were produced with
+
+    Parameters:
+    - path: The output file
+    - results: The results, e.g. BenchmarkResult objects (anything with a to_dict method)
+    - settings: The settings of the run (scales, warmup, repeat, ...)
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "environment": environment(),
+            "settings": settings,
+            "results": [result.to_dict() for result in results],
+        }, f, indent=2)
+
+
+def format_table(results: list) -> str:
+    """
+    Formats the results as a human-readable table with timings in milliseconds, the peak RSS
+    in megabytes and the throughput in MB/s of the scenarios processing a known size
+    """
+    width = max([20, *(len(result.scenario) for result in results)])
+    lines = [f"{'scenario':<{width}} {'scale':<10} {'runs':>5} {'min':>10} {'median':>10} "
+             f"{'p95':>10} {'rss (MB)':>9} {'MB/s':>9}"]
+    for result in results:
+        throughput = (f"{command_metrics.megabytes(result.throughput):>9.1f}"
+                      if result.throughput else f"{'-':>9}")
+        lines.append(
+            f"{result.scenario:<{width}} {result.scale:<10} {len(result.samples):>5} "
+            f"{result.min * 1000:>10.1f} {result.median * 1000:>10.1f} {result.p95 * 1000:>10.1f} "
+            f"{command_metrics.format_megabytes(result.max_rss, 9)} {throughput}"
+        )
+    return "\n".join(lines)
+
+
+def directory_size(path: str) -> int:
+    """
+    Returns the total size in bytes of the files under a directory (symlinks not followed)
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.lstat(os.path.join(root, name)).st_size
+    return total
+
+
+def format_clone_table(results: list) -> str:
+    """
+    Formats the transfer and size metrics of the clone scenarios: the median megabytes sent
+    by the server, HTTP requests, objects received and on-disk size of the clone (working tree
+    included)
+    """
+    lines = [f"{'scenario':<20} {'scale':<10} {'median':>10} {'received (MB)':>14} "
+             f"{'requests':>9} {'objects':>10} {'disk (MB)':>10}"]
+    for result in results:
+        if result.metric("received") is None:
+            continue
+        lines.append(
+            f"{result.scenario:<20} {result.scale:<10} {result.median * 1000:>10.1f} "
+            f"{command_metrics.megabytes(result.metric('received')):>14.2f} "
+            f"{result.metric('requests'):>9.0f} "
+            f"{result.metric('objects'):>10.0f} "
+            f"{command_metrics.megabytes(result.metric('disk_size')):>10.1f}"
+        )
+    return "\n".join(lines) if len(lines) > 1 else ""
@@ -0,0 +1,466 @@
+"""
+Read-side load generator: many CI agents cloning and fetching a generated repo from the local
+GitHub stand-in at once. Operations arrive open-loop at --rate per second (Poisson arrivals,
+served by at most --concurrency agents, the latency includes the time an arrival waited for
+an agent), or closed-loop with --rate 0 (--concurrency agents back to back). A share of them
+are incremental fetches into copies of the repo that are --fetch-behind commits behind. The
+stand-in runs in a process of its own, so its CPU time and memory (git http-backend and the
+upload-pack processes it spawns included) are sampled apart from the clients'. Reports the
+sustained ops/s, a latency histogram per operation and the server CPU and memory over time,
+e.g.
+
+    python -m benchmarks.load --scale medium --rate 4 --concurrency 8 --duration 60
+"""
+
+import argparse
+import bisect
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import config
+from benchmarks import harness, scenarios
+from helpers import local_github, repo_generator
+
+CLONE = "clone"
+FETCH = "fetch"
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last one is open
+HISTOGRAM_BUCKETS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000)
+
+
+class ProcessTreeSampler:
+    """
+    Samples the CPU time and resident memory of a process and all its descendants from /proc
+    on a background thread (Linux only, no samples are taken elsewhere)
+    """
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if self.available else 0
+        self._ticks = os.sysconf("SC_CLK_TCK") if self.available else 1
+
+    @staticmethod
+    def _stat(pid: str) -> list:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as f:
+            # The command name may contain spaces, the fields after it do not
+            return f.read().rsplit(")", 1)[1].split()
+
+    def measure(self) -> tuple:
+        """
+        Returns the CPU seconds (the reaped children's included) and the resident bytes of the
+        process tree
+        """
+        stats = {}
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                stats[int(pid)] = self._stat(pid)
+            except (OSError, IndexError):
+                continue
+        tree = {self.pid}
+        # Fields are numbered from the state (field 3 of stat): ppid 4, utime 14, stime 15,
+        # cutime 16, cstime 17, rss 24
+        changed = True
+        while changed:
+            changed = False
+            for pid, fields in stats.items():
+                if pid not in tree and int(fields[1]) in tree:
+                    tree.add(pid)
+                    changed = True
+        cpu = rss = 0
+        for pid in tree:
+            fields = stats.get(pid)
+            if fields is None:
+                continue
+            cpu += sum(int(value) for value in fields[11:15])
+            rss += int(fields[21]) * self._page_size
+        return cpu / self._ticks, rss
+
+    def _run(self):
+        start = time.perf_counter()
+        last_time, last_cpu = start, self.measure()[0]
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                cpu, rss = self.measure()
+            except OSError:
+                return
+            self.samples.append({
+                "time": now - start,
+                "cpu_percent": (cpu - last_cpu) / (now - last_time) * 100,
+                "rss": rss,
+            })
+            last_time, last_cpu = now, cpu
+
+    def start(self):
+        """
+        Starts sampling
+        """
+        if self.available:
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def _serve(repo_root: str, connection):
+    # Runs the stand-in in a process of its own until the parent sends anything
+    server = local_github.LocalGitHubServer(repo_root=repo_root)
+    server.start()
+    connection.send(server.base_url)
+    connection.recv()
+    server.stop()
+
+
+class LoadResult:
+    """
+    The operations of a load run with the server samples taken meanwhile
+    """
+
+    def __init__(self, operations: list, duration: float, samples: list):
+        """
+        Parameters:
+        - operations: Dicts with the kind, arrival (seconds since the start), start and end
+          times of every operation, and whether it succeeded
+        - duration: Wall time of the run in seconds
+        - samples: The ProcessTreeSampler samples of the server
+        """
+        self.operations = operations
+        self.duration = duration
+        self.samples = samples
+
+    def latencies(self, kind: str = None) -> list:
+        """Latencies in seconds from arrival to completion of the successful operations"""
+        return [op["end"] - op["arrival"] for op in self.operations
+                if op["ok"] and kind in (None, op["kind"])]
+
+    @property
+    def failures(self) -> int:
+        """Number of failed operations"""
+        return sum(1 for op in self.operations if not op["ok"])
+
+    @property
+    def throughput(self) -> float:
+        """Successful operations per second over the run"""
+        return len(self.latencies()) / self.duration if self.duration else 0
+
+    def timeline(self, interval: float) -> list:
+        """
+        Returns the completed operations per second in every interval of the run, aligned on
+        the server samples when there are some
+        """
+        buckets = int(self.duration // interval) + 1
+        counts = [0] * buckets
+        for op in self.operations:
+            if op["ok"]:
+                counts[min(int(op["end"] // interval), buckets - 1)] += 1
+        return [count / interval for count in counts]
+
+    def to_dict(self) -> dict:
+        """
+        Returns the machine-readable representation of the result
+        """
+        summary = {"duration": self.duration, "throughput": self.throughput,
+                   "failures": self.failures, "server_samples": self.samples}
+        for kind in (CLONE, FETCH):
+            latencies = self.latencies(kind)
+            summary[kind] = {
+                "count": len(latencies),
+                "histogram": histogram(latencies),
+                **({f"p{pct}": harness.percentile(latencies, pct) for pct in (50, 90, 99)}
+                   if latencies else {}),
+            }
+        return summary
+
+
+def histogram(latencies: list) -> dict:
+    """
+    Returns the number of latencies per HISTOGRAM_BUCKETS bucket, keyed by its upper bound in
+    milliseconds ('+inf' for the open one)
+    """
+    counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(HISTOGRAM_BUCKETS, latency * 1000)] += 1
+    return {str(bound): count for bound, count in zip((*HISTOGRAM_BUCKETS, "+inf"), counts)}
+
+
+class _Agent:
+    """
+    A CI agent running clone and fetch operations with scratch directories of its own
+    """
+
+    def __init__(self, index: int, work_dir: str, url: str, stale_repo: str,
+                 clone_options: str):
+        self.index = index
+        self.work_dir = work_dir
+        self.url = url
+        self.stale_repo = stale_repo
+        self.clone_options = clone_options.split()
+        self._runs = 0
+        self._fetch_copy = None
+
+    def _path(self, kind: str) -> str:
+        self._runs += 1
+        return os.path.join(self.work_dir, f"agent-{self.index}-{kind}-{self._runs}")
+
+    def prepare(self):
+        """
+        Prepares the next fetch copy ahead of the operation, so it is not timed
+        """
+        if self._fetch_copy is None:
+            self._fetch_copy = self._path(FETCH)
+            subprocess.run(['git', 'clone', '--quiet', '--bare', '--local', self.stale_repo,
+                            self._fetch_copy], check=True, capture_output=True)
+
+    def run(self, kind: str) -> tuple:
+        """
+        Runs one operation
+
+        Returns:
+        - (start, end, succeeded), times from time.perf_counter
+        """
+        if kind == CLONE:
+            path = self._path(CLONE)
+            command = ['git', 'clone', '--quiet', *self.clone_options, self.url, path]
+        else:
+            self.prepare()
+            path, self._fetch_copy = self._fetch_copy, None
+            command = ['git', '-C', path, 'fetch', '--quiet', self.url,
+                       '+refs/heads/*:refs/remotes/origin/*']
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True)
+        end = time.perf_counter()
+        if result.returncode:
+            logging.error(f"Agent {self.index} {kind} failed: {result.stderr}")
+        shutil.rmtree(path, ignore_errors=True)
+        return start, end, result.returncode == 0
+
+
+def make_stale_repo(source: str, path: str, behind: int) -> str:
+    """
+    Creates a bare copy of a generated repo whose default branch is the given number of
+    commits behind, without the objects of the newer commits, so fetching it transfers them
+
+    Returns:
+    - The path of the copy
+    """
+    subprocess.run(['git', 'clone', '--quiet', '--bare', '--no-local', '--single-branch',
+                    '--no-tags', source, path], check=True, capture_output=True)
+    subprocess.run(['git', '-C', path, 'update-ref', f'refs/heads/{config.DEFAULT_BRANCH}',
+                    f'{config.DEFAULT_BRANCH}~{behind}'], check=True, capture_output=True)
+    subprocess.run(['git', '-C', path, 'gc', '--quiet', '--prune=now'],
+                   check=True, capture_output=True)
+    return path
+
+
+def run_load(url: str, work_dir: str, stale_repo: str, duration: float, concurrency: int,
+             rate: float = 0, fetch_ratio: float = 0.5, clone_options: str = "--no-checkout",
+             seed: int = 0) -> tuple:
+    """
+    Runs clone and fetch operations against a URL for a duration
+
+    Parameters:
+    - url: The smart-HTTP URL of the repo
+    - work_dir: The directory the scratch clones are created in
+    - stale_repo: The repo the fetch copies are made from (see make_stale_repo)
+    - duration: How long operations arrive, in seconds
+    - concurrency: Number of agents, i.e. the most operations in flight
+    - rate: Open-loop arrivals per second, 0 runs the agents closed-loop (back to back)
+    - fetch_ratio: Share of the operations that are fetches
+    - clone_options: Options of the clones
+    - seed: Seed of the arrivals and of the choice of operations
+
+    Returns:
+    - (operations, duration), see LoadResult. The duration is at least the requested one, and
+      longer when operations were still in flight at its end
+    """
+    randomizer = random.Random(seed)
+    agents = [_Agent(index, work_dir, url, stale_repo, clone_options)
+              for index in range(concurrency)]
+    arrivals = queue.Queue()
+    operations = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def work(agent: _Agent):
+        while True:
+            agent.prepare()
+            if rate:
+                arrival = arrivals.get()
+                if arrival is None:
+                    return
+                arrival, kind = arrival
+            else:
+                if time.perf_counter() - start >= duration:
+                    return
+                with lock:
+                    kind = FETCH if randomizer.random() < fetch_ratio else CLONE
+                arrival = None
+            op_start, op_end, ok = agent.run(kind)
+            with lock:
+                operations.append({
+                    "kind": kind,
+                    "arrival": (arrival if arrival is not None else op_start) - start,
+                    "start": op_start - start,
+                    "end": op_end - start,
+                    "ok": ok,
+                })
+
+    threads = [threading.Thread(target=work, args=(agent,), daemon=True) for agent in agents]
+    for thread in threads:
+        thread.start()
+    if rate:
+        # Arrivals are scheduled on their own clock, whether the agents keep up or not
+        next_arrival = start
+        while True:
+            next_arrival += randomizer.expovariate(rate)
+            if next_arrival - start >= duration:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            arrivals.put((next_arrival, FETCH if randomizer.random() < fetch_ratio else CLONE))
+        # The next arrival would fall after the end, the run still lasts the whole duration so
+        # the throughput is not inflated
+        remaining = start + duration - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        for _ in agents:
+            arrivals.put(None)
+    for thread in threads:
+        thread.join()
+    return operations, time.perf_counter() - start
+
+
+def format_report(result: LoadResult, interval: float) -> str:
+    """
+    Formats the throughput, the latency histogram of every operation and the server CPU and
+    memory timeline of a load run
+    """
+    lines = [f"{len(result.latencies())} operations in {result.duration:.1f}s: "
+             f"{result.throughput:.2f} ops/s, {result.failures} failed", ""]
+    lines.append(f"{'latency (ms)':>14} {CLONE:>8} {FETCH:>8}")
+    histograms = {kind: histogram(result.latencies(kind)) for kind in (CLONE, FETCH)}
+    for bound in histograms[CLONE]:
+        label = f"<= {bound}" if bound != "+inf" else f"> {HISTOGRAM_BUCKETS[-1]}"
+        lines.append(f"{label:>14} {histograms[CLONE][bound]:>8} {histograms[FETCH][bound]:>8}")
+    for pct in (50, 90, 99):
+        values = [f"{harness.percentile(result.latencies(kind), pct) * 1000:>8.1f}"
+                  if result.latencies(kind) else f"{'-':>8}" for kind in (CLONE, FETCH)]
+        lines.append(f"{f'p{pct}':>14} {' '.join(values)}")
+    if result.samples:
+        lines += ["", f"{'time (s)':>9} {'ops/s':>7} {'server cpu %':>13} {'server rss (MB)':>16}"]
+        timeline = result.timeline(interval)
+        for index, sample in enumerate(result.samples):
+            ops = timeline[index] if index < len(timeline) else 0
+            lines.append(f"{sample['time']:>9.1f} {ops:>7.2f} {sample['cpu_percent']:>13.1f} "
+                         f"{sample['rss'] / (1024 * 1024):>16.1f}")
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line options
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load",
+                                     description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--scale", default="small", choices=scenarios.SCALES,
+                        help="Scale of the generated repo")
+    parser.add_argument("--duration", type=float, default=30,
+                        help="How long operations arrive, in seconds")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Number of agents, i.e. the most operations in flight")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Open-loop arrivals per second, 0 runs the agents back to back")
+    parser.add_argument("--fetch-ratio", type=float, default=0.5,
+                        help="Share of the operations that are incremental fetches")
+    parser.add_argument("--fetch-behind", type=int, default=10,
+                        help="Number of commits the fetching agents are behind")
+    parser.add_argument("--clone-options", default="--no-checkout",
+                        help="Options of the clones (the checkout is client-side work)")
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help="Seconds between two samples of the server CPU and memory")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the arrivals")
+    parser.add_argument("--work-dir", default=None,
+                        help="Keep the scratch clones in this directory instead of a temporary one")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="Write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    """
+    Runs the load against a stand-in in a process of its own and reports the results
+    """
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="git_load_")
+    os.makedirs(work_dir, exist_ok=True)
+    harness.isolate_git_config(work_dir)
+    spec = scenarios.SCALES[args.scale]
+    if args.fetch_behind >= spec.commits:
+        raise SystemExit(f"--fetch-behind must be below the {spec.commits} commits of the repo")
+    source = repo_generator.get_generated_repo(spec)
+    repo_root = os.path.join(work_dir, "server")
+    subprocess.run(['git', 'clone', '--quiet', '--bare', '--local', source,
+                    os.path.join(repo_root, "load", f"{args.scale}.git")],
+                   check=True, capture_output=True)
+    stale_repo = make_stale_repo(source, os.path.join(work_dir, "stale.git"), args.fetch_behind)
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(repo_root, child), daemon=True)
+    server.start()
+    url = f"{parent.recv()}/load/{args.scale}.git"
+    sampler = ProcessTreeSampler(server.pid, args.sample_interval)
+    sampler.start()
+    try:
+        operations, duration = run_load(url, work_dir, stale_repo, args.duration,
+                                        args.concurrency, args.rate, args.fetch_ratio,
+                                        args.clone_options, args.seed)
+    finally:
+        sampler.stop()
+        parent.send("stop")
+        server.join()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if not sampler.available:
+        logging.warning("The server CPU and memory are only sampled on Linux")
+
+    result = LoadResult(operations, duration, sampler.samples)
+    print(format_report(result, args.sample_interval))
+    if args.json_path:
+        harness.write_json(args.json_path, [result], {
+            "scale": args.scale,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "fetch_ratio": args.fetch_ratio,
+            "fetch_behind": args.fetch_behind,
+            "clone_options": args.clone_options,
+            "sample_interval": args.sample_interval,
+            "seed": args.seed,
+        })
+    if result.failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
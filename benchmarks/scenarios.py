@@ -0,0 +1,446 @@
+"""
+This module provides the repo scales and the git command scenarios of the benchmark suite.
+Every scenario returns a fresh Iteration per run, so only the git command itself is timed
+"""
+
+import itertools
+import os
+import shutil
+import subprocess
+import config
+from benchmarks.harness import Iteration, directory_size
+from helpers import large_files, local_github, repo_generator
+
+# Repo shapes built with the synthetic generator, from a toy repo to a monorepo-sized tree
+SCALES = {
+    "small": repo_generator.RepoSpec(
+        files=1_000, commits=100, changes_per_commit=10, branches=10, tags=10
+    ),
+    "medium": repo_generator.RepoSpec(
+        files=20_000, commits=1_000, changes_per_commit=20, branches=100, tags=100
+    ),
+    "large": repo_generator.RepoSpec(
+        files=200_000, commits=5_000, changes_per_commit=50, branches=1_000, tags=1_000
+    ),
+    "monorepo": repo_generator.RepoSpec(
+        files=1_000_000, commits=10_000, changes_per_commit=100, branches=5_000, tags=5_000,
+        file_size=512
+    ),
+    # Deep histories over a small tree, for the history scenarios
+    "history": repo_generator.RepoSpec(
+        files=2_000, commits=20_000, changes_per_commit=2, branches=50, tags=50
+    ),
+    "deep": repo_generator.RepoSpec(
+        files=5_000, commits=200_000, changes_per_commit=2, branches=200, tags=200
+    ),
+}
+
+# Commit-graph and multi-pack-index variants of the history scenarios: the config of the copy,
+# the options of `git commit-graph write` (None writes no graph) and whether a multi-pack-index
+# is written. A graph always stores generation numbers, version 1 the topological levels and
+# version 2 the corrected commit dates
+HISTORY_FEATURES = {
+    "none": ({"core.commitGraph": "false", "core.multiPackIndex": "false"}, None, False),
+    "graph_v1": ({"commitGraph.generationVersion": "1", "core.multiPackIndex": "false"},
+                 [], False),
+    "graph_v2": ({"commitGraph.generationVersion": "2", "core.multiPackIndex": "false"},
+                 [], False),
+    "graph_bloom": ({"commitGraph.generationVersion": "2", "core.multiPackIndex": "false"},
+                    ["--changed-paths"], False),
+    "midx": ({"core.commitGraph": "false", "core.multiPackIndex": "true"}, None, True),
+    "all": ({"commitGraph.generationVersion": "2", "core.multiPackIndex": "true"},
+            ["--changed-paths"], True),
+}
+
+# Packs the history copies are split into, so the multi-pack-index has packs to cover
+HISTORY_PACKS = 8
+
+
+class BenchContext:
+    """
+    Everything the scenarios of one scale share: the generated repo, the local server it is
+    published on and a work directory for the per-run copies
+    """
+
+    def __init__(self, scale: str, work_dir: str, server, modified_files: int,
+                 large_file_size: int = 256 * 1024 * 1024,
+                 large_file_content: str = large_files.INCOMPRESSIBLE):
+        """
+        Parameters:
+        - scale: The name of the scale in SCALES
+        - work_dir: The directory the per-run working copies are created in
+        - server: A running local_github.LocalGitHubServer for the clone and push scenarios
+        - modified_files: How many files the add/commit/stash/restore scenarios modify
+        - large_file_size: The size in bytes of the file of the *_large scenarios
+        - large_file_content: The content of that file, one of large_files.CONTENTS
+        """
+        self.scale = scale
+        self.spec = SCALES[scale]
+        self.work_dir = work_dir
+        self.server = server
+        self.owner = "bench"
+        self.modified_files = min(modified_files, self.spec.files)
+        self.source = repo_generator.get_generated_repo(self.spec)
+        self._counter = itertools.count()
+        self._shared_copy = None
+        self._published = None
+        self.large_file_size = large_file_size
+        self.large_file_content = large_file_content
+        self._large_file = None
+        self._history_base = None
+        self._history_copies = {}
+
+    @property
+    def base_url(self) -> str:
+        """The URL git reaches the local server at, through the network emulator if any"""
+        return self.server.public_url or self.server.base_url
+
+    def new_path(self, prefix: str) -> str:
+        """
+        Returns a unique, not yet existing path inside the work directory
+        """
+        return os.path.join(self.work_dir, f"{prefix}-{self.scale}-{next(self._counter)}")
+
+    def working_copy(self) -> str:
+        """
+        Creates a fresh working copy of the generated repo
+        """
+        return repo_generator.clone_generated_repo(self.spec, self.new_path("copy"))
+
+    def shared_working_copy(self) -> str:
+        """
+        Returns a working copy reused by the read-only scenarios
+        """
+        if self._shared_copy is None:
+            self._shared_copy = self.working_copy()
+        return self._shared_copy
+
+    def modify_files(self, repo_path: str):
+        """
+        Appends a line to modified_files files spread evenly over the tree
+        """
+        step = max(self.spec.files // max(self.modified_files, 1), 1)
+        for index in range(0, step * self.modified_files, step):
+            path = os.path.join(repo_path, repo_generator.generated_file_path(self.spec, index))
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write("benchmark change\n")
+
+    def published_url(self) -> str:
+        """
+        Returns the smart-HTTP URL of the generated repo on the local server, publishing it
+        on first use (objects are hardlinked from the generator cache)
+        """
+        if self._published is None:
+            name = f"{self.scale}-source"
+            subprocess.run(['git', 'clone', '--quiet', '--bare', '--local', self.source,
+                            self.server.repo_path(self.owner, name)],
+                           check=True, capture_output=True)
+            self._published = f"{self.base_url}/{self.owner}/{name}.git"
+        return self._published
+
+    def large_file_repo(self, stage: str = None) -> str:
+        """
+        Creates a new repo holding the large file (hardlinked from a copy written once),
+        optionally already staged ('add') or committed ('commit')
+        """
+        if self._large_file is None:
+            self._large_file = large_files.create_file(
+                os.path.join(self.work_dir, f"large-{self.large_file_content}.bin"),
+                self.large_file_size, self.large_file_content
+            )
+        path = self.new_path("large")
+        subprocess.run(['git', 'init', '--quiet', f'--initial-branch={config.DEFAULT_BRANCH}',
+                        path], check=True)
+        os.link(self._large_file, os.path.join(path, "large.bin"))
+        if stage in ("add", "commit"):
+            subprocess.run(['git', 'add', 'large.bin'], cwd=path, check=True)
+        if stage == "commit":
+            subprocess.run(['git', 'commit', '--quiet', '-m', 'large file'], cwd=path, check=True)
+        return path
+
+    def empty_remote_url(self) -> str:
+        """
+        Creates an empty repo on the local server and returns its smart-HTTP URL
+        """
+        name = os.path.basename(self.new_path("remote"))
+        self.server.create_repo(self.owner, name)
+        return f"{self.base_url}/{self.owner}/{name}.git"
+
+    def sparse_directories(self) -> list:
+        """
+        Returns the directories of the sparse clone scenario's cone: a tenth of the top-level
+        directories of the generated repo, at least one
+        """
+        directories = -(-self.spec.files // self.spec.files_per_dir)
+        return [os.path.dirname(repo_generator.generated_file_path(
+            self.spec, index * self.spec.files_per_dir
+        )) for index in range(max(directories // 10, 1))]
+
+    def fetch_stats(self):
+        """
+        Returns the stand-in's fetch counters (local_github.TransferStats) of the published repo
+        """
+        return self.server.transfer_stats(self.owner, f"{self.scale}-source").get(
+            "fetch", local_github.TransferStats()
+        )
+
+    def clone_metrics(self, path: str, fetch_before) -> dict:
+        """
+        Returns the response bytes, pack bytes and requests served by the stand-in, the number
+        of objects and the on-disk size of a clone
+        """
+        fetch = self.fetch_stats() - fetch_before
+        counts = subprocess.run(['git', 'count-objects', '-v'], cwd=path, check=True,
+                                capture_output=True, text=True).stdout
+        values = dict(line.split(": ") for line in counts.splitlines())
+        return {
+            "received": fetch.response_bytes,
+            "pack_bytes": fetch.pack_bytes,
+            "requests": fetch.requests,
+            "objects": int(values["count"]) + int(values["in-pack"]),
+            "disk_size": directory_size(path),
+        }
+
+    def _git(self, path: str, *args: str) -> str:
+        # Runs an untimed setup command of the history scenarios, returning its stripped output
+        return subprocess.run(['git', *args], cwd=path, check=True, capture_output=True,
+                              text=True).stdout.strip()
+
+    def history_base(self) -> str:
+        """
+        Creates once the working copy the history variants are copied from: its objects split
+        into HISTORY_PACKS packs, no commit-graph, and an upstream (origin/<default branch>)
+        diverging from the middle of the history, so status has commits ahead and behind
+        """
+        if self._history_base is None:
+            path = self.new_path("history")
+            subprocess.run(['git', 'clone', '--quiet', '--no-local', self.source, path],
+                           check=True)
+            self._git(path, 'config', 'gc.auto', '0')
+            self._git(path, 'config', 'fetch.writeCommitGraph', 'false')
+            fork = f"HEAD~{self.spec.commits // 2}"
+            upstream = self._git(path, 'commit-tree', f"{fork}^{{tree}}", '-p', fork,
+                                 '-m', "upstream commit")
+            self._git(path, 'update-ref', f"refs/remotes/origin/{config.DEFAULT_BRANCH}",
+                      upstream)
+            counts = dict(line.split(": ") for line in
+                          self._git(path, 'count-objects', '-v').splitlines())
+            size = int(counts["size-pack"]) + int(counts["size"])
+            # git does not split packs below 1 MiB
+            pack_size = max(-(-size // HISTORY_PACKS), 1024)
+            self._git(path, 'repack', '-a', '-d', '-q', f"--max-pack-size={pack_size}k")
+            graph = os.path.join(path, ".git", "objects", "info", "commit-graph")
+            if os.path.exists(graph):
+                os.remove(graph)
+            shutil.rmtree(f"{graph}s", ignore_errors=True)
+            self._history_base = path
+        return self._history_base
+
+    def history_copy(self, features: str) -> str:
+        """
+        Returns a copy of the history base (hardlinked, git replaces the files it rewrites)
+        with the HISTORY_FEATURES variant of the given name written, reused by the history
+        scenarios
+        """
+        if features not in self._history_copies:
+            settings, graph_options, midx = HISTORY_FEATURES[features]
+            base = self.history_base()
+            path = self.new_path(f"history-{features}")
+            shutil.copytree(base, path, copy_function=os.link)
+            for key, value in settings.items():
+                self._git(path, 'config', key, value)
+            if graph_options is not None:
+                self._git(path, 'commit-graph', 'write', '--reachable', *graph_options)
+            if midx:
+                self._git(path, 'multi-pack-index', 'write')
+            self._history_copies[features] = path
+        return self._history_copies[features]
+
+    def history_commit(self, depth: float) -> str:
+        """
+        Returns the id of the commit at the given depth (0 for HEAD, 1 for the root) of the
+        default branch
+        """
+        return self._git(self.history_base(), 'rev-parse',
+                         f"HEAD~{int((self.spec.commits - 1) * depth)}")
+
+
+def _clone(ctx: BenchContext, options: str = "", then: str = "") -> Iteration:
+    # A clone of the published repo with the given options, followed by an optional command
+    # run in the clone, both timed
+    url = ctx.published_url()
+    path = ctx.new_path("clone")
+    fetch_before = ctx.fetch_stats()
+    command = " ".join(["git clone --quiet", *options.split(), url, f'"{path}"'])
+    if then:
+        command += f' && cd "{path}" && {then}'
+    return Iteration(command, ctx.work_dir, (path,),
+                     inspect=lambda: ctx.clone_metrics(path, fetch_before))
+
+
+def init(ctx: BenchContext) -> Iteration:
+    """git init of a new repo, independent of the scale"""
+    path = ctx.new_path("init")
+    return Iteration(f'git init --quiet "{path}"', ctx.work_dir, (path,))
+
+
+def add(ctx: BenchContext) -> Iteration:
+    """git add of the modified files"""
+    path = ctx.working_copy()
+    ctx.modify_files(path)
+    return Iteration('git add -A', path, (path,))
+
+
+def commit(ctx: BenchContext) -> Iteration:
+    """git commit of the staged modified files"""
+    path = ctx.working_copy()
+    ctx.modify_files(path)
+    subprocess.run(['git', 'add', '-A'], cwd=path, check=True)
+    return Iteration('git commit --quiet -m "benchmark commit"', path, (path,))
+
+
+def status(ctx: BenchContext) -> Iteration:
+    """git status of a clean working copy"""
+    return Iteration('git status --porcelain', ctx.shared_working_copy())
+
+
+def branch(ctx: BenchContext) -> Iteration:
+    """git branch listing of all the branches"""
+    return Iteration('git branch --list', ctx.shared_working_copy())
+
+
+def stash(ctx: BenchContext) -> Iteration:
+    """git stash of the modified files"""
+    path = ctx.working_copy()
+    ctx.modify_files(path)
+    return Iteration('git stash --quiet', path, (path,))
+
+
+def restore(ctx: BenchContext) -> Iteration:
+    """git restore discarding the modified files"""
+    path = ctx.working_copy()
+    ctx.modify_files(path)
+    return Iteration('git restore .', path, (path,))
+
+
+def clone(ctx: BenchContext) -> Iteration:
+    """git clone of the generated repo over smart-HTTP from the local server"""
+    return _clone(ctx)
+
+
+def clone_shallow(ctx: BenchContext) -> Iteration:
+    """git clone --depth 1, only the latest commit"""
+    return _clone(ctx, "--depth 1")
+
+
+def clone_blobless(ctx: BenchContext) -> Iteration:
+    """git clone --filter=blob:none, the blobs of the checkout are fetched on demand"""
+    return _clone(ctx, "--filter=blob:none")
+
+
+def clone_treeless(ctx: BenchContext) -> Iteration:
+    """git clone --filter=tree:0, the trees and blobs of the checkout are fetched on demand"""
+    return _clone(ctx, "--filter=tree:0")
+
+
+def clone_sparse(ctx: BenchContext) -> Iteration:
+    """blobless git clone --sparse checking out a cone of a tenth of the directories"""
+    directories = " ".join(ctx.sparse_directories())
+    return _clone(ctx, "--filter=blob:none --sparse",
+                  f"git sparse-checkout set --cone {directories}")
+
+
+def push(ctx: BenchContext) -> Iteration:
+    """git push of the whole history to an empty repo on the local server"""
+    path = ctx.working_copy()
+    url = ctx.empty_remote_url()
+    return Iteration(f'git push --quiet {url} {config.DEFAULT_BRANCH}', path, (path,))
+
+
+def add_large(ctx: BenchContext) -> Iteration:
+    """git add of a single large file, throughput in MB/s of the file"""
+    path = ctx.large_file_repo()
+    return Iteration('git add large.bin', path, (path,), ctx.large_file_size)
+
+
+def commit_large(ctx: BenchContext) -> Iteration:
+    """git add and commit of a large file, timed together as the blob is written by add"""
+    path = ctx.large_file_repo()
+    return Iteration('git add large.bin && git commit --quiet -m "large file"', path, (path,),
+                     ctx.large_file_size)
+
+
+def push_large(ctx: BenchContext) -> Iteration:
+    """git push of a commit with a large file to an empty repo on the local server"""
+    path = ctx.large_file_repo("commit")
+    url = ctx.empty_remote_url()
+    return Iteration(f'git push --quiet {url} {config.DEFAULT_BRANCH}', path, (path,),
+                     ctx.large_file_size)
+
+
+def history_log(ctx: BenchContext, features: str) -> Iteration:
+    """git log of the latest 100 commits in topological order"""
+    return Iteration('git log --oneline --topo-order -n 100', ctx.history_copy(features))
+
+
+def history_log_path(ctx: BenchContext, features: str) -> Iteration:
+    """git log of the commits changing one file, over the whole history"""
+    path = repo_generator.generated_file_path(ctx.spec, 0)
+    return Iteration(f'git log --format=%h -- "{path}"', ctx.history_copy(features))
+
+
+def history_rev_list(ctx: BenchContext, features: str) -> Iteration:
+    """git rev-list --count of the whole history"""
+    return Iteration('git rev-list --count HEAD', ctx.history_copy(features))
+
+
+def history_merge_base(ctx: BenchContext, features: str) -> Iteration:
+    """git merge-base of HEAD and its upstream, forked in the middle of the history"""
+    return Iteration(f'git merge-base --all HEAD origin/{config.DEFAULT_BRANCH}',
+                     ctx.history_copy(features))
+
+
+def history_contains(ctx: BenchContext, features: str) -> Iteration:
+    """git branch --contains of a commit near the root, over the local and remote branches"""
+    commit_id = ctx.history_commit(0.9)
+    return Iteration(f'git branch -a --contains {commit_id}', ctx.history_copy(features))
+
+
+def history_status(ctx: BenchContext, features: str) -> Iteration:
+    """git status counting the commits ahead and behind the upstream"""
+    return Iteration('git status --ahead-behind', ctx.history_copy(features))
+
+
+# Scenarios by name, in the order they run; scale independent ones only run at the first scale
+SCENARIOS = {
+    "init": init,
+    "add": add,
+    "commit": commit,
+    "status": status,
+    "branch": branch,
+    "stash": stash,
+    "restore": restore,
+    "clone": clone,
+    "clone_shallow": clone_shallow,
+    "clone_blobless": clone_blobless,
+    "clone_treeless": clone_treeless,
+    "clone_sparse": clone_sparse,
+    "push": push,
+    "add_large": add_large,
+    "commit_large": commit_large,
+    "push_large": push_large,
+}
+SCALE_INDEPENDENT = {"init", "add_large", "commit_large", "push_large"}
+
+# The clone strategies compared by --clone-matrix, their transfers are metered by the stand-in
+CLONE_MATRIX = ("clone", "clone_shallow", "clone_blobless", "clone_treeless", "clone_sparse")
+
+# History scenarios by name, run by --history with every HISTORY_FEATURES variant
+HISTORY_SCENARIOS = {
+    "history_log": history_log,
+    "history_log_path": history_log_path,
+    "history_rev_list": history_rev_list,
+    "history_merge_base": history_merge_base,
+    "history_contains": history_contains,
+    "history_status": history_status,
+}
@@ -5,10 +5,68 @@ for the time being they are not environment specific but can be further extended
 
 import os
 
-GH_URL = "https://github.com"
-GH_API_URL = "https://api.github.com"
+# Serve the API and git transport from a bundled local stand-in instead of github.com,
+# GH_URL and GH_API_URL are pointed at it once the session starts it
+GH_LOCAL_SERVER = os.getenv("GH_LOCAL_SERVER", "").lower() in ("1", "true", "yes")
+
+GH_URL = os.getenv("GH_URL", "https://github.com")
+GH_API_URL = os.getenv("GH_API_URL", "https://api.github.com")
 DEFAULT_BRANCH = "main"
 TEST_FILE_NAME = "README.md"
-GH_USERNAME = os.getenv("GH_USERNAME")
-GH_TOKEN = os.getenv("GH_TOKEN")
-GH_EMAIL = os.getenv("GH_EMAIL")
+GH_USERNAME = os.getenv("GH_USERNAME", "local-user" if GH_LOCAL_SERVER else None)
+GH_TOKEN = os.getenv("GH_TOKEN", "local-token" if GH_LOCAL_SERVER else None)
+GH_EMAIL = os.getenv("GH_EMAIL", "local-user@localhost" if GH_LOCAL_SERVER else None)
+
+# Number of remote repos each test session (i.e. each xdist worker) provisions upfront and
+# reuses across tests, 0 falls back to creating and deleting a repo around every test
+REPO_POOL_SIZE = int(os.getenv("REPO_POOL_SIZE", "4"))
+
+# Connection pool size and transport-level retry count of the shared GitHub API session
+GH_API_POOL_SIZE = int(os.getenv("GH_API_POOL_SIZE", "10"))
+GH_API_RETRIES = int(os.getenv("GH_API_RETRIES", "3"))
+
+# Number of API calls the batch helpers (create/delete many repos) run concurrently
+GH_API_CONCURRENCY = int(os.getenv("GH_API_CONCURRENCY", "8"))
+
+# Rate limit governor shared by all API calls: requests per second across all xdist workers
+# (0 disables pacing, the default against the local stand-in), burst size, remaining quota
+# below which requests are spread until the quota resets, and how often a rate limited call
+# is retried after backing off
+GH_API_RATE = float(os.getenv("GH_API_RATE", "0" if GH_LOCAL_SERVER else "10"))
+GH_API_BURST = int(os.getenv("GH_API_BURST", "10"))
+GH_API_RATE_LOW_WATER = int(os.getenv("GH_API_RATE_LOW_WATER", "100"))
+GH_API_RATE_LIMIT_RETRIES = int(os.getenv("GH_API_RATE_LIMIT_RETRIES", "3"))
+
+# Content-addressed cache of the repos built by helpers/repo_generator.py, kept across runs
+GENERATED_REPOS_DIR = os.getenv(
+    "GENERATED_REPOS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_repos", ".generated")
+)
+
+# Number of entries listed in each section of the end-of-session "slowest commands" summary
+SLOWEST_COMMANDS = int(os.getenv("SLOWEST_COMMANDS", "10"))
+
+# Capture git's trace2 performance events of every command run through run_shell_command and
+# report the time spent per trace2 region (e.g. status/untracked) at the end of the session
+GIT_TRACE2_REGIONS = os.getenv("GIT_TRACE2_REGIONS", "").lower() in ("1", "true", "yes")
+
+# Number of first and last stdout lines (or chunks) output_stream keeps for logging, and the
+# number of stderr bytes it keeps
+STREAM_HEAD_LINES = int(os.getenv("STREAM_HEAD_LINES", "20"))
+STREAM_TAIL_LINES = int(os.getenv("STREAM_TAIL_LINES", "20"))
+STREAM_STDERR_LIMIT = int(os.getenv("STREAM_STDERR_LIMIT", str(64 * 1024)))
+
+# Logging pipeline of the harness: queue-backed with a background writer (0 falls back to a
+# synchronous handler with pytest's live logging), compact mode writing only the command,
+# duration and return code of every command (the full log of a failed test is replayed into
+# its report), the size limit of a record on the terminal, the number of records kept for the
+# replay and the size of the queue (records are dropped while it is full)
+LOG_PIPELINE = os.getenv("LOG_PIPELINE", "1").lower() in ("1", "true", "yes")
+LOG_COMPACT = os.getenv("LOG_COMPACT", "").lower() in ("1", "true", "yes")
+LOG_MAX_RECORD_CHARS = int(os.getenv("LOG_MAX_RECORD_CHARS", "10000"))
+LOG_BUFFER_RECORDS = int(os.getenv("LOG_BUFFER_RECORDS", "10000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "100000"))
+
+# Network conditions emulated between git and the local stand-in (see helpers/net_emulator.py
+# for the profiles, e.g. '3g' or 'transatlantic'), empty connects git to the stand-in directly
+NET_PROFILE = os.getenv("NET_PROFILE", "")
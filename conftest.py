@@ -5,15 +5,108 @@ test executionss
 """
 
 import os
-import logging
+import shutil
 import pytest
 import config
-from helpers import common, git_utils
+from helpers import (cleanup, command_metrics, common, git_utils, local_github, log_pipeline,
+                     net_emulator, repo_pool, repo_snapshots, trace2)
+
+
+def get_test_repos_dir() -> str:
+    """
+    Returns the directory shared by all xdist workers that holds the local test repos
+    """
+    root_dir = os.path.abspath(os.path.dirname(__file__))
+    
+    # Adjust for GitHub Actions runner path if the environment variable exists
+    if 'GITHUB_WORKSPACE' in os.environ:
+        root_dir = os.environ['GITHUB_WORKSPACE']
+    
+    return os.path.join(root_dir, 'test_repos')
+
+
+def get_worker_id() -> str:
+    """
+    Returns the xdist worker id of the current process, or 'main' when not running under xdist
+    """
+    return os.getenv('PYTEST_XDIST_WORKER', 'main')
+
+
+@pytest.fixture(scope="session", autouse=True)
+def local_github_server():
+    """
+    Fixture to start the local GitHub stand-in for the session when GH_LOCAL_SERVER is set,
+    pointing GH_URL and GH_API_URL at it and restoring them once the session is over. When
+    NET_PROFILE is set, git reaches the stand-in through a network emulator applying that
+    profile, while the API calls stay direct
+
+    Yields:
+        - The running server, or None when the tests run against github.com
+    """
+    if not config.GH_LOCAL_SERVER:
+        yield None
+        return
+
+    original_urls = (config.GH_URL, config.GH_API_URL)
+    server = local_github.LocalGitHubServer()
+    server.start()
+    config.GH_URL = config.GH_API_URL = server.base_url
+    emulator = None
+    if config.NET_PROFILE:
+        emulator = net_emulator.NetworkEmulator(server.base_url,
+                                                net_emulator.get_profile(config.NET_PROFILE))
+        emulator.start()
+        config.GH_URL = server.public_url = emulator.base_url
+    
+    yield server
+    
+    config.GH_URL, config.GH_API_URL = original_urls
+    if emulator:
+        emulator.stop()
+    server.stop()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def api_session():
+    """
+    Fixture to share a single pooled keep-alive GitHub API session across the test session
+
+    Yields:
+        - The shared requests.Session used by the git_utils API helpers
+    """
+    yield git_utils.get_api_session()
+    
+    git_utils.close_api_session()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_git_home(tmp_path_factory):
+    """
+    Fixture to give the session (i.e. each xdist worker) its own HOME and global git config 
+    so parallel workers do not race on ~/.gitconfig and ~/.netrc
+
+    Yields:
+        - The path of the worker's home directory.
+    """
+    home = str(tmp_path_factory.mktemp(f"home-{get_worker_id()}"))
+    isolated_env = {"HOME": home, "GIT_CONFIG_GLOBAL": os.path.join(home, ".gitconfig")}
+    original_env = {name: os.environ.get(name) for name in isolated_env}
+    os.environ.update(isolated_env)
+    
+    yield home
+    
+    for name, value in original_env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
 
 @pytest.fixture(scope="session", autouse=True)
-def configure_git():
+def configure_git(isolated_git_home):  # pylint: disable=unused-argument
     """
-    Fixture to configure Git for authentication using GH_TOKEN before running all the tests
+    Fixture to configure Git for authentication using GH_TOKEN before running all the tests, 
+    in the isolated home of the session
     """
     git_config_commands = [
         f'git config --global user.email "{config.GH_EMAIL}"',
@@ -21,96 +114,210 @@ def configure_git():
         'git config --global credential.helper store',
         'git config --global core.askpass ""',
         f'echo "machine github.com login x-access-token password {config.GH_TOKEN}" > ~/.netrc',
-        f'echo "machine api.github.com login x-access-token password {config.GH_TOKEN}" >> ~/.netrc',
+        f'echo "machine api.github.com login x-access-token password {config.GH_TOKEN}" '
+        '>> ~/.netrc',
         'chmod 600 ~/.netrc',
-        'git config --global credential.helper "!f() { echo username=x-access-token; echo password=${GH_TOKEN}; }; f"'
+        'git config --global credential.helper '
+        '"!f() { echo username=x-access-token; echo password=${GH_TOKEN}; }; f"'
     ]
 
     for command in git_config_commands:
         common.run_shell_command(command, with_errors=True, with_logging=False)
         
 
+@pytest.fixture(scope="session")
+def cleanup_queue(local_github_server, api_session):  # pylint: disable=unused-argument
+    """
+    Fixture to run deferred deletions of remote and local test repos in the background, 
+    journaled under test_repos/.cleanup so a crashed run is cleaned up by the next one
+
+    Yields:
+        - The cleanup queue of this session (one per xdist worker).
+
+    Cleanup:
+        - Waits for all the queued deletions to finish.
+    """
+    queue = cleanup.CleanupQueue(
+        os.path.join(get_test_repos_dir(), '.cleanup'),
+        get_worker_id(),
+        journal_remote=not config.GH_LOCAL_SERVER
+    )
+    
+    yield queue
+    
+    queue.flush()
+
+
+@pytest.fixture(scope="session")
+def remote_repo_pool(local_github_server, configure_git,  # pylint: disable=unused-argument
+                     cleanup_queue):
+    """
+    Fixture to provision a session-wide pool of remote repos (one pool per xdist worker),
+    disabled when REPO_POOL_SIZE is 0
+
+    Yields:
+        - The provisioned pool, or None when every test creates its own remote repo
+
+    Cleanup:
+        - Deletes every pooled remote repository at the end of the session.
+    """
+    if config.REPO_POOL_SIZE <= 0:
+        yield None
+        return
+
+    pool = repo_pool.RemoteRepoPool(config.REPO_POOL_SIZE, cleanup_queue)
+    pool.provision()
+    
+    yield pool
+    
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def repo_snapshot_factory(configure_git, tmp_path_factory):  # pylint: disable=unused-argument
+    """
+    Fixture to build named local repo states once per session and hand out copies of them
+
+    Returns:
+        - The snapshot factory of this session (one per xdist worker).
+    """
+    return repo_snapshots.RepoSnapshotFactory(str(tmp_path_factory.mktemp("repo_snapshots")))
+
+
 @pytest.fixture
-def get_repo_name() -> str:
+def get_repo_name(remote_repo_pool) -> str:
     """
-    Fixture to generate a unique repository name.
+    Fixture to provide a repository name, leased from the remote repo pool when pooling is 
+    enabled or randomly generated otherwise.
+
+    Yields:
+        - The repository name.
+
+    Cleanup:
+        - Resets the leased remote repository and returns it to the pool.
+    """
+    if remote_repo_pool is None:
+        yield common.generate_repo_name()
+        return
+
+    repo_name = remote_repo_pool.acquire()
+    
+    yield repo_name
+    
+    remote_repo_pool.release(repo_name)
+
+
+@pytest.fixture(scope="session")
+def get_repos_dir() -> str:
+    """
+    Fixture to provide the directory local repos are created in, scoped to the xdist worker
 
     Returns:
-        - A randomly generated repository name.
+        - The full path to the worker's repos directory.
     """
-    return common.generate_repo_name()
+    repos_dir = os.path.join(get_test_repos_dir(), get_worker_id())
+    os.makedirs(repos_dir, exist_ok=True)
+    return repos_dir
 
 
 @pytest.fixture
-def get_repo_path(get_repo_name: str) -> str:
+def get_repo_path(get_repos_dir: str, get_repo_name: str) -> str:
     """
     Fixture to generate the full repository path based on the repo name
 
     Parameters:
+        - get_repos_dir: The worker-scoped directory holding the local repos.
         - get_repo_name: The name of the repository to be used.
 
     Returns:
         - The full path to the repo directory.
     """
-    root_dir = os.path.abspath(os.path.dirname(__file__))
-    
-    # Adjust for GitHub Actions runner path if the environment variable exists
-    if 'GITHUB_WORKSPACE' in os.environ:
-        root_dir = os.environ['GITHUB_WORKSPACE']
-    
-    return os.path.join(root_dir, 'test_repos', get_repo_name)
+    return os.path.join(get_repos_dir, get_repo_name)
 
 
 @pytest.fixture
-def api_create_git_repo(get_repo_name: str, get_repo_path: str, request):
+def repo_state(request) -> str:
     """
-    Fixture to create a git repository using the GitHub API, set up local git configuration, 
-    and add a remote repository.
+    Fixture to name the state the local repository starts in, tests select one by 
+    parametrizing `repo_state` with a name from repo_snapshots.REPO_STATES
+
+    Returns:
+        - The name of the repo state, or None for a freshly initialized repository.
+    """
+    return getattr(request, "param", None)
+
+
+@pytest.fixture
+def api_create_git_repo(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        get_repo_name: str, get_repo_path: str, remote_repo_pool, cleanup_queue,
+        repo_snapshot_factory, repo_state, request):
+    """
+    Fixture to create a git repository using the GitHub API (or lease one from the pool), 
+    set up local git configuration, and add a remote repository.
 
     Parameters:
         - get_repo_name: The name of the repository to be created.
         - get_repo_path: The local file system path to the repository.
+        - remote_repo_pool: The pool the remote repository was leased from, if any.
+        - cleanup_queue: The queue the deletions are deferred to.
+        - repo_snapshot_factory: The factory the local repository is copied from.
         - remote_only: If True, only the remote repository is created (no local).
+        - repo_state: If set, the local repository is a copy of this named state from 
+          repo_snapshots.REPO_STATES instead of a freshly initialized one.
 
     Yields:
         - The name of the created repository for further testing.
 
     Cleanup:
-        - Deletes the created GitHub repository after the test.
+        - Queues the deletion of the created GitHub repository (pooled ones are reset 
+          instead) and of the local repository after the test.
     """
-    remote_only = request.node.callspec.params["remote_only"] if hasattr(request.node, "callspec") else False
+    params = request.node.callspec.params if hasattr(request.node, "callspec") else {}
+    remote_only = params.get("remote_only", False)
     
     # Set global default branch to 'main'
-    result = common.run_shell_command(f'git config --global init.defaultBranch {config.DEFAULT_BRANCH}')
+    result = common.run_shell_command(
+        f'git config --global init.defaultBranch {config.DEFAULT_BRANCH}'
+    )
     assert not result.stdout, "Error with git config for default branch."
     assert not result.stderr, f"Unexpected error: {result.stderr}"
     
-    if not remote_only:
+    # Pooled repo names are reused, drop the local leftovers of the previous lease
+    shutil.rmtree(get_repo_path, ignore_errors=True)
+    
+    if repo_state and not remote_only:
+        repo_snapshot_factory.materialize(repo_state, get_repo_path)
+        os.chdir(get_repo_path)  # Change directory to the new repo path
+    elif not remote_only:
         os.makedirs(get_repo_path, exist_ok=True)
         # Initialize loclaly the git repository
         result = common.run_shell_command(f'git init {get_repo_path}')
         assert 'Initialized empty Git repository' in result.stdout, "Git init failed."
         os.chdir(get_repo_path)  # Change directory to the new repo path
     
-    # Create the git repo using the API
-    response = git_utils.api_create_github_repo(get_repo_name)
-    assert f'{config.GH_URL}/{config.GH_USERNAME}/{get_repo_name}.git' in response.text, (
-    "GitHub repo creation failed.")
+    if remote_repo_pool is None:
+        # Create the git repo using the API
+        response = git_utils.api_create_github_repo(get_repo_name)
+        assert f'{config.GH_URL}/{config.GH_USERNAME}/{get_repo_name}.git' in response.text, (
+        "GitHub repo creation failed.")
 
     if not remote_only:
         # Add the remote repository
         result = common.run_shell_command(
             f'git remote add origin {config.GH_URL}/'
-            f'{os.getenv("GH_USERNAME")}/{get_repo_name}.git'
+            f'{config.GH_USERNAME}/{get_repo_name}.git'
         )
         assert not result.stdout, "Error adding remote origin."
     
     yield get_repo_name  # Yield the repository name to the test
     
-    # Delete the git repo after the test is finished
-    delete = git_utils.api_delete_github_repo(get_repo_name)
-    assert delete.status_code == 204, (
-        f"Failed to delete GitHub repo. Status code: {delete.status_code}")
+    # Step out of the local repo so it can be moved away for the background removal
+    os.chdir(os.path.dirname(get_repo_path))
+    cleanup_queue.schedule_local_removal(get_repo_path)
+    
+    if remote_repo_pool is None:
+        # Delete the git repo in the background after the test is finished
+        cleanup_queue.schedule_remote_deletion(get_repo_name)
 
 
 @pytest.fixture(autouse=True)
@@ -123,18 +330,109 @@ def restore_cwd():
     os.chdir(original_cwd)  # Reset back to the original working directory
 
 
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionstart(session: pytest.Session):
+    """
+    Finishes the deletions journaled by previous runs that did not get to complete them. 
+    Runs once per run, in the xdist controller before any worker is started
+
+    Parameters:
+        - session: The pytest session object.
+    """
+    if hasattr(session.config, "workerinput"):
+        return
+    cleanup.recover(
+        os.path.join(get_test_repos_dir(), '.cleanup'), with_remote=not config.GH_LOCAL_SERVER
+    )
+
+
 def pytest_configure(config: pytest.Config):
     """
-    Configures basic logging for pytest to capture detailed logs during testing
+    Configures logging for pytest to capture detailed logs during testing, see log_pipeline
 
     Parameters:
         - config: The pytest configuration object.
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler()]
-    )
-    logging.getLogger().setLevel(logging.INFO)
-    config.option.log_cli = True
-    config.option.log_cli_level = "INFO"
+    log_pipeline.install(config)
+
+
+def pytest_unconfigure(config: pytest.Config):  # pylint: disable=unused-argument
+    """
+    Writes out the logs still queued in the logging pipeline
+    """
+    log_pipeline.shutdown()
+
+
+def pytest_runtest_logstart(nodeid: str, location):  # pylint: disable=unused-argument
+    """
+    Tags the commands executed from here on (fixtures included) with the id of the test
+    """
+    command_metrics.current_test = nodeid
+    log_pipeline.start_test()
+
+
+def pytest_runtest_logfinish(nodeid: str, location):  # pylint: disable=unused-argument
+    """
+    Stops tagging commands with the id of the finished test
+    """
+    command_metrics.current_test = None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
+    """
+    Attaches the command metrics of the test to its reports, which also carries them from the
+    xdist workers to the controller. The call report holds the setup and call commands.
+    The report of a failed test also gets its full log, replayed from the logging pipeline
+    """
+    outcome = yield
+    report = outcome.get_result()
+    if report.failed:
+        report.sections.append((f"Full log ({call.when})", log_pipeline.replay()))
+    if call.when == "setup" and report.passed:
+        return
+    report.command_metrics = command_metrics.pop_records(item.nodeid)
+
+
+def pytest_runtest_logreport(report: pytest.TestReport):
+    """
+    Collects the command metrics of every report for the end-of-session summary
+    """
+    command_metrics.collect(getattr(report, "command_metrics", []))
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    Prints the slowest commands and the command time per git subcommand and per test, and the
+    time per trace2 region when GIT_TRACE2_REGIONS is enabled
+    """
+    records = command_metrics.collected()
+    if not records:
+        return
+    terminalreporter.write_sep("=", "slowest commands")
+    for line in command_metrics.format_summary(records, config.SLOWEST_COMMANDS):
+        terminalreporter.write_line(line)
+    if config.GIT_TRACE2_REGIONS:
+        terminalreporter.write_sep("=", "git trace2 regions")
+        for line in trace2.format_report(records, config.SLOWEST_COMMANDS):
+            terminalreporter.write_line(line)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_html_results_table_html(report, data):
+    """
+    Adds the commands executed by a test, with their timings, to its row of the HTML report
+    """
+    records = getattr(report, "command_metrics", None)
+    if records:
+        data.append(command_metrics.to_html_table(records))
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_html_results_summary(prefix, summary, postfix):  # pylint: disable=unused-argument
+    """
+    Adds the command time per git subcommand to the summary of the HTML report
+    """
+    records = command_metrics.collected()
+    if records:
+        prefix.append(command_metrics.subcommands_to_html_table(records))
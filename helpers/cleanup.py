@@ -0,0 +1,205 @@
+"""
+This module provides deferred background cleanup of remote and local test repos. Pending
+deletions are recorded in an append-only journal so a crashed run leaves behind enough
+information for the next run to finish them
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import uuid
+import requests
+from helpers import git_utils
+
+REMOTE = "remote"
+LOCAL = "local"
+
+
+class CleanupQueue:
+    """
+    Background worker deleting remote repos and removing local directories
+
+    Every scheduled deletion is journaled before it is queued and marked as done once it
+    succeeds, so the journal only ever holds the deletions that are still pending
+    """
+
+    def __init__(self, journal_dir: str, journal_name: str, journal_remote: bool = True):
+        """
+        Parameters:
+        - journal_dir: The directory holding the journals of all (possibly parallel) sessions
+        - journal_name: The journal file name of this session, unique per xdist worker
+        - journal_remote: If False, remote deletions are not journaled (e.g. the repos of the
+          local stand-in do not outlive the session anyway)
+        """
+        os.makedirs(journal_dir, exist_ok=True)
+        self.journal_path = os.path.join(journal_dir, f"{journal_name}.jsonl")
+        self.journal_remote = journal_remote
+        self._trash_dir = os.path.join(journal_dir, "trash")
+        # Kept open for the whole session, closed by flush()
+        self._journal = open(  # pylint: disable=consider-using-with
+            self.journal_path, 'a', encoding='utf-8'
+        )
+        self._journal_lock = threading.Lock()
+        self._pending = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._drain, name="cleanup", daemon=True)
+        self._worker.start()
+
+    def track(self, kind: str, target: str):
+        """
+        Journals a deletion without queueing it, for resources that are still in use but
+        must not outlive a crash (e.g. pooled remote repos)
+        """
+        self._write(kind, target, done=False)
+
+    def untrack(self, kind: str, target: str):
+        """
+        Marks a tracked deletion as done after it was carried out synchronously
+        """
+        self._write(kind, target, done=True)
+
+    def schedule_remote_deletion(self, repo_name: str):
+        """
+        Queues the deletion of a remote repo
+
+        Parameters:
+        - repo_name: The name of the repo to be deleted
+        """
+        self._write(REMOTE, repo_name, done=False)
+        self._queue.put((REMOTE, repo_name))
+
+    def schedule_local_removal(self, path: str):
+        """
+        Moves a local directory out of the way and queues its removal, the move keeps a
+        reused path (e.g. of a pooled repo) from being removed under the next test
+
+        Parameters:
+        - path: The directory to be removed
+        """
+        if not os.path.exists(path):
+            return
+        os.makedirs(self._trash_dir, exist_ok=True)
+        trashed = os.path.join(self._trash_dir, uuid.uuid4().hex)
+        try:
+            os.rename(path, trashed)
+        except OSError as error:
+            logging.warning(f"Could not move {path} out of the way, leaving it: {error}")
+            return
+        self._write(LOCAL, trashed, done=False)
+        self._queue.put((LOCAL, trashed))
+
+    def flush(self):
+        """
+        Waits for every queued deletion to finish, stops the worker and drops the journal
+        when nothing is left pending
+        """
+        self._queue.join()
+        self._queue.put(None)
+        self._worker.join()
+        with self._journal_lock:
+            self._journal.close()
+            if self._pending == 0:
+                os.remove(self.journal_path)
+            else:
+                logging.warning(f"{self._pending} deletions left pending in {self.journal_path}")
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            kind, target = item
+            try:
+                if _delete(kind, target):
+                    self._write(kind, target, done=True)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, kind: str, target: str, done: bool):
+        if kind == REMOTE and not self.journal_remote:
+            return
+        with self._journal_lock:
+            self._pending += -1 if done else 1
+            self._journal.write(json.dumps({"kind": kind, "target": target, "done": done}) + "\n")
+            # Flushed per entry so the journal survives the test process crashing
+            self._journal.flush()
+
+
+def recover(journal_dir: str, with_remote: bool = True):
+    """
+    Finishes the deletions left pending by previous (crashed) runs, must be called before
+    any session of the current run starts journaling
+
+    Parameters:
+    - journal_dir: The directory holding the journals
+    - with_remote: If False, remote deletions are kept pending for a later run (e.g. when
+      the current run targets the local stand-in rather than GitHub)
+    """
+    # Everything in the trash is pending removal, even if a crash kept it from being journaled
+    shutil.rmtree(os.path.join(journal_dir, "trash"), ignore_errors=True)
+
+    journal_paths = glob.glob(os.path.join(journal_dir, "*.jsonl"))
+    if not journal_paths:
+        return
+
+    pending = {}
+    for journal_path in journal_paths:
+        with open(journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn write from a crash, the entries before it are still valid
+                    continue
+                key = (entry["kind"], entry["target"])
+                pending[key] = pending.get(key, 0) + (-1 if entry["done"] else 1)
+    pending = [key for key, count in pending.items() if count > 0]
+
+    logging.info(f"Recovering {len(pending)} pending deletions from previous runs")
+    remaining = []
+    for kind, target in pending:
+        if kind == LOCAL and not _delete(kind, target):
+            remaining.append((kind, target))
+    remote = [target for kind, target in pending if kind == REMOTE]
+    if with_remote:
+        for repo_name, result in git_utils.api_delete_github_repos(remote):
+            if isinstance(result, Exception) and not _is_not_found(result):
+                remaining.append((REMOTE, repo_name))
+    else:
+        remaining.extend((REMOTE, repo_name) for repo_name in remote)
+
+    for journal_path in journal_paths:
+        os.remove(journal_path)
+    if remaining:
+        with open(os.path.join(journal_dir, "recovered.jsonl"), 'w', encoding='utf-8') as journal:
+            for kind, target in remaining:
+                journal.write(json.dumps({"kind": kind, "target": target, "done": False}) + "\n")
+
+
+def _delete(kind: str, target: str) -> bool:
+    try:
+        if kind == REMOTE:
+            git_utils.api_delete_github_repo(target)
+        else:
+            shutil.rmtree(target)
+    except requests.exceptions.HTTPError as error:
+        if _is_not_found(error):
+            return True
+        logging.error(f"Deferred deletion of {kind} {target} failed: {error}")
+        return False
+    except FileNotFoundError:
+        return True
+    except (requests.exceptions.RequestException, OSError) as error:
+        logging.error(f"Deferred deletion of {kind} {target} failed: {error}")
+        return False
+    return True
+
+
+def _is_not_found(error: Exception) -> bool:
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code == 404
@@ -0,0 +1,336 @@
+"""
+This module provides per-command instrumentation for run_shell_command: wall time, user/sys
+CPU time, peak memory, page faults, block I/O and exit status of every command, tagged with
+the id of the test that ran it, and the aggregations used by the end-of-session summary and
+the HTML report
+"""
+
+import contextlib
+import html
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import config
+from helpers import trace2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Node id of the running test, commands executed outside of a test are tagged with None
+current_test = None  # pylint: disable=invalid-name
+
+_records = []
+_collected = []
+_records_lock = threading.Lock()
+
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere. On Linux the peak RSS of
+# a child is never below the peak RSS of the Python process that spawned it, as the kernel
+# carries the peak of the parent's address space over exec, so it is only meaningful above that
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_INHERITS_PEAK_RSS = sys.platform.startswith("linux")
+
+
+def own_peak_rss() -> int:
+    """
+    Returns the peak RSS in bytes of this process, the floor of its children's peak RSS on
+    Linux (0 elsewhere, or where it cannot be read)
+    """
+    if not _INHERITS_PEAK_RSS or resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+class RusagePopen(subprocess.Popen):
+    """
+    Popen that reaps its child with os.wait4, keeping the child's resource usage in `rusage`
+    (None on platforms without wait4). The usage of a shell includes the commands it waited for.
+    `rss_floor` is the peak RSS of this process once the child started, which the child's peak
+    RSS cannot read below on Linux
+    """
+
+    rusage = None
+    metrics = None
+    rss_floor = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rss_floor = own_peak_rss()
+
+    if hasattr(os, "wait4"):
+        def _try_wait(self, wait_flags):
+            try:
+                pid, status, rusage = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return (self.pid, 0)
+            if pid == self.pid:
+                self.rusage = rusage
+            return (pid, status)
+
+
+@contextlib.contextmanager
+def measured_popen(command: str, redact: bool = False, env: dict = None, **kwargs):
+    """
+    Context manager starting a shell command and recording its metrics once it has been reaped,
+    with its trace2 regions when config.GIT_TRACE2_REGIONS is enabled
+
+    Parameters:
+    - command: The shell command to execute
+    - redact: If True, only the subcommand is recorded (for commands carrying secrets)
+    - env: The environment of the command (defaults to the current environment)
+    - kwargs: Further arguments for subprocess.Popen (stdout, stderr, cwd, ...)
+
+    Yields:
+    - RusagePopen: The started process, which the caller waits for. Its recorded entry is set
+    as `metrics` once the context is left
+    """
+    with contextlib.ExitStack() as stack:
+        trace_dir = None
+        if config.GIT_TRACE2_REGIONS:
+            env, trace_dir = stack.enter_context(trace2.capture(env))
+        start = time.perf_counter()
+        process = RusagePopen(command, shell=True, env=env, **kwargs)
+
+        def record_process():
+            process.metrics = record(
+                command, time.perf_counter() - start, process.returncode, process.rusage,
+                redact=redact, rss_floor=process.rss_floor,
+                trace=trace2.parse_events(trace_dir) if trace_dir else None
+            )
+
+        # Runs once the process has been reaped on leaving its context, also when the caller
+        # raised or a generator using the process was closed early
+        stack.callback(record_process)
+        stack.enter_context(process)
+        yield process
+
+
+def git_subcommand(command: str) -> str:
+    """
+    Returns the git subcommand of a shell command (e.g. 'status' for 'git -C repo status -s'),
+    or the program name for commands that are not git invocations
+
+    Parameters:
+    - command: The shell command
+    """
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        tokens = command.split()
+    if not tokens:
+        return ""
+    if os.path.basename(tokens[0]) != "git":
+        return os.path.basename(tokens[0])
+
+    tokens = iter(tokens[1:])
+    for token in tokens:
+        if token in ("-C", "-c", "--git-dir", "--work-tree", "--namespace"):
+            next(tokens, None)
+        elif not token.startswith("-"):
+            return token
+    return "git"
+
+
+def record(command: str, wall: float, returncode: int, rusage=None, redact: bool = False,
+           trace: dict = None, rss_floor: int = 0) -> dict:
+    """
+    Records the metrics of an executed command
+
+    Parameters:
+    - command: The executed shell command
+    - wall: The wall clock time in seconds
+    - returncode: The exit status
+    - rusage: The resource usage of the command, if available
+    - redact: If True, only the subcommand is kept (for commands carrying secrets)
+    - trace: The trace2 regions and data of the command (see trace2.parse_events), if captured
+    - rss_floor: The peak RSS in bytes of the process that spawned the command (see
+      own_peak_rss), a peak RSS up to it is recorded as None, as it may be the spawning
+      process' own rather than the command's
+
+    Returns:
+    - The recorded entry
+    """
+    subcommand = git_subcommand(command)
+    max_rss = rusage.ru_maxrss * _MAXRSS_UNIT if rusage else None
+    if max_rss is not None and max_rss <= rss_floor:
+        max_rss = None
+    entry = {
+        "test": current_test,
+        "command": f"{subcommand} <redacted>" if redact else command,
+        "subcommand": subcommand,
+        "wall": wall,
+        "user": rusage.ru_utime if rusage else None,
+        "sys": rusage.ru_stime if rusage else None,
+        "max_rss": max_rss,
+        "minor_faults": rusage.ru_minflt if rusage else None,
+        "major_faults": rusage.ru_majflt if rusage else None,
+        "block_in": rusage.ru_inblock if rusage else None,
+        "block_out": rusage.ru_oublock if rusage else None,
+        "returncode": returncode,
+    }
+    if trace is not None:
+        entry["trace2"] = trace
+    with _records_lock:
+        _records.append(entry)
+    return entry
+
+
+def pop_records(test_id: str = None) -> list:
+    """
+    Removes and returns the records of the given test (or all records if None)
+    """
+    taken, kept = [], []
+    with _records_lock:
+        for entry in _records:
+            (taken if test_id is None or entry["test"] == test_id else kept).append(entry)
+        _records[:] = kept
+    return taken
+
+
+def collect(records: list):
+    """
+    Adds records reported by a test (possibly run by an xdist worker) to the session totals
+    """
+    with _records_lock:
+        _collected.extend(records)
+
+
+def collected() -> list:
+    """
+    Returns every record reported during the session
+    """
+    with _records_lock:
+        return list(_collected)
+
+
+def by_subcommand(records: list) -> list:
+    """
+    Aggregates records per git subcommand, slowest total first
+
+    Returns:
+    - A list of dicts with subcommand, count, total, mean and max wall time, total CPU time and
+    the highest peak RSS in bytes (None if it was not measured)
+    """
+    groups = {}
+    for entry in records:
+        groups.setdefault(entry["subcommand"], []).append(entry)
+    summary = []
+    for subcommand, entries in groups.items():
+        walls = [entry["wall"] for entry in entries]
+        summary.append({
+            "subcommand": subcommand,
+            "count": len(entries),
+            "total": sum(walls),
+            "mean": sum(walls) / len(walls),
+            "max": max(walls),
+            "cpu": sum((entry["user"] or 0) + (entry["sys"] or 0) for entry in entries),
+            "max_rss": max((entry["max_rss"] for entry in entries
+                            if entry["max_rss"] is not None), default=None),
+        })
+    return sorted(summary, key=lambda item: item["total"], reverse=True)
+
+
+def by_test(records: list) -> list:
+    """
+    Aggregates records per test, slowest total first
+
+    Returns:
+    - A list of dicts with test, count and total wall time
+    """
+    totals = {}
+    for entry in records:
+        count, total = totals.get(entry["test"], (0, 0.0))
+        totals[entry["test"]] = (count + 1, total + entry["wall"])
+    summary = [{"test": test, "count": count, "total": total}
+               for test, (count, total) in totals.items()]
+    return sorted(summary, key=lambda item: item["total"], reverse=True)
+
+
+def slowest(records: list, count: int) -> list:
+    """
+    Returns the given number of slowest individual commands
+    """
+    return sorted(records, key=lambda entry: entry["wall"], reverse=True)[:count]
+
+
+def megabytes(size: int) -> float:
+    """
+    Converts a size in bytes (None if unknown) to megabytes
+    """
+    return (size or 0) / (1024 * 1024)
+
+
+def format_megabytes(size: int, width: int = 0) -> str:
+    """
+    Formats a size in bytes as megabytes right-aligned to the width, '-' if it is unknown
+    """
+    return f"{'-':>{width}}" if size is None else f"{megabytes(size):>{width}.1f}"
+
+
+def format_summary(records: list, count: int) -> list:
+    """
+    Formats the slowest commands, the per-subcommand totals and the per-test totals as text
+
+    Parameters:
+    - records: The records to summarize
+    - count: The number of entries listed in each section
+
+    Returns:
+    - The lines of the summary
+    """
+    lines = [f"{'wall (s)':>9} {'cpu (s)':>8} {'rss (MB)':>9} {'rc':>4}  command"]
+    for entry in slowest(records, count):
+        cpu = (entry["user"] or 0) + (entry["sys"] or 0)
+        lines.append(f"{entry['wall']:>9.3f} {cpu:>8.3f} {format_megabytes(entry['max_rss'], 9)} "
+                     f"{entry['returncode']:>4}  {entry['command']}  ({entry['test']})")
+    lines.append("")
+    lines.append(f"{'subcommand':<16} {'count':>6} {'total (s)':>10} {'mean (s)':>9} "
+                 f"{'max (s)':>8} {'cpu (s)':>8} {'rss (MB)':>9}")
+    for item in by_subcommand(records)[:count]:
+        lines.append(f"{item['subcommand']:<16} {item['count']:>6} {item['total']:>10.3f} "
+                     f"{item['mean']:>9.3f} {item['max']:>8.3f} {item['cpu']:>8.3f} "
+                     f"{format_megabytes(item['max_rss'], 9)}")
+    lines.append("")
+    lines.append(f"{'commands':>8} {'total (s)':>10}  test")
+    for item in by_test(records)[:count]:
+        lines.append(f"{item['count']:>8} {item['total']:>10.3f}  {item['test']}")
+    return lines
+
+
+def to_html_table(records: list) -> str:
+    """
+    Formats records as an HTML table for the pytest-html report
+    """
+    rows = "".join(
+        f"<tr><td>{html.escape(entry['command'])}</td><td>{entry['wall'] * 1000:.1f}</td>"
+        f"<td>{((entry['user'] or 0) + (entry['sys'] or 0)) * 1000:.1f}</td>"
+        f"<td>{format_megabytes(entry['max_rss'])}</td><td>{entry['returncode']}</td></tr>"
+        for entry in records
+    )
+    return (
+        '<table class="command-metrics"><tr><th>command</th><th>wall (ms)</th>'
+        f"<th>cpu (ms)</th><th>rss (MB)</th><th>rc</th></tr>{rows}</table>"
+    )
+
+
+def subcommands_to_html_table(records: list) -> str:
+    """
+    Formats the per-subcommand totals as an HTML table for the pytest-html report summary
+    """
+    rows = "".join(
+        f"<tr><td>{html.escape(item['subcommand'])}</td><td>{item['count']}</td>"
+        f"<td>{item['total']:.3f}</td><td>{item['mean'] * 1000:.1f}</td>"
+        f"<td>{item['max'] * 1000:.1f}</td><td>{item['cpu']:.3f}</td>"
+        f"<td>{format_megabytes(item['max_rss'])}</td></tr>"
+        for item in by_subcommand(records)
+    )
+    return (
+        '<table class="command-metrics"><tr><th>subcommand</th><th>count</th>'
+        "<th>total (s)</th><th>mean (ms)</th><th>max (ms)</th><th>cpu (s)</th>"
+        "<th>rss (MB)</th></tr>"
+        f"{rows}</table>"
+    )
@@ -4,20 +4,28 @@ generating random GitHub repository names, normalizing and comparing strings,
 and creating test files for use in a repository
 """
 
+import os
 import random
 import string
 import subprocess
 import logging
 import config
+from helpers import command_metrics, log_pipeline
 
-def run_shell_command(command: str, with_errors: bool = False, with_logging=True) -> subprocess.CompletedProcess:
+def run_shell_command(command: str, with_errors: bool = False, with_logging=True,
+                      cwd: str = None, env: dict = None) -> subprocess.CompletedProcess:
     """
-    Executes a given shell command and returns the std I/O streams and the program return code
+    Executes a given shell command and returns the std I/O streams and the program return code. 
+    The timings, memory use and exit status of the command are recorded in command_metrics, 
+    along with its git trace2 region timings when config.GIT_TRACE2_REGIONS is enabled.
+    For commands with large outputs see output_stream.stream_shell_command
 
     Parameters:
     - command: The shell command to execute
     - with_errors: If False, asserts that there are no errors in the command execution
     - with_logging: If True, command and the output streams are logged (disable for sensitive I/Os)
+    - cwd: The directory to run the command in (defaults to the current working directory)
+    - env: Environment variables to set for the command on top of the current environment
 
     Returns:
     - subprocess.CompletedProcess: stdout, stderr, and returncode
@@ -28,14 +36,24 @@ def run_shell_command(command: str, with_errors: bool = False, with_logging=True
     """
     
     if with_logging:
-        logging.info(f"Executing shell command: {command}")
+        # Lazy %-formatting, the messages are formatted (and truncated) by the logging writer
+        logging.info("Executing shell command: %s", command, extra=log_pipeline.FULL)
     
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if env is not None:
+        env = {**os.environ, **env}
+    
+    with command_metrics.measured_popen(command, redact=not with_logging, env=env, cwd=cwd,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True) as process:
+        stdout, stderr = process.communicate()
+    result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
     
     if with_logging:
-        logging.info(f"stdout: {result.stdout}")
-        logging.info(f"stderr: {result.stderr}")
-        logging.info(f"return code: {result.returncode}")
+        logging.info("stdout: %s", result.stdout, extra=log_pipeline.FULL)
+        logging.info("stderr: %s", result.stderr, extra=log_pipeline.FULL)
+        logging.info("return code: %s", result.returncode, extra=log_pipeline.FULL)
+        logging.info("%s (%.1f ms, return code %s)", command,
+                     process.metrics["wall"] * 1000, result.returncode, extra=log_pipeline.COMPACT)
     
     if not with_errors:
         assert not result.stderr, f"Expected no errors but got {result.stderr}"
@@ -88,15 +106,22 @@ def compare_normalized_strings(actual: str, expected: str):
     )
 
 
-def create_test_file() -> str:
+def create_test_file(repo_path: str = None) -> str:
     """
     Helper function to create a test file inside an initialized repo
     
+    Parameters:
+    - repo_path: The repo to create the file in (defaults to the current working directory)
+    
     Returns:
     - Test file name that was created inside the repo from the given context
     """
     
-    with open(config.TEST_FILE_NAME, 'w', encoding='utf-8') as f:
+    file_path = config.TEST_FILE_NAME
+    if repo_path:
+        file_path = os.path.join(repo_path, config.TEST_FILE_NAME)
+    
+    with open(file_path, 'w', encoding='utf-8') as f:
         f.write('Test file content')
     
     return config.TEST_FILE_NAME
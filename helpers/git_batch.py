@@ -0,0 +1,194 @@
+"""
+This module provides long-lived git processes for a repo that many queries are pipelined
+through, instead of spawning a shell and a git process per check: 'git cat-file --batch' (or
+'--batch-check') to look up objects and path contents, and 'git update-index --stdin' to
+stage paths. The queries are written by a background thread while the answers are read, and
+yielded a chunk at a time
+"""
+
+import collections
+import subprocess
+import threading
+from helpers import command_metrics
+
+# The type and size of an object, oid is the resolved object id of the queried name
+ObjectInfo = collections.namedtuple("ObjectInfo", ["oid", "type", "size"])
+
+# Queries pipelined at once, their answers are held in memory until they are yielded
+QUERY_CHUNK_SIZE = 256
+
+
+class _BatchSession:
+    """
+    A git process reading queries from stdin, its metrics are recorded once it is closed
+    """
+
+    def __init__(self, command: str, repo_path: str = None):
+        self.command = command
+        self._popen = command_metrics.measured_popen(
+            command, cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self._process = self._popen.__enter__()
+        self._lock = threading.Lock()
+
+    def _write_all(self, lines):
+        # Runs on a writer thread while the answers of cat-file are read, so neither side can
+        # block on a full pipe
+        try:
+            for line in lines:
+                self._process.stdin.write(line)
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            pass
+
+    def _start_writer(self, lines) -> threading.Thread:
+        writer = threading.Thread(target=self._write_all, args=(lines,), daemon=True)
+        writer.start()
+        return writer
+
+    def close(self) -> str:
+        """
+        Ends the session and waits for the git process
+
+        Returns:
+        - The stderr of the process
+
+        Raises:
+        - AssertionError: If the process failed
+        """
+        if self._process.returncode is not None:
+            return ""
+        if not self._process.stdin.closed:
+            self._process.stdin.close()
+        stderr = self._process.stderr.read().decode(errors="replace")
+        self._process.wait()
+        self._popen.__exit__(None, None, None)
+        assert self._process.returncode == 0, (
+            f"'{self.command}' failed with code {self._process.returncode}: {stderr}"
+        )
+        return stderr
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+
+class CatFile(_BatchSession):
+    """
+    A 'git cat-file --batch' session, or '--batch-check' with contents=False. Objects are
+    queried by any name git understands, e.g. an object id or 'HEAD:path/to/file'
+    """
+
+    def __init__(self, repo_path: str = None, contents: bool = True):
+        """
+        Parameters:
+        - repo_path: The repo to query (defaults to the current working directory)
+        - contents: Also read the contents of the objects
+        """
+        self.contents = contents
+        super().__init__(f"git cat-file {'--batch' if contents else '--batch-check'}", repo_path)
+
+    def query(self, names):
+        """
+        Pipelines queries for many objects through the session, QUERY_CHUNK_SIZE at a time.
+        The session is free between the chunks, so the caller may query it (e.g. read a blob)
+        while iterating
+
+        Parameters:
+        - names: Iterable of object names, without newlines
+
+        Yields:
+        - (name, ObjectInfo or None if missing, contents or None) in the order of the names
+        """
+        names = list(names)
+        for start in range(0, len(names), QUERY_CHUNK_SIZE):
+            yield from self._answers(names[start:start + QUERY_CHUNK_SIZE])
+
+    def _answers(self, names: list) -> list:
+        # Writes all the queries and reads all their answers under the lock, so concurrent
+        # queries never interleave on the pipes
+        with self._lock:
+            writer = self._start_writer(f"{name}\n".encode() for name in names)
+            try:
+                return [(name, *self._read_answer()) for name in names]
+            finally:
+                writer.join()
+
+    def _read_answer(self) -> tuple:
+        stdout = self._process.stdout
+        header = stdout.readline()
+        if not header:
+            raise EOFError(f"'{self.command}' exited: {self._process.stderr.read().decode()}")
+        # '<name> missing' or '<name> ambiguous', the name may contain spaces
+        if header.rstrip(b"\n").rsplit(b" ", 1)[-1] in (b"missing", b"ambiguous"):
+            return None, None
+        fields = header.split()
+        info = ObjectInfo(fields[0].decode(), fields[1].decode(), int(fields[2]))
+        if not self.contents:
+            return info, None
+        data = stdout.read(info.size + 1)[:-1]
+        return info, data
+
+    def info(self, name: str) -> ObjectInfo:
+        """
+        Returns the ObjectInfo of an object, None if it does not exist
+        """
+        return self._answers([name])[0][1]
+
+    def read(self, name: str) -> bytes:
+        """
+        Returns the contents of an object, None if it does not exist
+        """
+        return self._answers([name])[0][2]
+
+    def missing(self, names) -> list:
+        """
+        Returns the names out of the given ones that do not resolve to an object
+        """
+        return [name for name, info, _ in self.query(names) if info is None]
+
+
+class UpdateIndex(_BatchSession):
+    """
+    A 'git update-index --stdin' session. The index stays locked until the session is closed,
+    which writes it
+    """
+
+    def __init__(self, repo_path: str = None, options: str = "--add --remove"):
+        """
+        Parameters:
+        - repo_path: The working copy whose index is updated
+        - options: update-index options applied to every path
+        """
+        super().__init__(f"git update-index -z --verbose {options} --stdin", repo_path)
+        self._updated = collections.deque()
+        self._reader = threading.Thread(target=self._read_updates, daemon=True)
+        self._reader.start()
+
+    def _read_updates(self):
+        for line in self._process.stdout:
+            self._updated.append(line.decode(errors="replace").rstrip("\n"))
+
+    def update(self, paths):
+        """
+        Sends paths (relative to the working copy) to be updated in the index, the output of
+        update-index is read on a thread of its own, so the writes cannot block on it
+        """
+        self._write_all(f"{path}\0".encode() for path in paths)
+
+    def updated(self):
+        """
+        Yields the update-index messages read so far (e.g. "add 'path'"), consuming them
+        """
+        while self._updated:
+            yield self._updated.popleft()
+
+    def close(self) -> str:
+        if not self._process.stdin.closed:
+            self._process.stdin.close()
+        self._reader.join()
+        return super().close()
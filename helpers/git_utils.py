@@ -1,13 +1,184 @@
 """
 This module provides functions to interact with the git API, specifically for creating 
-and deleting git repositories
+and deleting git repositories (one at a time or in concurrent batches). All calls go 
+through a single pooled keep-alive session
 """
 
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, Tuple, Union
+import time
 import urllib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 import config
+from helpers import rate_limit
+
+_connect_timing = threading.local()
+_session_lock = threading.Lock()
+_api_session = None  # pylint: disable=invalid-name
+_rate_governor = None  # pylint: disable=invalid-name
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP connection recording how long establishing it took for the calling thread"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds += time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection recording how long establishing it (TCP + TLS) took"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds += time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """Transport adapter whose connection pools use the timed connection classes"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def get_api_session() -> requests.Session:
+    """
+    Returns the shared GitHub API session, creating it on first use
+
+    The session keeps connections alive in a pool of GH_API_POOL_SIZE connections, sends the
+    auth headers with every request and retries transport errors (and 502/503/504 responses
+    for idempotent methods) up to GH_API_RETRIES times
+
+    Returns:
+    - requests.Session: The session shared by every API call in the suite
+    """
+    global _api_session  # pylint: disable=global-statement
+    
+    with _session_lock:
+        if _api_session is None:
+            retries = Retry(
+                total=config.GH_API_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False,
+            )
+            adapter = _TimedHTTPAdapter(
+                pool_connections=config.GH_API_POOL_SIZE,
+                pool_maxsize=config.GH_API_POOL_SIZE,
+                max_retries=retries,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {config.GH_TOKEN}",
+                "Accept": "application/vnd.github+json",
+            })
+            _api_session = session
+    
+    return _api_session
+
+
+def get_rate_governor() -> rate_limit.RateLimitGovernor:
+    """
+    Returns the rate limit governor shared by every API call, creating it on first use
+
+    The configured GH_API_RATE is the budget of the whole run, so under xdist it is split
+    evenly between the workers
+
+    Returns:
+    - rate_limit.RateLimitGovernor: The governor pacing the API calls of this process
+    """
+    global _rate_governor  # pylint: disable=global-statement
+    
+    with _session_lock:
+        if _rate_governor is None:
+            workers = int(os.getenv("PYTEST_XDIST_WORKER_COUNT", "1"))
+            _rate_governor = rate_limit.RateLimitGovernor(
+                rate=config.GH_API_RATE / workers,
+                burst=config.GH_API_BURST,
+                low_water=config.GH_API_RATE_LOW_WATER,
+            )
+    
+    return _rate_governor
+
+
+def close_api_session():
+    """
+    Closes the shared GitHub API session and its pooled connections, and drops the rate limit
+    governor, so a new session starts with a fresh one
+    """
+    global _api_session, _rate_governor  # pylint: disable=global-statement
+    
+    with _session_lock:
+        if _api_session is not None:
+            _api_session.close()
+            _api_session = None
+        _rate_governor = None
+
+
+def api_request(method: str, path: str, **kwargs) -> requests.Response:
+    """
+    Sends a request to the GitHub API through the shared session and logs its timing. 
+    Requests are paced by the shared rate limit governor and retried when rejected by a 
+    rate limit
+
+    Parameters:
+    - method: The HTTP method e.g. 'POST'
+    - path: The API path relative to GH_API_URL e.g. '/user/repos'
+    - kwargs: Passed on to requests.Session.request
+
+    Returns:
+    - requests.Response: The API response
+    """
+    kwargs.setdefault("timeout", 30)
+    url = f"{config.GH_API_URL}{path}"
+    governor = get_rate_governor()
+    
+    for attempt in range(config.GH_API_RATE_LIMIT_RETRIES + 1):
+        governor.acquire()
+        
+        _connect_timing.seconds = 0.0
+        start = time.perf_counter()
+        response = get_api_session().request(method, url, **kwargs)
+        total = time.perf_counter() - start
+        connect = _connect_timing.seconds
+        
+        # elapsed spans sending the request until the response headers are parsed
+        logging.info(
+            f"API {method} {path} -> {response.status_code} in {total * 1000:.1f} ms "
+            f"(connection setup {connect * 1000:.1f} ms, "
+            f"server {max(response.elapsed.total_seconds() - connect, 0) * 1000:.1f} ms, "
+            f"{'new' if connect else 'reused'} connection)"
+        )
+        
+        governor.observe(response)
+        if not rate_limit.is_rate_limited(response):
+            break
+        logging.warning(f"API {method} {path} was rate limited (attempt {attempt + 1})")
+    
+    return response
 
 
 def api_create_github_repo(repo_name: str) -> requests.Response:
@@ -32,16 +203,12 @@ def api_create_github_repo(repo_name: str) -> requests.Response:
     
     logging.info(f"Creating repo with name: {repo_name}")
     
-    url = f"{config.GH_API_URL}/user/repos"
-    headers = {
-        "Authorization": f"Bearer {config.GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
     data = {"name": repo_name, "private": True}
-    response = requests.post(url, json=data, headers=headers, timeout=30)
+    response = api_request("POST", "/user/repos", json=data)
     
     if response.status_code != 201:
-        raise requests.exceptions.HTTPError(f"Repo creation failed: {response.text}")
+        raise requests.exceptions.HTTPError(f"Repo creation failed: {response.text}",
+                                            response=response)
         
     logging.info(f"Successfully created repo with name: {repo_name}")
     return response
@@ -66,17 +233,60 @@ def api_delete_github_repo(repo_name: str) -> requests.Response:
     
     # URL encode the repo name to handle special characters in the name.
     repo_name_encoded = urllib.parse.quote(repo_name)
-    url = f"{config.GH_API_URL}/repos/{os.getenv('GH_USERNAME')}/{repo_name_encoded}"
-    
-    headers = {
-        "Authorization": f"Bearer {config.GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
-    
-    response = requests.delete(url, headers=headers, timeout=30)
+    response = api_request("DELETE", f"/repos/{config.GH_USERNAME}/{repo_name_encoded}")
     
     if response.status_code != 204:
-        raise requests.exceptions.HTTPError(f"Repo deletion failed: {response.text}")
+        raise requests.exceptions.HTTPError(f"Repo deletion failed: {response.text}",
+                                            response=response)
     
     logging.info(f"Successfully deleted repo with name: {repo_name}")
     return response
+
+
+def _run_batch(
+    api_call: Callable[[str], requests.Response], repo_names: Iterable[str], max_workers: int
+) -> Iterator[Tuple[str, Union[requests.Response, Exception]]]:
+    """
+    Runs an API helper for many repos on a bounded thread pool and yields results as they complete
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or config.GH_API_CONCURRENCY) as executor:
+        futures = {executor.submit(api_call, name): name for name in repo_names}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except (requests.exceptions.RequestException, OSError) as error:
+                yield futures[future], error
+
+
+def api_create_github_repos(
+    repo_names: Iterable[str], max_workers: int = None
+) -> Iterator[Tuple[str, Union[requests.Response, Exception]]]:
+    """
+    Creates many git repos concurrently using the git API
+
+    Parameters:
+    - repo_names: The names of the repos to be created
+    - max_workers: The number of concurrent requests (defaults to GH_API_CONCURRENCY)
+
+    Returns:
+    - An iterator of (repo name, response) pairs in completion order, the response being
+      replaced by the raised exception when the creation of that repo failed
+    """
+    return _run_batch(api_create_github_repo, repo_names, max_workers)
+
+
+def api_delete_github_repos(
+    repo_names: Iterable[str], max_workers: int = None
+) -> Iterator[Tuple[str, Union[requests.Response, Exception]]]:
+    """
+    Deletes many git repos concurrently using the git API
+
+    Parameters:
+    - repo_names: The names of the repos to be deleted
+    - max_workers: The number of concurrent requests (defaults to GH_API_CONCURRENCY)
+
+    Returns:
+    - An iterator of (repo name, response) pairs in completion order, the response being
+      replaced by the raised exception when the deletion of that repo failed
+    """
+    return _run_batch(api_delete_github_repo, repo_names, max_workers)
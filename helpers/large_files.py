@@ -0,0 +1,113 @@
+"""
+This module provides generators of large files for the add/commit/push throughput tests:
+sparse files (truncate), preallocated files (posix_fallocate) and files written in chunks
+with zero or compressible content from a reusable buffer, or incompressible content of fresh
+random bytes per chunk
+"""
+
+import os
+import random
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Kinds of content create_file writes
+ZEROS = "zeros"
+COMPRESSIBLE = "compressible"
+INCOMPRESSIBLE = "incompressible"
+CONTENTS = (ZEROS, COMPRESSIBLE, INCOMPRESSIBLE)
+
+_buffers = {}
+
+
+def create_sparse_file(path: str, size: int) -> str:
+    """
+    Creates a file of the given size without allocating its blocks (reads as zeros)
+
+    Parameters:
+    - path: The file to create
+    - size: The size in bytes
+
+    Returns:
+    - The path of the file
+    """
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return path
+
+
+def create_allocated_file(path: str, size: int) -> str:
+    """
+    Creates a zero-filled file of the given size with all its blocks allocated, with
+    posix_fallocate where available and chunked writes elsewhere
+
+    Parameters:
+    - path: The file to create
+    - size: The size in bytes
+
+    Returns:
+    - The path of the file
+    """
+    if not hasattr(os, "posix_fallocate"):
+        return create_file(path, size, ZEROS)
+    with open(path, 'wb') as f:
+        if size:
+            os.posix_fallocate(f.fileno(), 0, size)
+    return path
+
+
+def content_buffer(content: str) -> memoryview:
+    """
+    Returns the reusable CHUNK_SIZE buffer of the zero or compressible content, built once per
+    process
+
+    Parameters:
+    - content: ZEROS or COMPRESSIBLE, incompressible content is never reused
+    """
+    if content not in _buffers:
+        if content == ZEROS:
+            data = bytes(CHUNK_SIZE)
+        elif content == COMPRESSIBLE:
+            line = b"the quick brown fox jumps over the lazy dog 0123456789\n"
+            data = (line * (CHUNK_SIZE // len(line) + 1))[:CHUNK_SIZE]
+        else:
+            raise ValueError(f"No reusable buffer for content '{content}', expected "
+                             f"{ZEROS} or {COMPRESSIBLE}")
+        _buffers[content] = memoryview(data)
+    return _buffers[content]
+
+
+def create_file(path: str, size: int, content: str = INCOMPRESSIBLE, seed: int = 0) -> str:
+    """
+    Creates a file of the given size in chunks. Incompressible chunks are fresh random bytes
+    seeded with the seed and the chunk index, so no part of the file repeats. The zero and
+    compressible chunks are written from a reusable buffer, the first 8 bytes of every
+    compressible chunk hold its index so no two of them are identical
+
+    Parameters:
+    - path: The file to create
+    - size: The size in bytes
+    - content: One of CONTENTS
+    - seed: Seed of the incompressible content, files with different seeds differ throughout
+
+    Returns:
+    - The path of the file
+    """
+    if content not in CONTENTS:
+        raise ValueError(f"Unknown content '{content}', expected one of {CONTENTS}")
+    buffer = content_buffer(content) if content != INCOMPRESSIBLE else None
+    with open(path, 'wb', buffering=0) as f:
+        written = 0
+        index = 0
+        while written < size:
+            length = min(CHUNK_SIZE, size - written)
+            if content == INCOMPRESSIBLE:
+                f.write(random.Random(f"{seed}:{index}").randbytes(length))
+            elif content == ZEROS:
+                f.write(buffer[:length])
+            else:
+                stamp = index.to_bytes(8, "little")[:length]
+                f.write(stamp)
+                f.write(buffer[len(stamp):length])
+            written += length
+            index += 1
+    return path
@@ -0,0 +1,579 @@
+"""
+This module provides a local stand-in for GitHub so the suite can run without round-trips
+to github.com. It implements the subset of the REST API used by the helpers (repo creation
+and deletion) and serves smart-HTTP git by wrapping `git http-backend` over bare repos on disk.
+The git traffic is metered per repo and operation (see LocalGitHubServer.transfer_stats)
+"""
+
+import contextlib
+import dataclasses
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+GIT_PATH_PATTERN = re.compile(r'^/(?P<owner>[^/]+)/(?P<repo>[^/]+?)(?:\.git)?(?P<rest>/.*)$')
+REPOS_PATH_PATTERN = re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)$')
+# Owner and repo names GitHub accepts, '.' and '..' excepted
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Git operations the transfers are accounted under, by the service they go to
+OPERATIONS = {"git-upload-pack": "fetch", "git-receive-pack": "push"}
+
+
+@dataclasses.dataclass
+class TransferStats:
+    """
+    Transfer counters of the git operations of a repo
+
+    Attributes:
+    - requests: HTTP requests served
+    - advertisements: Ref advertisements (info/refs) served
+    - negotiation_rounds: Requests to the service itself: a push takes one, a fetch takes one
+      per have/ack round and one for the pack (plus one to list the refs with protocol v2)
+    - request_bytes: Request body bytes received, as sent on the wire (possibly gzipped)
+    - response_bytes: Response body bytes sent
+    - pack_bytes: Bytes of the pack sent by a fetch or received by a push
+    """
+    requests: int = 0
+    advertisements: int = 0
+    negotiation_rounds: int = 0
+    request_bytes: int = 0
+    response_bytes: int = 0
+    pack_bytes: int = 0
+
+    def __sub__(self, other: "TransferStats") -> "TransferStats":
+        return TransferStats(*(getattr(self, field.name) - getattr(other, field.name)
+                               for field in dataclasses.fields(self)))
+
+    def __add__(self, other: "TransferStats") -> "TransferStats":
+        return TransferStats(*(getattr(self, field.name) + getattr(other, field.name)
+                               for field in dataclasses.fields(self)))
+
+
+class _PackMeter:
+    """
+    Counts the pack bytes in a stream of pkt-lines: sideband channel 1 data, or the raw pack
+    following the pkt-lines (a push, or a fetch without sideband)
+    """
+
+    def __init__(self):
+        self.pack_bytes = 0
+        self._header = b""
+        self._remaining = 0
+        self._band = None
+        self._raw = False
+        self._broken = False
+
+    def feed(self, data: bytes) -> int:
+        """
+        Consumes a chunk of the stream, returns the number of pack bytes in it
+        """
+        before = self.pack_bytes
+        view = memoryview(data)
+        while view and not self._broken:
+            if self._raw:
+                self.pack_bytes += len(view)
+                break
+            if self._remaining:
+                if self._band is None:
+                    self._band = view[0]
+                    self._remaining -= 1
+                    view = view[1:]
+                    continue
+                size = min(self._remaining, len(view))
+                if self._band == 1:
+                    self.pack_bytes += size
+                self._remaining -= size
+                view = view[size:]
+                continue
+            needed = 4 - len(self._header)
+            self._header += bytes(view[:needed])
+            view = view[needed:]
+            if len(self._header) < 4:
+                break
+            header, self._header = self._header, b""
+            if header == b"PACK":
+                self._raw = True
+                self.pack_bytes += 4
+                continue
+            try:
+                length = int(header, 16)
+            except ValueError:
+                # Not pkt-lines (e.g. a gzipped body), the pack cannot be told apart
+                self._broken = True
+                break
+            # Flush, delimiter and response-end packets (0000-0002) have no payload
+            if length > 4:
+                self._remaining = length - 4
+                self._band = None
+        return self.pack_bytes - before
+
+
+class LocalGitHubServer:
+    """
+    Threaded HTTP server emulating the GitHub API endpoints and git smart-HTTP transport
+
+    Bare repos are stored as `<repo_root>/<owner>/<repo>.git`, which is the layout
+    `git http-backend` expects under `GIT_PROJECT_ROOT`
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, repo_root: str = None,
+                 rate_limit: int = None, rate_limit_window: float = 3600):
+        """
+        Parameters:
+        - host: The interface to bind to (loopback by default)
+        - port: The port to listen on, 0 picks a free one
+        - repo_root: Directory to keep the bare repos in, a temporary one is used if None
+        - rate_limit: Number of API calls allowed per window, None disables the rate limit
+          headers entirely
+        - rate_limit_window: Length of the rate limit window in seconds
+        """
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self._rate_lock = threading.Lock()
+        self._rate_used = 0
+        self._rate_reset = time.time() + rate_limit_window
+        self._retry_after_until = 0.0
+        self._owns_repo_root = repo_root is None
+        self.repo_root = repo_root or tempfile.mkdtemp(prefix="local_github_")
+        self._httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread = None
+        # The base URL advertised in the repo representations, e.g. a network emulator's
+        self.public_url = None
+        self._transfers = {}
+        self._transfer_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """The URL serving both the API and git, to be used for GH_URL and GH_API_URL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def repo_path(self, owner: str, repo_name: str) -> str:
+        """
+        Returns the on-disk path of the bare repo backing the given owner/repo pair
+
+        Raises:
+        - ValueError: If the owner or the repo name is not a valid GitHub name, or the path
+          would not be under the repo root
+        """
+        for name in (owner, repo_name):
+            if not NAME_PATTERN.match(name) or name in (".", ".."):
+                raise ValueError(f"Invalid owner or repo name: {owner}/{repo_name}")
+        path = os.path.join(self.repo_root, owner, f"{repo_name}.git")
+        root = os.path.realpath(self.repo_root)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            raise ValueError(f"Repo path outside of the repo root: {owner}/{repo_name}")
+        return path
+
+    def start(self):
+        """
+        Starts serving requests on a background daemon thread
+        """
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="local-github", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"Local GitHub stand-in listening on {self.base_url}")
+
+    def stop(self):
+        """
+        Stops the server and removes the repo root if it was created by the server
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+        if self._owns_repo_root:
+            shutil.rmtree(self.repo_root, ignore_errors=True)
+        logging.info("Local GitHub stand-in stopped")
+
+    def create_repo(self, owner: str, repo_name: str) -> bool:
+        """
+        Initializes an empty bare repo, returns False if it already exists
+
+        Raises:
+        - ValueError: If the owner or the repo name is invalid (see repo_path)
+        """
+        path = self.repo_path(owner, repo_name)
+        if os.path.exists(path):
+            return False
+        subprocess.run(
+            ['git', 'init', '--quiet', '--bare',
+             f'--initial-branch={config.DEFAULT_BRANCH}', path],
+            check=True, capture_output=True
+        )
+        # Allow emptying the repo again by deleting its refs, which is how pooled repos are reset
+        subprocess.run(
+            ['git', '--git-dir', path, 'config', 'receive.denyDeleteCurrent', 'ignore'],
+            check=True, capture_output=True
+        )
+        return True
+
+    def delete_repo(self, owner: str, repo_name: str) -> bool:
+        """
+        Removes a bare repo from disk, returns False if it does not exist
+
+        Raises:
+        - ValueError: If the owner or the repo name is invalid (see repo_path)
+        """
+        path = self.repo_path(owner, repo_name)
+        if not os.path.isdir(path):
+            return False
+        shutil.rmtree(path)
+        return True
+
+    def account(self, owner: str, repo_name: str, operation: str, **increments):
+        """
+        Adds to the transfer counters (TransferStats field names) of an operation of a repo
+        """
+        with self._transfer_lock:
+            stats = self._transfers.setdefault((owner, repo_name, operation), TransferStats())
+            for name, value in increments.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def transfer_stats(self, owner: str = None, repo_name: str = None) -> dict:
+        """
+        Returns the transfer counters served so far, summed over the repos matching the
+        given owner and name (all of them if None)
+
+        Returns:
+        - {operation: TransferStats}, the operations being 'fetch' (clone included), 'push'
+          and 'other' (e.g. dumb HTTP requests)
+        """
+        totals = {}
+        with self._transfer_lock:
+            for (stats_owner, stats_repo, operation), stats in self._transfers.items():
+                if owner not in (None, stats_owner) or repo_name not in (None, stats_repo):
+                    continue
+                totals[operation] = totals.get(operation, TransferStats()) + stats
+        return totals
+
+    @contextlib.contextmanager
+    def metered(self, owner: str = None, repo_name: str = None):
+        """
+        Context manager metering the transfers of the repos matching the given owner and name
+        while it is active, e.g. to assert the bytes sent by a push
+
+        Yields:
+        - A dict filled on exit with the {operation: TransferStats} of the transfers served
+          in the meantime
+        """
+        before = self.transfer_stats(owner, repo_name)
+        transfers = {}
+        yield transfers
+        for operation, stats in self.transfer_stats(owner, repo_name).items():
+            delta = stats - before.get(operation, TransferStats())
+            if delta != TransferStats():
+                transfers[operation] = delta
+
+    def throttle(self, seconds: int):
+        """
+        Emulates a GitHub secondary rate limit, API calls are answered with 429 and a
+        Retry-After header for the given number of seconds
+        """
+        with self._rate_lock:
+            self._retry_after_until = time.time() + seconds
+
+    def consume_rate_limit(self) -> tuple:
+        """
+        Accounts for one API call against the emulated rate limits
+
+        Returns:
+        - A tuple of the status code to reject the call with (None if allowed) and the
+          rate limit headers to send back
+        """
+        with self._rate_lock:
+            now = time.time()
+            if now < self._retry_after_until:
+                return 429, {"Retry-After": str(math.ceil(self._retry_after_until - now))}
+            if self.rate_limit is None:
+                return None, {}
+            if now >= self._rate_reset:
+                self._rate_used = 0
+                self._rate_reset = now + self.rate_limit_window
+            status = None
+            if self._rate_used >= self.rate_limit:
+                status = 403
+            else:
+                self._rate_used += 1
+            return status, {
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": str(self.rate_limit - self._rate_used),
+                "X-RateLimit-Used": str(self._rate_used),
+                "X-RateLimit-Reset": str(math.ceil(self._rate_reset)),
+            }
+
+    def repo_details(self, owner: str, repo_name: str) -> dict:
+        """
+        Builds the subset of the GitHub repo representation the suite relies on
+        """
+        base_url = self.public_url or self.base_url
+        return {
+            "name": repo_name,
+            "full_name": f"{owner}/{repo_name}",
+            "private": True,
+            "owner": {"login": owner},
+            "html_url": f"{base_url}/{owner}/{repo_name}",
+            "clone_url": f"{base_url}/{owner}/{repo_name}.git",
+            "default_branch": config.DEFAULT_BRANCH,
+        }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Dispatches API calls to the stand-in and git transport calls to `git http-backend`
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, with Nagle enabled the body of a response on
+    # a kept-alive connection waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    @property
+    def stand_in(self) -> LocalGitHubServer:
+        """The server instance owning this handler"""
+        return self.server.stand_in
+
+    def handle_one_request(self):
+        # Handlers live as long as their (kept-alive) connection, state is per request
+        self._rate_headers = {}
+        self._transfer = None
+        self._request_meter = self._response_meter = None
+        super().handle_one_request()
+
+    def _account_body(self, chunk: bytes, meter: "_PackMeter", direction: str):
+        # Counted before the chunk is passed on, so the counters are up to date by the time
+        # the client sees the end of its transfer
+        if self._transfer is None:
+            return
+        increments = {direction: len(chunk)}
+        if meter is not None:
+            increments["pack_bytes"] = meter.feed(chunk)
+        self.stand_in.account(*self._transfer, **increments)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logging.debug(f"local-github: {format % args}")
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serves the ref advertisements of the git transport"""
+        self._handle_git()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Serves the repo creation API call and the git transport requests"""
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/user/repos":
+            if not self._rate_limited():
+                self._create_repo()
+        else:
+            self._handle_git()
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """Serves the repo deletion API call"""
+        if self._rate_limited():
+            return
+        match = REPOS_PATH_PATTERN.match(urllib.parse.urlsplit(self.path).path)
+        if not match:
+            self._send_json(404, {"message": "Not Found"})
+            return
+        owner = urllib.parse.unquote(match['owner'])
+        repo_name = urllib.parse.unquote(match['repo'])
+        try:
+            deleted = self.stand_in.delete_repo(owner, repo_name)
+        except ValueError:
+            deleted = False
+        if deleted:
+            self._send_json(204, None)
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+    def _rate_limited(self) -> bool:
+        """
+        Applies the emulated rate limits to an API call, answering it when it is rejected
+        """
+        status, self._rate_headers = self.stand_in.consume_rate_limit()
+        if status is None:
+            return False
+        self._read_body()
+        self._send_json(status, {"message": "API rate limit exceeded"})
+        return True
+
+    def _create_repo(self):
+        body = self._read_body()
+        try:
+            repo_name = json.loads(body or b'{}')["name"]
+        except (ValueError, KeyError):
+            self._send_json(422, {"message": "Validation Failed"})
+            return
+        owner = config.GH_USERNAME
+        try:
+            created = self.stand_in.create_repo(owner, str(repo_name))
+        except ValueError:
+            self._send_json(422, {"message": "Validation Failed"})
+            return
+        if not created:
+            self._send_json(422, {"message": "name already exists on this account"})
+            return
+        self._send_json(201, self.stand_in.repo_details(owner, repo_name))
+
+    def _handle_git(self):
+        url = urllib.parse.urlsplit(self.path)
+        match = GIT_PATH_PATTERN.match(url.path)
+        if not match:
+            self._send_json(404, {"message": "Not Found"})
+            return
+        owner = urllib.parse.unquote(match['owner'])
+        repo_name = urllib.parse.unquote(match['repo'])
+        try:
+            found = os.path.isdir(self.stand_in.repo_path(owner, repo_name))
+        except ValueError:
+            found = False
+        if not found:
+            self._send_json(404, {"message": "Repository not found"})
+            return
+
+        env = dict(os.environ)
+        env.update({
+            "GIT_PROJECT_ROOT": self.stand_in.repo_root,
+            "GIT_HTTP_EXPORT_ALL": "1",
+            "PATH_INFO": f"/{owner}/{repo_name}.git{match['rest']}",
+            "QUERY_STRING": url.query,
+            "REQUEST_METHOD": self.command,
+            "REMOTE_USER": owner,
+            "REMOTE_ADDR": self.client_address[0],
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            # Partial clones (--filter) and their lazy fetches are served, as on GitHub
+            "GIT_CONFIG_COUNT": "2",
+            "GIT_CONFIG_KEY_0": "uploadpack.allowFilter",
+            "GIT_CONFIG_VALUE_0": "true",
+            "GIT_CONFIG_KEY_1": "uploadpack.allowAnySHA1InWant",
+            "GIT_CONFIG_VALUE_1": "true",
+        })
+        if self.headers.get("Content-Length") is not None:
+            env["CONTENT_LENGTH"] = self.headers["Content-Length"]
+        if self.headers.get("Content-Encoding"):
+            env["HTTP_CONTENT_ENCODING"] = self.headers["Content-Encoding"]
+        if self.headers.get("Git-Protocol"):
+            env["GIT_PROTOCOL"] = self.headers["Git-Protocol"]
+
+        service = urllib.parse.parse_qs(url.query).get("service", [""])[0]
+        advertisement = match['rest'] == "/info/refs"
+        if not advertisement:
+            service = match['rest'].rsplit("/", 1)[-1]
+        operation = OPERATIONS.get(service, "other")
+        self._transfer = (owner, repo_name, operation)
+        self.stand_in.account(*self._transfer, requests=1,
+                              advertisements=int(advertisement and operation != "other"),
+                              negotiation_rounds=int(not advertisement and operation != "other"))
+        # The pack goes out in the response of a fetch and comes in with the request of a push
+        self._request_meter = _PackMeter() if operation == "push" and not advertisement else None
+        self._response_meter = (_PackMeter() if operation == "fetch" and not advertisement
+                                else None)
+
+        with subprocess.Popen(
+            ['git', 'http-backend'], env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ) as backend:
+            writer = threading.Thread(target=self._pipe_body, args=(backend.stdin,), daemon=True)
+            writer.start()
+            self._relay_cgi_response(backend.stdout)
+            writer.join()
+
+    def _iter_body(self):
+        """
+        Yields the request body in chunks, decoding chunked transfer encoding when used
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                remaining = size
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, COPY_CHUNK_SIZE))
+                    remaining -= len(chunk)
+                    self._account_body(chunk, self._request_meter, "request_bytes")
+                    yield chunk
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining:
+                chunk = self.rfile.read(min(remaining, COPY_CHUNK_SIZE))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                self._account_body(chunk, self._request_meter, "request_bytes")
+                yield chunk
+
+    def _read_body(self) -> bytes:
+        return b''.join(self._iter_body())
+
+    def _pipe_body(self, stdin):
+        chunks = self._iter_body()
+        try:
+            for chunk in chunks:
+                stdin.write(chunk)
+        except BrokenPipeError:
+            # The rest of the body is still read, the next request of the connection follows it
+            for _ in chunks:
+                pass
+        finally:
+            stdin.close()
+
+    def _relay_cgi_response(self, stdout):
+        status = 200
+        headers = []
+        for raw_line in iter(stdout.readline, b''):
+            line = raw_line.decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.lower() == 'status':
+                status = int(value.strip().split()[0])
+            else:
+                headers.append((name, value.strip()))
+
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        # Without a length from the CGI output the body is sent chunked, so the connection can
+        # be reused, HTTP/1.0 clients get it delimited by closing the connection instead
+        delimited = any(name.lower() == 'content-length' for name, _ in headers)
+        chunked = not delimited and self.request_version == "HTTP/1.1"
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        elif not delimited:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        for chunk in iter(lambda: stdout.read1(COPY_CHUNK_SIZE), b''):
+            self._account_body(chunk, self._response_meter, "response_bytes")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in self._rate_headers.items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
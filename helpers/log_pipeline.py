@@ -0,0 +1,174 @@
+"""
+This module provides the logging pipeline of the test harness. Log records are put on a
+bounded queue and written to the terminal by a background thread, so big command outputs
+no longer block the tests on the terminal. Messages are formatted lazily by the writer,
+every record is truncated to config.LOG_MAX_RECORD_CHARS on its way to the terminal, and in
+compact mode only the command, its duration and its return code are written. The full
+records of the running test are kept in a ring buffer and replayed into the report of a
+failed test
+"""
+
+import collections
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import config
+
+FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Extra of the records only written to the terminal in full mode (command output) and of the
+# records only written in compact mode (one line summaries of a command)
+FULL = {"log_detail": "full"}
+COMPACT = {"log_detail": "compact"}
+
+_listener = None  # pylint: disable=invalid-name
+_queue_handler = None  # pylint: disable=invalid-name
+_buffer_handler = None  # pylint: disable=invalid-name
+
+
+class _TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves the formatting to the writer thread and never blocks: records
+    are truncated to a size limit, and dropped (and counted) while the queue is full
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def _truncate(self, value):
+        if isinstance(value, str) and len(value) > self.max_chars:
+            return f"{value[:self.max_chars]}... [{len(value) - self.max_chars} chars truncated]"
+        return value
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            return super().prepare(record)
+        record = copy.copy(record)
+        if isinstance(record.args, tuple) and record.args:
+            record.args = tuple(self._truncate(arg) for arg in record.args)
+        elif not record.args:
+            record.msg = self._truncate(record.msg)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _DetailFilter(logging.Filter):
+    """
+    Lets through the records meant for the current mode (see FULL and COMPACT)
+    """
+
+    def __init__(self, compact: bool):
+        super().__init__()
+        self.skipped = FULL["log_detail"] if compact else COMPACT["log_detail"]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "log_detail", None) != self.skipped
+
+
+class _RingBufferHandler(logging.Handler):
+    """
+    Keeps the last records of the running test, unformatted and untruncated
+    """
+
+    def __init__(self, size: int):
+        super().__init__()
+        self.records = collections.deque(maxlen=size)
+        self.setFormatter(logging.Formatter(FORMAT))
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+
+def _terminal_stream(pytest_config):
+    # A duplicate of the terminal's stderr, taken while pytest's output capturing is
+    # suspended, so the writer thread is not captured along with the running test
+    capture_manager = pytest_config.pluginmanager.getplugin("capturemanager")
+    if capture_manager is None:
+        return sys.stderr
+    with capture_manager.global_and_fixture_disabled():
+        sys.stderr.flush()
+        return os.fdopen(os.dup(sys.stderr.fileno()), "w", encoding="utf-8",
+                         errors="replace", buffering=1)
+
+
+def install(pytest_config):
+    """
+    Sets up logging for the test session, the queue-backed pipeline unless
+    config.LOG_PIPELINE is disabled (then a synchronous handler with pytest's live logging)
+
+    Parameters:
+    - pytest_config: The pytest configuration object
+    """
+    global _listener, _queue_handler, _buffer_handler  # pylint: disable=global-statement
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    if not config.LOG_PIPELINE:
+        logging.basicConfig(level=logging.INFO, format=FORMAT, handlers=[logging.StreamHandler()])
+        pytest_config.option.log_cli = True
+        pytest_config.option.log_cli_level = "INFO"
+        return
+
+    terminal = logging.StreamHandler(_terminal_stream(pytest_config))
+    terminal.setFormatter(logging.Formatter(FORMAT))
+    terminal.addFilter(_DetailFilter(config.LOG_COMPACT))
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    _queue_handler = _TruncatingQueueHandler(log_queue, config.LOG_MAX_RECORD_CHARS)
+    _buffer_handler = _RingBufferHandler(config.LOG_BUFFER_RECORDS)
+    _listener = logging.handlers.QueueListener(log_queue, terminal, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_queue_handler)
+    root.addHandler(_buffer_handler)
+    # pytest's live logging (e.g. --log-cli-level on the command line) would write every
+    # record a second time, synchronously and without the LOG_COMPACT filter
+    pytest_config.option.log_cli = False
+    pytest_config.option.log_cli_level = None
+    if getattr(pytest_config.option, "log_level", "") is None:
+        # pytest's own per-test log capture formats every record synchronously; the ring
+        # buffer replay takes over the INFO records of failed tests
+        pytest_config.option.log_level = "WARNING"
+
+
+def start_test():
+    """
+    Empties the ring buffer for the next test
+    """
+    if _buffer_handler is not None:
+        _buffer_handler.records.clear()
+
+
+def replay() -> str:
+    """
+    Returns the full, formatted log of the running test kept in the ring buffer
+    """
+    if _buffer_handler is None:
+        return ""
+    return "\n".join(_buffer_handler.format(record) for record in _buffer_handler.records)
+
+
+def shutdown():
+    """
+    Writes out the queued records and stops the writer thread
+    """
+    global _listener, _queue_handler, _buffer_handler  # pylint: disable=global-statement
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    root.removeHandler(_buffer_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+    if _queue_handler.dropped:
+        sys.stderr.write(f"{_queue_handler.dropped} log records were dropped while the "
+                         f"logging queue was full\n")
+    _listener = _queue_handler = _buffer_handler = None
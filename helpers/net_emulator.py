@@ -0,0 +1,262 @@
+"""
+This module provides a network condition emulator: a local TCP proxy put between git and the
+local smart-HTTP server that delays, paces and stalls the traffic according to a profile
+(bandwidth caps per direction, one-way latency with jitter, and periodic stall windows), and
+records the bytes and duration of every connection it relayed
+"""
+
+import dataclasses
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+import urllib.parse
+
+RELAY_CHUNK_SIZE = 16 * 1024
+# Chunks read ahead of the delivery per direction of a connection, past them the reads wait
+# so the sender is held back by TCP instead of the transfer being buffered in memory
+RELAY_BUFFER_CHUNKS = 64
+
+
+@dataclasses.dataclass(frozen=True)
+class NetworkProfile:
+    """
+    Conditions of an emulated link, 0 disables the corresponding effect
+
+    Attributes:
+    - down_bandwidth: Bytes per second from the server to git, shared by all connections
+    - up_bandwidth: Bytes per second from git to the server, shared by all connections
+    - latency: One-way delay in seconds added to every chunk in each direction
+    - jitter: Random extra delay in seconds, up to this value (chunks are never reordered)
+    - stall_every: Period in seconds of the stall windows
+    - stall_for: Duration in seconds of a stall window, nothing is delivered during it
+    """
+    down_bandwidth: float = 0
+    up_bandwidth: float = 0
+    latency: float = 0
+    jitter: float = 0
+    stall_every: float = 0
+    stall_for: float = 0
+
+
+_MBIT = 1_000_000 / 8
+
+# Named profiles, selected with config.NET_PROFILE or the --network option of the benchmarks
+PROFILES = {
+    "lan": NetworkProfile(),
+    "3g": NetworkProfile(down_bandwidth=1.6 * _MBIT, up_bandwidth=0.768 * _MBIT,
+                         latency=0.150, jitter=0.030),
+    "4g": NetworkProfile(down_bandwidth=12 * _MBIT, up_bandwidth=4 * _MBIT,
+                         latency=0.035, jitter=0.010),
+    "transatlantic": NetworkProfile(down_bandwidth=100 * _MBIT, up_bandwidth=100 * _MBIT,
+                                    latency=0.045, jitter=0.005),
+    "flaky-wifi": NetworkProfile(down_bandwidth=20 * _MBIT, up_bandwidth=5 * _MBIT,
+                                 latency=0.010, jitter=0.020, stall_every=5, stall_for=1),
+}
+
+
+def get_profile(name: str) -> NetworkProfile:
+    """
+    Returns the named profile out of PROFILES
+
+    Raises:
+    - ValueError: If there is no such profile
+    """
+    try:
+        return PROFILES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown network profile '{name}', expected one of "
+                         f"{', '.join(PROFILES)}") from None
+
+
+class _Bandwidth:
+    """
+    Token bucket pacing one direction of the link, shared by all its connections
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_free = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, size: int):
+        """
+        Blocks until size bytes may be sent
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            start = max(self._next_free, time.monotonic())
+            self._next_free = start + size / self.rate
+        delay = self._next_free - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class NetworkEmulator:
+    """
+    A TCP proxy in front of an HTTP server, applying a NetworkProfile to the traffic
+    """
+
+    def __init__(self, upstream_url: str, profile: NetworkProfile, host: str = "127.0.0.1",
+                 port: int = 0, seed: int = None):
+        """
+        Parameters:
+        - upstream_url: The base URL of the server to relay to, e.g. the local stand-in's
+        - profile: The conditions to emulate
+        - host/port: The address to listen on (port 0 picks a free port)
+        - seed: Seed of the jitter, for reproducible runs
+        """
+        upstream = urllib.parse.urlsplit(upstream_url)
+        self.upstream = (upstream.hostname, upstream.port or 80)
+        self.scheme = upstream.scheme
+        self.profile = profile
+        self.transfers = []
+        self._random = random.Random(seed)
+        self._down = _Bandwidth(profile.down_bandwidth)
+        self._up = _Bandwidth(profile.up_bandwidth)
+        self._listener = socket.create_server((host, port))
+        self._started = time.monotonic()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """The base URL to use instead of the upstream one"""
+        host, port = self._listener.getsockname()[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def start(self):
+        """
+        Starts accepting connections on a background daemon thread
+        """
+        self._thread = threading.Thread(target=self._accept, name="net-emulator", daemon=True)
+        self._thread.start()
+        logging.info(f"Network emulator {self.profile} listening on {self.base_url}")
+
+    def stop(self):
+        """
+        Stops accepting connections, the ones in flight finish on their own
+        """
+        self._stopping.set()
+        if self._thread:
+            # Closing the listener does not wake up a thread blocked in accept, a connection does
+            try:
+                socket.create_connection(self._listener.getsockname()[:2]).close()
+            except OSError:
+                pass
+            self._thread.join()
+        self._listener.close()
+        summary = self.summary()
+        logging.info(f"Network emulator stopped after relaying {summary['connections']} "
+                     f"connections ({summary['up']} bytes up, {summary['down']} bytes down)")
+
+    def _accept(self):
+        while not self._stopping.is_set():
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            if self._stopping.is_set():
+                client.close()
+                return
+            threading.Thread(target=self._relay, args=(client,), daemon=True).start()
+
+    def _relay(self, client: socket.socket):
+        transfer = {"start": time.monotonic(), "up": 0, "down": 0, "duration": None}
+        try:
+            server = socket.create_connection(self.upstream)
+        except OSError as error:
+            logging.error(f"Network emulator could not reach {self.upstream}: {error}")
+            client.close()
+            return
+        for sock in (client, server):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Recorded upfront, kept-alive connections close some time after the client is done
+        with self._lock:
+            self.transfers.append(transfer)
+        directions = [
+            threading.Thread(target=self._pump,
+                             args=(client, server, self._up, transfer, "up"), daemon=True),
+            threading.Thread(target=self._pump,
+                             args=(server, client, self._down, transfer, "down"), daemon=True),
+        ]
+        for direction in directions:
+            direction.start()
+        for direction in directions:
+            direction.join()
+        client.close()
+        server.close()
+        transfer["duration"] = time.monotonic() - transfer["start"]
+
+    def _pump(self, source: socket.socket, destination: socket.socket, bandwidth: _Bandwidth,
+              transfer: dict, direction: str):
+        # Reads as fast as the source sends and hands the chunks, stamped with their delivery
+        # time, to a writer delivering them in order once due. The queue is bounded, a full
+        # one blocks the reads until the writer catches up
+        chunks = queue.Queue(maxsize=RELAY_BUFFER_CHUNKS)
+        writer = threading.Thread(target=self._deliver,
+                                  args=(chunks, destination, bandwidth), daemon=True)
+        writer.start()
+        due = 0.0
+        while True:
+            try:
+                data = source.recv(RELAY_CHUNK_SIZE)
+            except OSError:
+                data = b""
+            delay = self.profile.latency
+            if self.profile.jitter:
+                with self._lock:
+                    delay += self._random.uniform(0, self.profile.jitter)
+            due = max(due, time.monotonic() + delay)
+            chunks.put((due, data))
+            if not data:
+                break
+            transfer[direction] += len(data)
+        writer.join()
+
+    def _deliver(self, chunks: queue.Queue, destination: socket.socket,
+                 bandwidth: _Bandwidth):
+        while True:
+            due, data = chunks.get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._wait_for_stall_window()
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                bandwidth.wait(len(data))
+                destination.sendall(data)
+            except OSError:
+                break
+        # The destination is gone, drop the rest so the reader is not blocked on a full queue
+        while data:
+            _, data = chunks.get()
+
+    def _wait_for_stall_window(self):
+        if not (self.profile.stall_every and self.profile.stall_for):
+            return
+        phase = (time.monotonic() - self._started) % self.profile.stall_every
+        if phase < self.profile.stall_for:
+            time.sleep(self.profile.stall_for - phase)
+
+    def summary(self) -> dict:
+        """
+        Returns the totals of the relayed connections: count, bytes up/down and the summed
+        connection time in seconds, the connections still open counting up to now
+        """
+        now = time.monotonic()
+        with self._lock:
+            transfers = list(self.transfers)
+        return {
+            "connections": len(transfers),
+            "up": sum(transfer["up"] for transfer in transfers),
+            "down": sum(transfer["down"] for transfer in transfers),
+            "duration": sum(now - transfer["start"] if transfer["duration"] is None
+                            else transfer["duration"] for transfer in transfers),
+        }
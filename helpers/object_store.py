@@ -0,0 +1,387 @@
+"""
+This module provides a read-only, pure-Python reader of a git object store, to check
+generated or pushed repos in-process without spawning git. Loose objects are inflated with
+zlib; pack indexes (v2) and packs are memory mapped, objects are looked up through the fanout
+table and a binary search over the mapped index, and pack entries (OFS/REF deltas included)
+are inflated straight from the mapping. Only SHA-1 repos are supported
+"""
+
+import binascii
+import collections
+import glob
+import mmap
+import os
+import struct
+import zlib
+
+OID_SIZE = 20
+INFLATE_WINDOW = 64 * 1024
+DELTA_BASE_CACHE_SIZE = 256
+
+TYPE_NAMES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+# A parsed commit object, parents and tree are hex object ids
+Commit = collections.namedtuple("Commit", ["oid", "tree", "parents"])
+
+
+class ObjectStoreError(Exception):
+    """
+    Raised when an object is missing or the store cannot be parsed
+    """
+
+
+def _map(path: str) -> mmap.mmap:
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class PackIndex:
+    """
+    A memory mapped version 2 pack index
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = _map(path)
+        if self._map[:8] != b"\377tOc\0\0\0\2":
+            raise ObjectStoreError(f"{path}: only version 2 pack indexes are supported")
+        self._fanout = struct.unpack_from(">256I", self._map, 8)
+        self.count = self._fanout[255]
+        self._oids = 8 + 256 * 4
+        self._offsets = self._oids + self.count * (OID_SIZE + 4)
+        self._large_offsets = self._offsets + self.count * 4
+
+    def _oid_at(self, index: int) -> bytes:
+        start = self._oids + index * OID_SIZE
+        return self._map[start:start + OID_SIZE]
+
+    def find(self, oid: bytes) -> int:
+        """
+        Returns the pack offset of a binary object id, None if it is not in the pack
+        """
+        low = self._fanout[oid[0] - 1] if oid[0] else 0
+        high = self._fanout[oid[0]]
+        while low < high:
+            middle = (low + high) // 2
+            current = self._oid_at(middle)
+            if current < oid:
+                low = middle + 1
+            elif current > oid:
+                high = middle
+            else:
+                return self._offset_at(middle)
+        return None
+
+    def _offset_at(self, index: int) -> int:
+        offset, = struct.unpack_from(">I", self._map, self._offsets + index * 4)
+        if offset & 0x80000000:
+            offset, = struct.unpack_from(
+                ">Q", self._map, self._large_offsets + (offset & 0x7fffffff) * 8
+            )
+        return offset
+
+    def oids(self):
+        """
+        Yields the binary object ids of the pack in sorted order
+        """
+        for index in range(self.count):
+            yield self._oid_at(index)
+
+    def close(self):
+        """
+        Unmaps the index
+        """
+        self._map.close()
+
+
+class Pack:
+    """
+    A memory mapped pack with its index
+    """
+
+    def __init__(self, index_path: str, store: "ObjectStore"):
+        self.index = PackIndex(index_path)
+        self.path = index_path[:-len(".idx")] + ".pack"
+        self._map = _map(self.path)
+        self._view = memoryview(self._map)
+        self._store = store
+        self._bases = collections.OrderedDict()
+        if self._map[:4] != b"PACK":
+            raise ObjectStoreError(f"{self.path}: not a pack file")
+
+    def _entry_header(self, offset: int) -> tuple:
+        byte = self._map[offset]
+        obj_type = (byte >> 4) & 7
+        size = byte & 0x0f
+        shift = 4
+        offset += 1
+        while byte & 0x80:
+            byte = self._map[offset]
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            offset += 1
+        return obj_type, size, offset
+
+    def _inflate(self, offset: int, size: int) -> bytes:
+        # Feeds windows of the mapping (no copy) to zlib until the stream ends
+        inflater = zlib.decompressobj()
+        chunks = []
+        while not inflater.eof:
+            window = self._view[offset:offset + INFLATE_WINDOW]
+            if not window:
+                raise ObjectStoreError(f"{self.path}: truncated entry")
+            chunks.append(inflater.decompress(window))
+            offset += INFLATE_WINDOW
+        data = b"".join(chunks)
+        if len(data) != size:
+            raise ObjectStoreError(f"{self.path}: entry size mismatch")
+        return data
+
+    def read_at(self, offset: int) -> tuple:
+        """
+        Returns the (type name, data) of the entry at an offset, resolving deltas
+        """
+        cached = self._bases.get(offset)
+        if cached is not None:
+            self._bases.move_to_end(offset)
+            return cached
+
+        obj_type, size, data_offset = self._entry_header(offset)
+        if obj_type == OFS_DELTA:
+            byte = self._map[data_offset]
+            distance = byte & 0x7f
+            data_offset += 1
+            while byte & 0x80:
+                byte = self._map[data_offset]
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+                data_offset += 1
+            base_type, base = self.read_at(offset - distance)
+            result = (base_type, apply_delta(base, self._inflate(data_offset, size)))
+        elif obj_type == REF_DELTA:
+            base_oid = self._map[data_offset:data_offset + OID_SIZE]
+            base_type, base = self._store.read_binary(base_oid)
+            delta = self._inflate(data_offset + OID_SIZE, size)
+            result = (base_type, apply_delta(base, delta))
+        elif obj_type in TYPE_NAMES:
+            result = (TYPE_NAMES[obj_type], self._inflate(data_offset, size))
+        else:
+            raise ObjectStoreError(f"{self.path}: unknown entry type {obj_type} at {offset}")
+
+        self._bases[offset] = result
+        if len(self._bases) > DELTA_BASE_CACHE_SIZE:
+            self._bases.popitem(last=False)
+        return result
+
+    def close(self):
+        """
+        Unmaps the pack and its index
+        """
+        self._bases.clear()
+        self._view.release()
+        self._map.close()
+        self.index.close()
+
+
+def _delta_size(delta: bytes, position: int) -> tuple:
+    size = shift = 0
+    while True:
+        byte = delta[position]
+        position += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, position
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Applies a git delta (copy and insert instructions) to its base object
+    """
+    base_size, position = _delta_size(delta, 0)
+    result_size, position = _delta_size(delta, position)
+    if base_size != len(base):
+        raise ObjectStoreError("Delta base size mismatch")
+    base_view = memoryview(base)
+    result = bytearray()
+    while position < len(delta):
+        opcode = delta[position]
+        position += 1
+        if opcode & 0x80:
+            copy_offset = copy_size = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    copy_offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (0x10 << bit):
+                    copy_size |= delta[position] << (8 * bit)
+                    position += 1
+            result += base_view[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif opcode:
+            result += delta[position:position + opcode]
+            position += opcode
+        else:
+            raise ObjectStoreError("Invalid delta opcode 0")
+    if len(result) != result_size:
+        raise ObjectStoreError("Delta result size mismatch")
+    return bytes(result)
+
+
+class ObjectStore:
+    """
+    Read-only access to the objects of a repo (loose, packed and from alternates)
+    """
+
+    def __init__(self, git_dir: str):
+        """
+        Parameters:
+        - git_dir: The .git directory of a working copy, or a bare repo
+        """
+        if os.path.isdir(os.path.join(git_dir, ".git")):
+            git_dir = os.path.join(git_dir, ".git")
+        self.git_dir = git_dir
+        self.object_dirs = [os.path.join(git_dir, "objects")]
+        alternates = os.path.join(self.object_dirs[0], "info", "alternates")
+        if os.path.exists(alternates):
+            with open(alternates, encoding='utf-8') as f:
+                self.object_dirs += [os.path.join(self.object_dirs[0], line.strip())
+                                     for line in f if line.strip() and not line.startswith("#")]
+        self.packs = [
+            Pack(path, self)
+            for object_dir in self.object_dirs
+            for path in sorted(glob.glob(os.path.join(object_dir, "pack", "pack-*.idx")))
+        ]
+
+    def _loose_path(self, hex_oid: str) -> str:
+        for object_dir in self.object_dirs:
+            path = os.path.join(object_dir, hex_oid[:2], hex_oid[2:])
+            if os.path.exists(path):
+                return path
+        return None
+
+    def __contains__(self, oid: str) -> bool:
+        binary = binascii.unhexlify(oid)
+        return (any(pack.index.find(binary) is not None for pack in self.packs)
+                or self._loose_path(oid) is not None)
+
+    def missing(self, oids) -> list:
+        """
+        Returns the hex object ids out of the given ones that are not in the store
+        """
+        return [oid for oid in oids if oid not in self]
+
+    def read(self, oid: str) -> tuple:
+        """
+        Returns the (type name, data) of a hex object id
+
+        Raises:
+        - ObjectStoreError: If the object is not in the store
+        """
+        return self.read_binary(binascii.unhexlify(oid))
+
+    def read_binary(self, oid: bytes) -> tuple:
+        """
+        Returns the (type name, data) of a binary object id
+        """
+        for pack in self.packs:
+            offset = pack.index.find(oid)
+            if offset is not None:
+                return pack.read_at(offset)
+        hex_oid = oid.hex()
+        path = self._loose_path(hex_oid)
+        if path is None:
+            raise ObjectStoreError(f"Object {hex_oid} not found in {self.git_dir}")
+        with open(path, 'rb') as f:
+            raw = zlib.decompress(f.read())
+        header, _, data = raw.partition(b"\0")
+        obj_type, size = header.split(b" ")
+        if int(size) != len(data):
+            raise ObjectStoreError(f"Loose object {hex_oid} has a wrong size")
+        return obj_type.decode(), data
+
+    def oids(self):
+        """
+        Yields the hex ids of all the objects in the store (an object may be listed twice if
+        it is both packed and loose)
+        """
+        for pack in self.packs:
+            for oid in pack.index.oids():
+                yield oid.hex()
+        for object_dir in self.object_dirs:
+            for path in glob.glob(os.path.join(object_dir, "[0-9a-f][0-9a-f]", "*")):
+                yield os.path.basename(os.path.dirname(path)) + os.path.basename(path)
+
+    def resolve_ref(self, ref: str) -> str:
+        """
+        Returns the hex object id a ref (e.g. 'HEAD' or 'refs/heads/main') points at, None if
+        the ref does not exist
+        """
+        for _ in range(10):
+            path = os.path.join(self.git_dir, ref)
+            if os.path.isfile(path):
+                with open(path, encoding='utf-8') as f:
+                    value = f.read().strip()
+                if not value.startswith("ref: "):
+                    return value
+                ref = value[len("ref: "):]
+                continue
+            packed_refs = os.path.join(self.git_dir, "packed-refs")
+            if os.path.exists(packed_refs):
+                with open(packed_refs, encoding='utf-8') as f:
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) == 2 and fields[1] == ref:
+                            return fields[0]
+            return None
+        raise ObjectStoreError(f"Too many levels of symbolic refs at {ref}")
+
+    def commit(self, oid: str) -> Commit:
+        """
+        Returns the tree and parents of a commit
+        """
+        obj_type, data = self.read(oid)
+        if obj_type != "commit":
+            raise ObjectStoreError(f"{oid} is a {obj_type}, not a commit")
+        tree, parents = None, []
+        for line in data.split(b"\n"):
+            if not line:
+                break
+            if line.startswith(b"tree "):
+                tree = line[5:].decode()
+            elif line.startswith(b"parent "):
+                parents.append(line[7:].decode())
+        return Commit(oid, tree, tuple(parents))
+
+    def walk_commits(self, start_oid: str):
+        """
+        Yields every commit reachable from a commit, each once
+
+        Raises:
+        - ObjectStoreError: If a reachable commit is missing
+        """
+        seen = {start_oid}
+        pending = [start_oid]
+        while pending:
+            commit = self.commit(pending.pop())
+            yield commit
+            for parent in commit.parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    pending.append(parent)
+
+    def close(self):
+        """
+        Unmaps all the packs
+        """
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
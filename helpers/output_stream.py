@@ -0,0 +1,253 @@
+"""
+This module provides a streaming, bounded-memory alternative to run_shell_command for
+commands with large outputs (e.g. 'git log' on a generated repo): stdout is decoded and
+yielded line by line (or chunk by chunk) as it arrives, only a bounded head and tail of it
+are kept for logging, and incremental matchers evaluate assertions on the fly, optionally
+stopping the command as soon as all of them matched
+"""
+
+import codecs
+import collections
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import config
+from helpers import command_metrics, log_pipeline
+
+READ_SIZE = 64 * 1024
+
+
+class Contains:
+    """
+    Matcher for a text occurring anywhere in the output, also across line and chunk boundaries
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.matched = False
+        self._carry = ""
+
+    def feed(self, data: str):
+        """
+        Feeds the next line or chunk of the output
+        """
+        if self.matched:
+            return
+        window = self._carry + data
+        self.matched = self.text in window
+        self._carry = window[-(len(self.text) - 1):] if len(self.text) > 1 else ""
+
+    def __repr__(self):
+        return f"Contains({self.text!r})"
+
+
+class Matches:
+    """
+    Matcher for a regular expression, searched in every line (or chunk) of the output
+    """
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = re.compile(pattern, flags)
+        self.matched = False
+        self.match = None
+
+    def feed(self, data: str):
+        """
+        Feeds the next line or chunk of the output
+        """
+        if not self.matched:
+            self.match = self.pattern.search(data)
+            self.matched = self.match is not None
+
+    def __repr__(self):
+        return f"Matches({self.pattern.pattern!r})"
+
+
+class StreamedCommand:
+    """
+    A shell command whose stdout is consumed as a stream. Iterate over it (inside a with
+    block) to get the decoded lines, or chunks if chunk_size is set, as they arrive.
+    Leaving the with block drains the remaining output, waits for the command, records its
+    metrics and, unless with_errors is set, asserts like run_shell_command
+    """
+
+    def __init__(self, command: str, with_errors: bool = False, with_logging: bool = True,
+                 cwd: str = None, env: dict = None, matchers: list = (),
+                 stop_on_match: bool = False, chunk_size: int = None,
+                 head_lines: int = None, tail_lines: int = None):
+        """
+        Parameters:
+        - command: The shell command to execute
+        - with_errors: If False, asserts that there are no errors in the command execution
+        - with_logging: If True, the command and the head/tail of its output are logged
+        - cwd: The directory to run the command in (defaults to the current working directory)
+        - env: Environment variables to set for the command on top of the current environment
+        - matchers: Objects with feed(data) and a matched attribute (e.g. Contains, Matches)
+        - stop_on_match: Stop the command as soon as all the matchers matched
+        - chunk_size: Yield decoded chunks of up to this many bytes instead of lines
+        - head_lines/tail_lines: The number of first/last lines (or chunks) kept for logging
+        (default to config.STREAM_HEAD_LINES/config.STREAM_TAIL_LINES)
+        """
+        self.command = command
+        self.with_errors = with_errors
+        self.with_logging = with_logging
+        self.cwd = cwd
+        self.env = {**os.environ, **env} if env is not None else None
+        self.matchers = list(matchers)
+        self.stop_on_match = stop_on_match and bool(self.matchers)
+        self.chunk_size = chunk_size
+        self.head = []
+        self.head_size = config.STREAM_HEAD_LINES if head_lines is None else head_lines
+        self.tail = collections.deque(
+            maxlen=config.STREAM_TAIL_LINES if tail_lines is None else tail_lines
+        )
+        self.lines = 0
+        self.bytes = 0
+        self.stderr = ""
+        self.stopped = False
+        self.returncode = None
+        self._popen = None
+        self._process = None
+        self._stderr_chunks = collections.deque()
+        self._stderr_size = 0
+        self._stderr_thread = None
+
+    @property
+    def matched(self) -> bool:
+        """True if all the matchers matched"""
+        return all(matcher.matched for matcher in self.matchers)
+
+    def __enter__(self):
+        if self.with_logging:
+            logging.info("Streaming shell command: %s", self.command, extra=log_pipeline.FULL)
+        self._popen = command_metrics.measured_popen(
+            self.command, redact=not self.with_logging, env=self.env, cwd=self.cwd,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+        )
+        self._process = self._popen.__enter__()
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+        return self
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        while not self.stopped:
+            data = self._process.stdout.read1(self.chunk_size or READ_SIZE)
+            self.bytes += len(data)
+            text = decoder.decode(data, final=not data)
+            if self.chunk_size:
+                if text:
+                    yield from self._emit(text)
+            else:
+                lines = (pending + text).split("\n")
+                pending = lines.pop()
+                for line in lines:
+                    if self.stopped:
+                        return
+                    yield from self._emit(line + "\n")
+            if not data:
+                if pending:
+                    yield from self._emit(pending)
+                return
+
+    def _emit(self, data: str):
+        self.lines += 1
+        if len(self.head) < self.head_size:
+            self.head.append(data)
+        else:
+            self.tail.append(data)
+        for matcher in self.matchers:
+            matcher.feed(data)
+        yield data
+        if self.stop_on_match and self.matched:
+            self.stop()
+
+    def stop(self):
+        """
+        Stops the command, the output not yet read is discarded
+        """
+        if self._process.poll() is None:
+            if hasattr(os, "killpg"):
+                # The shell and everything it started run in a session of their own
+                os.killpg(self._process.pid, signal.SIGKILL)
+            else:
+                self._process.kill()
+        self.stopped = True
+
+    def _read_stderr(self):
+        # Keeps the last config.STREAM_STDERR_LIMIT bytes of stderr
+        for data in iter(lambda: self._process.stderr.read1(READ_SIZE), b""):
+            self._stderr_chunks.append(data)
+            self._stderr_size += len(data)
+            while self._stderr_size - len(self._stderr_chunks[0]) >= config.STREAM_STDERR_LIMIT:
+                self._stderr_size -= len(self._stderr_chunks.popleft())
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and not self.stopped:
+            self.stop()
+        if not self.stopped:
+            for _ in self:
+                pass
+        self._process.wait()
+        self._stderr_thread.join()
+        self._popen.__exit__(exc_type, exc, traceback)
+        self.returncode = self._process.returncode
+        self.stderr = b"".join(self._stderr_chunks).decode("utf-8", errors="replace")
+
+        if self.with_logging:
+            skipped = self.lines - len(self.head) - len(self.tail)
+            logging.info("stdout (%s lines, %s bytes): %s%s%s", self.lines, self.bytes,
+                         "".join(self.head),
+                         f"... {skipped} lines skipped ...{os.linesep}" if skipped else "",
+                         "".join(self.tail), extra=log_pipeline.FULL)
+            logging.info("stderr: %s", self.stderr, extra=log_pipeline.FULL)
+            logging.info("return code: %s", self.returncode, extra=log_pipeline.FULL)
+            logging.info("%s (%.1f ms, %s lines, return code %s)", self.command,
+                         self._process.metrics["wall"] * 1000, self.lines, self.returncode,
+                         extra=log_pipeline.COMPACT)
+
+        if exc_type is None and not self.with_errors and not self.stopped:
+            assert not self.stderr, f"Expected no errors but got {self.stderr}"
+            assert self.returncode == 0, f"Expected return code 0 but got {self.returncode}"
+        return False
+
+
+def stream_shell_command(command: str, **kwargs) -> StreamedCommand:
+    """
+    Creates a StreamedCommand, to be used as a context manager, e.g.
+
+        with stream_shell_command('git log --oneline', cwd=repo_path) as stream:
+            for line in stream:
+                ...
+
+    Parameters:
+    - command: The shell command to execute
+    - kwargs: See StreamedCommand
+    """
+    return StreamedCommand(command, **kwargs)
+
+
+def run_streamed(command: str, matchers: list, stop_on_match: bool = True,
+                 **kwargs) -> StreamedCommand:
+    """
+    Runs a shell command, feeding its output to the matchers without buffering it, and stops
+    it as soon as all the matchers matched (unless stop_on_match is False)
+
+    Parameters:
+    - command: The shell command to execute
+    - matchers: The matchers to evaluate (e.g. Contains, Matches)
+    - stop_on_match: Stop the command as soon as all the matchers matched
+    - kwargs: See StreamedCommand
+
+    Returns:
+    - StreamedCommand: The finished command, with matched, head, tail, lines and returncode
+    """
+    with StreamedCommand(command, matchers=matchers, stop_on_match=stop_on_match,
+                         **kwargs) as stream:
+        for _ in stream:
+            pass
+    return stream
@@ -0,0 +1,189 @@
+"""
+This module provides streaming parsers for git's machine-readable output: 'status
+--porcelain=v2 -z', 'for-each-ref' and 'stash list -z'. The parsers consume the output as an
+iterable of byte chunks and yield one compact record per entry, so even millions of entries
+are verified in constant memory and independently of the platform-specific human-readable
+messages. Paths are decoded with os.fsdecode, so non UTF-8 names round-trip
+"""
+
+import collections
+import os
+import signal
+import subprocess
+import tempfile
+from helpers import command_metrics
+
+READ_SIZE = 64 * 1024
+
+# '# branch.<key> <value>' header of 'status --porcelain=v2 --branch'
+StatusHeader = collections.namedtuple("StatusHeader", ["key", "value"])
+
+# A 'status --porcelain=v2' entry. kind is '1' (changed), '2' (renamed or copied), 'u'
+# (unmerged), '?' (untracked) or '!' (ignored); xy is the staged and unstaged status (e.g. 'A.')
+# and is None for untracked and ignored entries, as are modes, objects and score
+StatusEntry = collections.namedtuple(
+    "StatusEntry", ["kind", "xy", "submodule", "modes", "objects", "score", "path", "orig_path"],
+    defaults=[None, None, None, None, None, None, None]
+)
+
+# A ref listed by for-each-ref with FOR_EACH_REF_FORMAT, head is True for the checked out branch
+Ref = collections.namedtuple("Ref", ["name", "object", "type", "head", "upstream"])
+
+# A stash listed by 'stash list -z' with STASH_LIST_FORMAT
+Stash = collections.namedtuple("Stash", ["ref", "index", "commit", "subject"])
+
+STATUS_COMMAND = "git status --porcelain=v2 -z --branch --untracked-files=all"
+FOR_EACH_REF_FORMAT = "%(refname)%00%(objectname)%00%(objecttype)%00%(HEAD)%00%(upstream)"
+STASH_LIST_FORMAT = "%gd %H %gs"
+
+
+def split_records(chunks, separator: bytes = b"\0"):
+    """
+    Splits a stream of byte chunks into separator-terminated records
+
+    Parameters:
+    - chunks: Iterable of bytes, as read from the output of a command
+    - separator: The record terminator
+
+    Yields:
+    - bytes: Every record without its terminator (a trailing unterminated one included)
+    """
+    pending = b""
+    for chunk in chunks:
+        records = (pending + chunk).split(separator)
+        pending = records.pop()
+        yield from records
+    if pending:
+        yield pending
+
+
+def parse_status_v2(chunks):
+    """
+    Parses the output of 'git status --porcelain=v2 -z' (with or without --branch)
+
+    Yields:
+    - StatusHeader for the branch headers and StatusEntry for the entries
+    """
+    records = split_records(chunks)
+    for record in records:
+        if not record:
+            continue
+        kind = record[:1].decode()
+        if kind == "#":
+            key, _, value = record[2:].decode().partition(" ")
+            yield StatusHeader(key, value)
+        elif kind in ("?", "!"):
+            yield StatusEntry(kind, path=os.fsdecode(record[2:]))
+        elif kind == "1":
+            fields = record.split(b" ", 8)
+            yield StatusEntry(kind, fields[1].decode(), fields[2].decode(),
+                              tuple(field.decode() for field in fields[3:6]),
+                              tuple(field.decode() for field in fields[6:8]),
+                              path=os.fsdecode(fields[8]))
+        elif kind == "2":
+            fields = record.split(b" ", 9)
+            yield StatusEntry(kind, fields[1].decode(), fields[2].decode(),
+                              tuple(field.decode() for field in fields[3:6]),
+                              tuple(field.decode() for field in fields[6:8]),
+                              fields[8].decode(), os.fsdecode(fields[9]),
+                              os.fsdecode(next(records, b"")))
+        elif kind == "u":
+            fields = record.split(b" ", 10)
+            yield StatusEntry(kind, fields[1].decode(), fields[2].decode(),
+                              tuple(field.decode() for field in fields[3:7]),
+                              tuple(field.decode() for field in fields[7:10]),
+                              path=os.fsdecode(fields[10]))
+        else:
+            raise ValueError(f"Unexpected porcelain v2 status record: {record!r}")
+
+
+def parse_for_each_ref(chunks):
+    """
+    Parses the output of 'git for-each-ref --format=<FOR_EACH_REF_FORMAT>' (ref names cannot
+    contain newlines, so every ref is a line of NUL-separated fields)
+
+    Yields:
+    - Ref for every listed ref
+    """
+    for record in split_records(chunks, b"\n"):
+        if not record:
+            continue
+        name, obj, obj_type, head, upstream = record.split(b"\0")
+        yield Ref(name.decode(), obj.decode(), obj_type.decode(), head == b"*",
+                  upstream.decode() or None)
+
+
+def parse_stash_list(chunks):
+    """
+    Parses the output of 'git stash list -z --format=<STASH_LIST_FORMAT>'
+
+    Yields:
+    - Stash for every stash entry, the most recent first
+    """
+    for record in split_records(chunks):
+        record = record.strip(b"\n")
+        if not record:
+            continue
+        ref, commit, subject = record.decode(errors="replace").split(" ", 2)
+        yield Stash(ref, int(ref[ref.index("{") + 1:-1]), commit, subject)
+
+
+def stream_records(command: str, parser, cwd: str = None, env: dict = None):
+    """
+    Runs a git command and streams its output through a parser, never holding more than a
+    chunk of it in memory. Asserts like run_shell_command once the output is consumed
+
+    Parameters:
+    - command: The shell command to execute (e.g. STATUS_COMMAND)
+    - parser: One of the parse_* functions of this module
+    - cwd: The directory to run the command in (defaults to the current working directory)
+    - env: Environment variables to set for the command on top of the current environment
+
+    Yields:
+    - The records of the parser. When the generator is closed before the end (explicitly, or
+      once it is garbage collected), the command is killed and the output not yet read is
+      discarded
+    """
+    if env is not None:
+        env = {**os.environ, **env}
+    with tempfile.TemporaryFile() as stderr:
+        with command_metrics.measured_popen(command, env=env, cwd=cwd, stdout=subprocess.PIPE,
+                                            stderr=stderr, start_new_session=True) as process:
+            completed = False
+            try:
+                yield from parser(iter(lambda: process.stdout.read1(READ_SIZE), b""))
+                completed = True
+            finally:
+                if not completed and process.poll() is None:
+                    if hasattr(os, "killpg"):
+                        # The shell and the git it started run in a session of their own
+                        os.killpg(process.pid, signal.SIGKILL)
+                    else:
+                        process.kill()
+        stderr.seek(0)
+        errors = stderr.read().decode(errors="replace")
+    assert not errors, f"Expected no errors but got {errors}"
+    assert process.returncode == 0, f"Expected return code 0 but got {process.returncode}"
+
+
+def status(cwd: str = None):
+    """
+    Streams the porcelain v2 status (branch headers included) of a working copy
+    """
+    return stream_records(STATUS_COMMAND, parse_status_v2, cwd=cwd)
+
+
+def refs(pattern: str = "", cwd: str = None):
+    """
+    Streams the refs of a repo, optionally limited to a pattern (e.g. 'refs/heads')
+    """
+    return stream_records(f'git for-each-ref --format="{FOR_EACH_REF_FORMAT}" {pattern}',
+                          parse_for_each_ref, cwd=cwd)
+
+
+def stashes(cwd: str = None):
+    """
+    Streams the stash entries of a repo
+    """
+    return stream_records(f'git stash list -z --format="{STASH_LIST_FORMAT}"',
+                          parse_stash_list, cwd=cwd)
@@ -0,0 +1,124 @@
+"""
+This module provides a rate limit governor for the GitHub API calls. It paces requests with a
+token bucket and adapts to the X-RateLimit-Remaining, X-RateLimit-Reset and Retry-After
+headers sent back by GitHub so the quota is not depleted
+"""
+
+import logging
+import threading
+import time
+import requests
+
+
+def is_rate_limited(response: requests.Response) -> bool:
+    """
+    Checks whether GitHub rejected a request because of a primary or secondary rate limit
+
+    Parameters:
+    - response: The API response to check
+
+    Returns:
+    - True if the request was rejected and should be retried later
+    """
+    if response.status_code not in (403, 429):
+        return False
+    return ("Retry-After" in response.headers
+            or response.headers.get("X-RateLimit-Remaining") == "0")
+
+
+class RateLimitGovernor:
+    """
+    Token bucket shared by every API call of a process
+
+    The bucket refills at `rate` tokens per second up to `burst` tokens. As long as the
+    remaining quota is above `low_water` requests go out at the configured rate, below it
+    the rate is lowered so the remaining quota lasts until the reset time. A Retry-After
+    header or an exhausted quota blocks all callers until the indicated time
+    """
+
+    def __init__(self, rate: float, burst: int, low_water: int):
+        """
+        Parameters:
+        - rate: Maximum requests per second, 0 disables pacing while the quota is healthy
+        - burst: Maximum number of requests that can be sent back to back
+        - low_water: Remaining quota below which requests are spread until the reset time
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.low_water = low_water
+        self._current_rate = rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a request is allowed to go out
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if not self._current_rate:
+                        return
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self._current_rate
+            time.sleep(wait)
+
+    def observe(self, response: requests.Response) -> float:
+        """
+        Adapts the pacing to the rate limit headers of an API response
+
+        Parameters:
+        - response: The API response to learn from
+
+        Returns:
+        - The number of seconds requests are held back for, 0 if not backing off
+        """
+        headers = response.headers
+        remaining = _int_header(headers, "X-RateLimit-Remaining")
+        reset = _int_header(headers, "X-RateLimit-Reset")
+        retry_after = _int_header(headers, "Retry-After")
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            backoff = 0.0
+            if retry_after is not None:
+                backoff = float(retry_after)
+            elif remaining == 0 and reset is not None:
+                backoff = max(reset - time.time(), 0.0)
+            if backoff:
+                self._blocked_until = max(self._blocked_until, now + backoff)
+                self._tokens = 0.0
+                logging.warning(f"GitHub API rate limit hit, holding requests for {backoff:.1f}s")
+
+            if remaining is not None and reset is not None:
+                # An exhausted quota is handled by the backoff above
+                if 0 < remaining <= self.low_water:
+                    quota_rate = remaining / max(reset - time.time(), 1.0)
+                    self._current_rate = min(self.rate, quota_rate) if self.rate else quota_rate
+                else:
+                    self._current_rate = self.rate
+
+            return backoff
+
+    def _refill(self, now: float):
+        if self._current_rate:
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self._current_rate)
+        self._updated = now
+
+
+def _int_header(headers, name: str):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,245 @@
+"""
+This module provides a generator for synthetic repos of a given shape (file count, file size
+distribution, history length, branches and tags). The repo is streamed to `git fast-import`
+so millions of objects can be built in minutes, deterministically from a seed. Generated repos
+are kept in a content-addressed on-disk cache so the same spec is never generated twice
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import config
+
+# Bump when the generated content for a given spec changes, it invalidates the cache
+GENERATOR_VERSION = 1
+CONTENT_POOL_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+@dataclasses.dataclass(frozen=True)
+class RepoSpec:
+    """
+    Shape of a synthetic repo
+
+    Attributes:
+    - files: Number of files added by the first commit
+    - commits: Total number of commits on the default branch
+    - changes_per_commit: Number of files modified by every commit after the first one
+    - file_size: Mean file size in bytes
+    - size_distribution: 'fixed', 'uniform' (0 to 2x the mean) or 'lognormal' (long tail)
+    - files_per_dir: Number of files per directory, keeps trees from growing too wide
+    - branches: Number of branches pointing at commits spread along the history
+    - tags: Number of lightweight tags pointing at commits spread along the history
+    - seed: Seed of the random generator, the same spec always yields the same repo
+    """
+    files: int = 100
+    commits: int = 1
+    changes_per_commit: int = 1
+    file_size: int = 1024
+    size_distribution: str = "lognormal"
+    files_per_dir: int = 100
+    branches: int = 0
+    tags: int = 0
+    seed: int = 0
+
+    def cache_key(self) -> str:
+        """
+        Returns the content address of the repo generated from this spec
+        """
+        payload = json.dumps(
+            {"version": GENERATOR_VERSION, **dataclasses.asdict(self)}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def generated_file_path(spec: RepoSpec, index: int) -> str:
+    """
+    Returns the path (relative to the repo root) of the file with the given index
+
+    Parameters:
+    - spec: The shape of the repo
+    - index: The index of the file, from 0 to spec.files - 1
+    """
+    return f"d{index // spec.files_per_dir:05d}/f{index:07d}.txt"
+
+
+def get_generated_repo(spec: RepoSpec, cache_dir: str = None) -> str:
+    """
+    Returns the path of a bare repo generated from the spec, generating it only if the cache
+    does not hold it yet
+
+    Parameters:
+    - spec: The shape of the repo
+    - cache_dir: The cache directory (defaults to GENERATED_REPOS_DIR)
+
+    Returns:
+    - The path of the bare repo, it must be treated as read-only (clone it to modify it)
+    """
+    cache_dir = cache_dir or config.GENERATED_REPOS_DIR
+    repo_path = os.path.join(cache_dir, f"{spec.cache_key()}.git")
+    if os.path.isdir(repo_path):
+        logging.info(f"Using cached generated repo {repo_path}")
+        return repo_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Built aside and renamed into place, so parallel workers never see a partial repo
+    build_path = f"{repo_path}.tmp-{os.getpid()}"
+    shutil.rmtree(build_path, ignore_errors=True)
+    generate_repo(spec, build_path)
+    try:
+        os.rename(build_path, repo_path)
+    except OSError:
+        # Another process finished generating the same spec first
+        shutil.rmtree(build_path, ignore_errors=True)
+    return repo_path
+
+
+def clone_generated_repo(spec: RepoSpec, destination: str, cache_dir: str = None) -> str:
+    """
+    Creates a working copy of a generated repo, objects are hardlinked from the cache
+
+    Parameters:
+    - spec: The shape of the repo
+    - destination: The path of the working copy, must not exist yet
+    - cache_dir: The cache directory (defaults to GENERATED_REPOS_DIR)
+
+    Returns:
+    - The path of the working copy
+    """
+    source = get_generated_repo(spec, cache_dir)
+    subprocess.run(['git', 'clone', '--quiet', '--local', source, destination],
+                   check=True, capture_output=True)
+    return destination
+
+
+def generate_repo(spec: RepoSpec, repo_path: str):
+    """
+    Generates a bare repo from the spec by streaming it to git fast-import
+
+    Parameters:
+    - spec: The shape of the repo
+    - repo_path: The path of the bare repo to create
+    """
+    if spec.size_distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution: {spec.size_distribution}")
+    logging.info(f"Generating repo {repo_path} from {spec}")
+
+    subprocess.run(['git', 'init', '--quiet', '--bare',
+                    f'--initial-branch={config.DEFAULT_BRANCH}', repo_path],
+                   check=True, capture_output=True)
+    with subprocess.Popen(
+        ['git', f'--git-dir={repo_path}', 'fast-import', '--quiet', '--done'],
+        stdin=subprocess.PIPE, bufsize=WRITE_BUFFER_SIZE
+    ) as fast_import:
+        _FastImportWriter(spec, fast_import.stdin).write()
+        fast_import.stdin.close()
+        if fast_import.wait() != 0:
+            raise RuntimeError(f"git fast-import failed with code {fast_import.returncode}")
+
+    # fast-import writes one loose file per ref
+    subprocess.run(['git', f'--git-dir={repo_path}', 'pack-refs', '--all'],
+                   check=True, capture_output=True)
+    with open(os.path.join(repo_path, 'generator-spec.json'), 'w', encoding='utf-8') as f:
+        json.dump(dataclasses.asdict(spec), f, indent=2)
+
+
+class _FastImportWriter:
+    """
+    Writes the fast-import stream of a spec, file contents are slices of a random pool
+    prefixed with a unique header so every file version is a distinct blob
+    """
+
+    def __init__(self, spec: RepoSpec, stream):
+        self.spec = spec
+        self.stream = stream
+        self.rng = random.Random(spec.seed)
+        # Printable content keeps the files diffable and delta-compressible like source code
+        alphabet = b"abcdefghijklmnopqrstuvwxyz0123456789      \n"
+        self.pool = bytes(self.rng.choices(alphabet, k=CONTENT_POOL_SIZE))
+        self.timestamp = 1_700_000_000
+
+    def write(self):
+        """
+        Writes the commits of the default branch, then the branches and tags, then ends the
+        stream with 'done'
+        """
+        spec = self.spec
+        for commit in range(1, spec.commits + 1):
+            if commit == 1:
+                changed = range(spec.files)
+            else:
+                changed = self.rng.sample(
+                    range(spec.files), min(spec.changes_per_commit, spec.files)
+                )
+            self._write_commit(commit, changed)
+        self._write_refs("heads/branch", spec.branches)
+        self._write_refs("tags/tag", spec.tags)
+        self.stream.write(b"done\n")
+
+    def _write_commit(self, commit: int, changed):
+        self.timestamp += 60
+        identity = f"Generator <generator@localhost> {self.timestamp} +0000"
+        message = f"commit {commit}\n".encode('utf-8')
+        self.stream.write(
+            f"commit refs/heads/{config.DEFAULT_BRANCH}\nmark :{commit}\n"
+            f"author {identity}\ncommitter {identity}\n"
+            f"data {len(message)}\n".encode('utf-8') + message
+        )
+        for index in changed:
+            self._write_file(index, commit)
+        self.stream.write(b"\n")
+
+    def _write_file(self, index: int, commit: int):
+        path = generated_file_path(self.spec, index)
+        header = f"{path} @ {commit}\n".encode('utf-8')
+        size = max(self._file_size(), len(header))
+        self.stream.write(f"M 100644 inline {path}\ndata {size}\n".encode('utf-8'))
+        self.stream.write(header)
+        remaining = size - len(header)
+        while remaining:
+            offset = self.rng.randrange(CONTENT_POOL_SIZE)
+            chunk = self.pool[offset:offset + remaining]
+            self.stream.write(chunk)
+            remaining -= len(chunk)
+        self.stream.write(b"\n")
+
+    def _file_size(self) -> int:
+        mean = self.spec.file_size
+        if self.spec.size_distribution == "fixed":
+            return mean
+        if self.spec.size_distribution == "uniform":
+            return self.rng.randint(0, 2 * mean)
+        # sigma 1.0 gives a long tail, mu is chosen so the mean equals file_size
+        return int(self.rng.lognormvariate(math.log(max(mean, 1)) - 0.5, 1.0))
+
+    def _write_refs(self, prefix: str, count: int):
+        for number in range(count):
+            # Spread the refs evenly over the history
+            mark = 1 + (number * self.spec.commits) // max(count, 1)
+            self.stream.write(f"reset refs/{prefix}-{number:06d}\nfrom :{mark}\n\n".encode('utf-8'))
+
+
+def main():
+    """
+    Generates (or looks up) a repo from the command line and prints its path
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    for field in dataclasses.fields(RepoSpec):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=field.type,
+                            default=field.default)
+    parser.add_argument("--cache-dir", default=None)
+    args = vars(parser.parse_args())
+    cache_dir = args.pop("cache_dir")
+    print(get_generated_repo(RepoSpec(**args), cache_dir))
+
+
+if __name__ == "__main__":
+    main()
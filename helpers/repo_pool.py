@@ -0,0 +1,165 @@
+"""
+This module provides a pool of pre-created remote repos that are handed out to tests instead
+of creating and deleting a GitHub repo around every single test
+"""
+
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import subprocess
+import requests
+import config
+from helpers import cleanup, common, git_utils
+
+
+class RemoteRepoPool:
+    """
+    Session-scoped pool of remote repos
+
+    Repos are provisioned upfront, leased to a test, emptied once the test is done and then
+    put back for the next test. Each xdist worker runs its
+    own session and therefore owns a separate pool
+    """
+
+    def __init__(self, size: int, cleanup_queue: cleanup.CleanupQueue = None):
+        """
+        Parameters:
+        - size: The number of remote repos to provision upfront
+        - cleanup_queue: If given, pooled repos are journaled as pending deletions while the
+          pool holds them, so a crashed session does not leak them
+        """
+        self.size = size
+        self._cleanup = cleanup_queue
+        self._idle = queue.SimpleQueue()
+        self._all = set()
+        # Pushing requires a local repo, its only ref is an orphan commit the default branch
+        # is reset to
+        self._scratch_dir = tempfile.mkdtemp(prefix="repo_pool_")
+        self._init_scratch_repo()
+
+    def provision(self):
+        """
+        Creates the initial set of remote repos
+
+        Raises:
+        - The error of the first failed creation, once the repos created by the batch have
+          been deleted again
+        """
+        logging.info(f"Provisioning a pool of {self.size} remote repos")
+        repo_names = [common.generate_repo_name() for _ in range(self.size)]
+        errors = []
+        for repo_name, result in git_utils.api_create_github_repos(repo_names):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to create pooled repo {repo_name}: {result}")
+                errors.append(result)
+                continue
+            self._add(repo_name)
+            self._idle.put(repo_name)
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def acquire(self) -> str:
+        """
+        Leases an idle repo, creating an extra one if the pool is exhausted
+
+        Returns:
+        - The name of the leased remote repo
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            logging.info("Repo pool exhausted, creating an additional repo")
+            return self._create()
+
+    def release(self, repo_name: str):
+        """
+        Resets a leased repo and returns it to the pool, the repo is replaced with a new one
+        if it cannot be emptied (e.g. GitHub refuses to delete the default branch). When the
+        replacement fails, the pool shrinks by one repo: a repo that could not be deleted stays
+        tracked (and journaled) so close() deletes it
+
+        Parameters:
+        - repo_name: The name of the repo returned by acquire()
+        """
+        if not self._reset(repo_name):
+            logging.info(f"Could not reset pooled repo {repo_name}, replacing it")
+            try:
+                git_utils.api_delete_github_repo(repo_name)
+                self._remove(repo_name)
+                repo_name = self._create()
+            except (requests.exceptions.RequestException, OSError) as error:
+                logging.error(f"Failed to replace pooled repo {repo_name}, dropping it from "
+                              f"the pool: {error}")
+                return
+        self._idle.put(repo_name)
+
+    def close(self):
+        """
+        Deletes every repo created by the pool
+        """
+        logging.info(f"Deleting {len(self._all)} pooled remote repos")
+        for repo_name, result in git_utils.api_delete_github_repos(list(self._all)):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to delete pooled repo {repo_name}: {result}")
+            else:
+                self._remove(repo_name)
+        self._all.clear()
+        shutil.rmtree(self._scratch_dir, ignore_errors=True)
+
+    def _create(self) -> str:
+        repo_name = common.generate_repo_name()
+        git_utils.api_create_github_repo(repo_name)
+        self._add(repo_name)
+        return repo_name
+
+    def _add(self, repo_name: str):
+        self._all.add(repo_name)
+        if self._cleanup:
+            self._cleanup.track(cleanup.REMOTE, repo_name)
+
+    def _remove(self, repo_name: str):
+        self._all.discard(repo_name)
+        if self._cleanup:
+            self._cleanup.untrack(cleanup.REMOTE, repo_name)
+
+    def _init_scratch_repo(self):
+        identity = {"NAME": "repo-pool", "EMAIL": "repo-pool@localhost", "DATE": "@0 +0000"}
+        env = {**os.environ, **{f"GIT_{role}_{key}": value for role in ("AUTHOR", "COMMITTER")
+                                for key, value in identity.items()}}
+        git = ['git', '--git-dir', self._scratch_dir]
+        subprocess.run(['git', 'init', '--quiet', '--bare', self._scratch_dir],
+                       check=True, capture_output=True)
+        empty_tree = subprocess.run([*git, 'hash-object', '-t', 'tree', '-w', os.devnull],
+                                    check=True, capture_output=True, text=True).stdout.strip()
+        commit = subprocess.run([*git, 'commit-tree', '-m', 'Reset of a pooled repo', empty_tree],
+                                env=env, check=True, capture_output=True, text=True).stdout.strip()
+        subprocess.run([*git, 'update-ref', f'refs/heads/{config.DEFAULT_BRANCH}', commit],
+                       check=True, capture_output=True)
+
+    def _reset(self, repo_name: str) -> bool:
+        """
+        Empties a remote repo: the default branch is force-pushed to the orphan commit and
+        every other ref pruned in one push, which GitHub accepts as it keeps the default
+        branch, then the default branch is deleted, as the next test expects an empty repo
+
+        Returns:
+        - False if a push failed, e.g. GitHub refused to delete the default branch
+        """
+        repo_url = f"{config.GH_URL}/{config.GH_USERNAME}/{repo_name}.git"
+        result = common.run_shell_command(f'git ls-remote {repo_url}', with_errors=True,
+                                          with_logging=False)
+        if result.returncode != 0:
+            return False
+        if not result.stdout.strip():
+            return True
+        for push in ('--force --prune "refs/*:refs/*"', f':refs/heads/{config.DEFAULT_BRANCH}'):
+            result = common.run_shell_command(
+                f'git --git-dir="{self._scratch_dir}" push --quiet {repo_url} {push}',
+                with_errors=True, with_logging=False
+            )
+            if result.returncode != 0:
+                return False
+        return True
@@ -0,0 +1,100 @@
+"""
+This module provides a factory for named local repo states (e.g. "one commit" or "stash
+present"). Each state is built once per session and tests get a fast copy of it instead of
+replaying the same git commands
+"""
+
+import logging
+import os
+import shutil
+import config
+from helpers import common
+
+
+def _modify_test_file(repo_path: str):
+    with open(os.path.join(repo_path, config.TEST_FILE_NAME), 'a', encoding='utf-8') as f:
+        f.write(' More content')
+
+
+# Each state is built from a copy of its parent state by running the listed steps, which are
+# shell commands or callables taking the repo path
+REPO_STATES = {
+    "empty": (None, [
+        f'git init --initial-branch={config.DEFAULT_BRANCH} .',
+    ]),
+    "one_commit": ("empty", [
+        common.create_test_file,
+        'git add .',
+        'git commit -m "initial commit"',
+    ]),
+    "dirty_file": ("one_commit", [
+        _modify_test_file,
+    ]),
+    "stash": ("dirty_file", [
+        'git stash',
+    ]),
+}
+
+
+class RepoSnapshotFactory:
+    """
+    Builds the named repo states lazily into a snapshot directory and materializes copies
+
+    Git objects are immutable, so the copies hardlink everything under `.git/objects` to the
+    snapshot and only copy the mutable files (working tree, index, refs, config)
+    """
+
+    def __init__(self, snapshot_dir: str):
+        """
+        Parameters:
+        - snapshot_dir: The directory the built snapshots are kept in
+        """
+        self.snapshot_dir = snapshot_dir
+        self._built = set()
+
+    def materialize(self, state: str, destination: str):
+        """
+        Creates a repo in the given state at the destination
+
+        Parameters:
+        - state: One of the names in REPO_STATES
+        - destination: The path of the repo to create, must not exist yet
+        """
+        _copy_repo(self._snapshot(state), destination)
+
+    def _snapshot(self, state: str) -> str:
+        if state not in REPO_STATES:
+            raise ValueError(f"Unknown repo state: {state}")
+        path = os.path.join(self.snapshot_dir, state)
+        if state in self._built:
+            return path
+
+        parent, steps = REPO_STATES[state]
+        logging.info(f"Building repo snapshot: {state}")
+        if parent is None:
+            os.makedirs(path)
+        else:
+            _copy_repo(self._snapshot(parent), path)
+        for step in steps:
+            if callable(step):
+                step(path)
+            else:
+                result = common.run_shell_command(step, with_errors=True, cwd=path)
+                assert result.returncode == 0, f"Building {state} failed: {result.stderr}"
+        self._built.add(state)
+        return path
+
+
+def _copy_repo(source: str, destination: str):
+    objects_dir = os.path.join(source, '.git', 'objects')
+
+    def link_or_copy(src: str, dst: str):
+        if os.path.commonpath([objects_dir, src]) == objects_dir:
+            try:
+                os.link(src, dst)
+                return dst
+            except OSError:
+                pass
+        return shutil.copy2(src, dst)
+
+    shutil.copytree(source, destination, copy_function=link_or_copy, symlinks=True)
@@ -0,0 +1,111 @@
+"""
+This module provides the capture and aggregation of git's trace2 performance events. With
+GIT_TRACE2_EVENT pointing at a directory, every git process (children such as pack-objects
+or remote-https included) writes its JSON events to a file of its own in it, from which the
+region timings (e.g. 'status/untracked', 'index/do_read_index') and the data counters
+(e.g. 'status/count/untracked') of a command are extracted
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+
+
+@contextlib.contextmanager
+def capture(env: dict = None):
+    """
+    Context manager directing the trace2 events of a command to a temporary directory
+
+    Parameters:
+    - env: The environment the command will run with (defaults to the current environment)
+
+    Yields:
+    - (env, trace_dir): The environment to run the command with and the directory to parse
+    with parse_events once it has finished
+    """
+    trace_dir = tempfile.mkdtemp(prefix="git_trace2_")
+    try:
+        yield {**(env if env is not None else os.environ), "GIT_TRACE2_EVENT": trace_dir}, trace_dir
+    finally:
+        shutil.rmtree(trace_dir, ignore_errors=True)
+
+
+def parse_events(trace_dir: str) -> dict:
+    """
+    Parses the trace2 event files of a command
+
+    Parameters:
+    - trace_dir: The directory GIT_TRACE2_EVENT pointed at
+
+    Returns:
+    - A dict with:
+        - regions: total seconds per 'category/label', summed over processes and threads,
+          and per git process under 'process/<name>' (e.g. 'process/pack-objects')
+        - data: numeric data values per 'category/key', summed over processes
+    """
+    regions, data = {}, {}
+    for name in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, name), encoding='utf-8', errors='replace') as f:
+            process = None
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                kind = event.get("event")
+                if kind == "cmd_name":
+                    process = event.get("name")
+                elif kind == "region_leave" and "t_rel" in event:
+                    key = f"{event.get('category')}/{event.get('label')}"
+                    regions[key] = regions.get(key, 0.0) + event["t_rel"]
+                elif kind == "data":
+                    try:
+                        value = float(event.get("value"))
+                    except (TypeError, ValueError):
+                        continue
+                    key = f"{event.get('category')}/{event.get('key')}"
+                    data[key] = data.get(key, 0) + value
+                elif kind == "exit" and process:
+                    key = f"process/{process}"
+                    regions[key] = regions.get(key, 0.0) + event.get("t_abs", 0.0)
+    return {"regions": regions, "data": data}
+
+
+def aggregate(records: list) -> list:
+    """
+    Aggregates the trace2 regions of command records across the session, slowest total first
+
+    Parameters:
+    - records: Command records (see command_metrics) carrying a 'trace2' entry
+
+    Returns:
+    - A list of dicts with region, count (commands it appeared in), total and max seconds
+    """
+    totals = {}
+    for entry in records:
+        for region, seconds in (entry.get("trace2") or {}).get("regions", {}).items():
+            count, total, maximum = totals.get(region, (0, 0.0, 0.0))
+            totals[region] = (count + 1, total + seconds, max(maximum, seconds))
+    summary = [{"region": region, "count": count, "total": total, "max": maximum}
+               for region, (count, total, maximum) in totals.items()]
+    return sorted(summary, key=lambda item: item["total"], reverse=True)
+
+
+def format_report(records: list, count: int) -> list:
+    """
+    Formats the per-region breakdown of the session as text
+
+    Parameters:
+    - records: The command records to summarize
+    - count: The number of regions listed
+
+    Returns:
+    - The lines of the report
+    """
+    lines = [f"{'region':<40} {'commands':>8} {'total (s)':>10} {'max (s)':>8}"]
+    for item in aggregate(records)[:count]:
+        lines.append(f"{item['region']:<40} {item['count']:>8} {item['total']:>10.3f} "
+                     f"{item['max']:>8.3f}")
+    return lines
@@ -0,0 +1,65 @@
+"""
+Test suite for validating the per-command instrumentation of run_shell_command.
+"""
+
+import sys
+from helpers import command_metrics, common, trace2
+
+
+def test_command_metrics_recorded(request):
+    """Test that run_shell_command records the subcommand, timings and exit status."""
+
+    common.run_shell_command('git -C . --version')
+    common.run_shell_command('git config --get no.such.key', with_errors=True)
+
+    records = command_metrics.pop_records(request.node.nodeid)
+    subcommands = [entry["subcommand"] for entry in records[-2:]]
+    assert subcommands == ["git", "config"], f"Got records: {records}"
+    assert records[-1]["returncode"] == 1, f"Expected exit status 1, got: {records[-1]}"
+    assert all(entry["wall"] > 0 for entry in records[-2:]), f"Got records: {records}"
+    assert all(entry["minor_faults"] > 0 for entry in records[-2:]), \
+        f"Expected the page faults to be recorded, got: {records}"
+
+
+def test_command_metrics_peak_rss_of_command(request):
+    """Test that the peak RSS is the command's own, not the one of the process running it."""
+
+    size = command_metrics.own_peak_rss() + 64 * 1024 * 1024
+    common.run_shell_command(f'"{sys.executable}" -c "data = b\'x\' * {size}"',
+                             with_logging=False)
+    common.run_shell_command('git --version', with_logging=False)
+
+    heavy, light = command_metrics.pop_records(request.node.nodeid)[-2:]
+    assert heavy["max_rss"] is None or heavy["max_rss"] >= size, \
+        f"Expected the peak RSS of the command to exceed {size} bytes, got: {heavy}"
+    assert light["max_rss"] is None or light["max_rss"] < size, \
+        f"Expected a small peak RSS for git --version, got: {light}"
+    if sys.platform.startswith("linux"):
+        assert heavy["max_rss"] is not None, f"Expected the peak RSS to be measured: {heavy}"
+        assert light["max_rss"] is None, \
+            f"Expected no peak RSS below the runner's own to be reported, got: {light}"
+
+
+def test_command_metrics_redacted(request):
+    """Test that commands run without logging are recorded by their subcommand only."""
+
+    common.run_shell_command('git config --get secret.token', with_errors=True,
+                             with_logging=False)
+
+    records = command_metrics.pop_records(request.node.nodeid)
+    assert records[-1]["command"] == "config <redacted>", f"Got record: {records[-1]}"
+
+
+def test_trace2_regions_parsed(tmp_path):
+    """Test that the trace2 regions and data of a git status are captured."""
+
+    common.run_shell_command(f'git init --quiet "{tmp_path}"')
+    (tmp_path / "untracked.txt").write_text("untracked\n")
+
+    with trace2.capture() as (env, trace_dir):
+        common.run_shell_command('git status --porcelain', cwd=str(tmp_path), env=env)
+        trace = trace2.parse_events(trace_dir)
+
+    assert "status/untracked" in trace["regions"], f"Got regions: {trace['regions']}"
+    assert "process/status" in trace["regions"], f"Got regions: {trace['regions']}"
+    assert trace["data"].get("status/count/untracked") == 1, f"Got data: {trace['data']}"
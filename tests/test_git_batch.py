@@ -0,0 +1,73 @@
+"""
+Test suite for validating the long-lived 'git cat-file --batch' and 'git update-index --stdin'
+sessions.
+"""
+
+import os
+import threading
+from helpers import common, git_batch, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=2000, commits=3, changes_per_commit=5, seed=13)
+
+
+def test_cat_file_session_checks_many_objects(tmp_path):
+    """Test that one cat-file session answers for every blob and a path's contents."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+    result = common.run_shell_command(f'git --git-dir="{repo_path}" ls-tree -r HEAD',
+                                      with_logging=False)
+    blobs = [line.split()[2] for line in result.stdout.splitlines()]
+    path = repo_generator.generated_file_path(SPEC, 0)
+
+    with git_batch.CatFile(repo_path, contents=False) as session:
+        missing = session.missing(blobs + ["0" * 40, "HEAD:no such file"])
+    with git_batch.CatFile(repo_path) as session:
+        contents = session.read(f"HEAD:{path}")
+        spaced = session.read("HEAD:x y")
+
+    assert missing == ["0" * 40, "HEAD:no such file"], \
+        f"Expected only the made up objects to be missing: {missing}"
+    assert spaced is None, f"Expected a missing path with a space to read as None: {spaced}"
+    result = common.run_shell_command(f'git --git-dir="{repo_path}" show "HEAD:{path}"')
+    assert contents.decode() == result.stdout, "Expected the contents of the path at HEAD."
+
+
+def test_cat_file_session_reads_while_iterating_a_query(tmp_path):
+    """Test that a session answers single reads between the answers of a query."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+    paths = [repo_generator.generated_file_path(SPEC, index)
+             for index in range(0, git_batch.QUERY_CHUNK_SIZE * 2, 2)]
+    contents = {}
+
+    def read_while_iterating():
+        with git_batch.CatFile(repo_path, contents=False) as checks, \
+                git_batch.CatFile(repo_path) as session:
+            for name, info, _ in checks.query(f"HEAD:{path}" for path in paths):
+                contents[name] = (info, session.read(name), checks.info(name))
+
+    reader = threading.Thread(target=read_while_iterating, daemon=True)
+    reader.start()
+    reader.join(timeout=60)
+
+    assert not reader.is_alive(), "Expected the reads not to block on the pending query."
+    assert len(contents) == len(paths), f"Expected an answer per path: {len(contents)}"
+    for name, (info, data, again) in contents.items():
+        assert info == again and len(data) == info.size, f"Inconsistent answers for {name}"
+
+
+def test_update_index_session_stages_paths(tmp_path):
+    """Test that paths sent to an update-index session are staged once it is closed."""
+
+    repo_path = repo_generator.clone_generated_repo(SPEC, str(tmp_path / "repo"))
+    paths = [repo_generator.generated_file_path(SPEC, index) for index in range(0, 100, 10)]
+    for path in paths:
+        with open(os.path.join(repo_path, path), 'a', encoding='utf-8') as f:
+            f.write("staged change\n")
+
+    with git_batch.UpdateIndex(repo_path) as session:
+        session.update(paths)
+
+    assert len(list(session.updated())) == len(paths), "Expected a message per updated path."
+    result = common.run_shell_command('git diff --cached --name-only', cwd=repo_path)
+    assert result.stdout.split() == sorted(paths), f"Got staged paths: {result.stdout}"
@@ -8,13 +8,13 @@ import config
 from helpers import common
 
 @pytest.mark.parametrize("remote_only", [True])
-def test_git_clone(api_create_git_repo, remote_only):
+def test_git_clone(api_create_git_repo, get_repos_dir, remote_only):
     """Test the git clone command by cloning a remote repository."""
 
     repo_name = api_create_git_repo
     repo_url = f"{config.GH_URL}/{config.GH_USERNAME}/{repo_name}"
     
-    os.chdir('test_repos')
+    os.chdir(get_repos_dir)
     
     result = common.run_shell_command(f'git clone {repo_url}', with_errors=True)
 
@@ -51,3 +51,27 @@ def test_git_clone_invalid_flag():
     assert (
         "error: unknown switch `k" in result.stderr
     ), f"Expected error message about unknown flag, but got: {result.stderr}"
+
+
+@pytest.mark.parametrize("repo_state", ["one_commit"], indirect=True)
+@pytest.mark.parametrize("clone_filter", ["blob:none", "tree:0"])
+def test_git_partial_clone(api_create_git_repo, tmp_path, clone_filter):
+    """Test that a partial clone is served and its missing objects are fetched on checkout."""
+
+    repo_name = api_create_git_repo
+    common.run_shell_command(f'git push --quiet origin {config.DEFAULT_BRANCH}')
+    repo_url = f"{config.GH_URL}/{config.GH_USERNAME}/{repo_name}"
+    clone_path = str(tmp_path / "partial")
+
+    result = common.run_shell_command(
+        f'git clone --quiet --filter={clone_filter} {repo_url} "{clone_path}"', with_errors=True
+    )
+
+    assert not result.stderr, f"Expected the filter to be honored, but got: {result.stderr}"
+    assert result.returncode == 0, f"Expected return code 0, but got {result.returncode}"
+    result = common.run_shell_command('git config remote.origin.partialclonefilter',
+                                      cwd=clone_path)
+    assert result.stdout.strip() == clone_filter, f"Expected a {clone_filter} partial clone."
+    assert os.path.exists(os.path.join(clone_path, config.TEST_FILE_NAME)), (
+        "Expected the checkout to fetch the filtered out file."
+    )
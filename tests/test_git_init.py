@@ -7,12 +7,12 @@ import os
 from helpers import common
 
 
-def test_git_init(api_create_git_repo):
+def test_git_init(api_create_git_repo, get_repos_dir):
     """Test the git init command."""
     
     repo_name = api_create_git_repo
 
-    repo_path = os.path.join('test_repos', repo_name)
+    repo_path = os.path.join(get_repos_dir, repo_name)
     
     assert (
         repo_path in os.getcwd()
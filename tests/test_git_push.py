@@ -3,6 +3,7 @@ Test suite for validating the behavior of the 'git push' command in different sc
 """
 
 
+import pytest
 import config
 from helpers import common
 
@@ -75,3 +76,24 @@ def test_git_push_invalid_flag():
     assert (
         "error: unknown switch `k" in result.stderr
     ), f"Expected error for unknown flag, but got: {result.stderr}"
+
+
+@pytest.mark.skipif(not config.GH_LOCAL_SERVER, reason="Needs the bundled local GitHub stand-in")
+@pytest.mark.parametrize("repo_state", ["one_commit"], indirect=True)
+def test_git_push_incremental_transfer_budget(api_create_git_repo, local_github_server,
+                                              get_repo_name):
+    """Test that an incremental push of a one-line change sends under 2 KB."""
+
+    api_create_git_repo
+    common.run_shell_command(f'git push --quiet origin {config.DEFAULT_BRANCH}')
+    with open(config.TEST_FILE_NAME, 'a', encoding='utf-8') as f:
+        f.write("one more line\n")
+    common.run_shell_command('git commit --quiet -am "one line change"')
+
+    with local_github_server.metered(config.GH_USERNAME, get_repo_name) as transfers:
+        common.run_shell_command(f'git push --quiet origin {config.DEFAULT_BRANCH}')
+
+    push = transfers["push"]
+    assert push.negotiation_rounds == 1, f"Expected a single push request, but got: {push}"
+    assert 0 < push.pack_bytes < push.request_bytes < 2048, f"Expected under 2 KB: {push}"
+    assert "fetch" not in transfers, f"Expected no fetch traffic, but got: {transfers}"
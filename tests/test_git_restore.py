@@ -2,22 +2,16 @@
 Test suite for validating the behavior of the 'git restore' command in different scenarios.
 """
 
+import pytest
+import config
 from helpers import common
 
+@pytest.mark.parametrize("repo_state", ["dirty_file"], indirect=True)
 def test_git_restore_discard_changes(api_create_git_repo):
     """Test the git restore command to discard changes in the working directory."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
+    test_file_name = config.TEST_FILE_NAME
 
     result = common.run_shell_command(f'git restore {test_file_name}')
     assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
@@ -27,20 +21,12 @@ def test_git_restore_discard_changes(api_create_git_repo):
     assert content == 'Test file content', f"Expected 'Test file content', but got: {content}"
 
 
+@pytest.mark.parametrize("repo_state", ["dirty_file"], indirect=True)
 def test_git_restore_staged_changes(api_create_git_repo):
     """Test the git restore command to unstage changes."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
+    test_file_name = config.TEST_FILE_NAME
 
     result = common.run_shell_command('git add .')
     assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
@@ -68,20 +54,12 @@ def test_git_restore_staged_changes(api_create_git_repo):
     common.compare_normalized_strings(result.stdout, expected_stdout)
 
 
+@pytest.mark.parametrize("repo_state", ["dirty_file"], indirect=True)
 def test_git_restore_from_commit(api_create_git_repo):
     """Test the git restore command to restore a file from a specific commit."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
+    test_file_name = config.TEST_FILE_NAME
 
     result = common.run_shell_command('git add .')
     assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
@@ -2,22 +2,15 @@
 Test suite for validating the behavior of the 'git stash' command in different scenarios.
 """
 
+import pytest
+import config
 from helpers import common
 
+@pytest.mark.parametrize("repo_state", ["dirty_file"], indirect=True)
 def test_git_stash_save(api_create_git_repo):
     """Test the git stash command to save changes in the working directory."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
 
     # Stash the changes
     result = common.run_shell_command('git stash')
@@ -34,26 +27,12 @@ def test_git_stash_save(api_create_git_repo):
     common.compare_normalized_strings(result.stdout, expected_stdout)
 
 
+@pytest.mark.parametrize("repo_state", ["stash"], indirect=True)
 def test_git_stash_apply(api_create_git_repo):
     """Test the git stash command to apply stashed changes."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
-
-    # Stash the changes
-    result = common.run_shell_command('git stash')
-    assert 'Saved working directory and index state WIP on main' in result.stdout, (
-        f"Expected stash save message, but got: {result.stdout}"
-    )
+    test_file_name = config.TEST_FILE_NAME
 
     # Apply the stashed changes
     result = common.run_shell_command('git stash apply')
@@ -67,26 +46,11 @@ def test_git_stash_apply(api_create_git_repo):
     assert content == 'Test file content More content', f"Expected 'Test file content More content', but got: {content}"
 
 
+@pytest.mark.parametrize("repo_state", ["stash"], indirect=True)
 def test_git_stash_drop(api_create_git_repo):
     """Test the git stash command to drop stashed changes."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
-
-    # Stash the changes
-    result = common.run_shell_command('git stash')
-    assert 'Saved working directory and index state WIP on main' in result.stdout, (
-        f"Expected stash save message, but got: {result.stdout}"
-    )
 
     # Drop the stashed changes
     result = common.run_shell_command('git stash drop')
@@ -99,27 +63,11 @@ def test_git_stash_drop(api_create_git_repo):
     assert not result.stdout, f"Expected empty stash list, but got: {result.stdout}"
 
 
+@pytest.mark.parametrize("repo_state", ["stash"], indirect=True)
 def test_git_stash_list(api_create_git_repo):
     """Test the git stash command to list stashed changes."""
     
     api_create_git_repo
-    test_file_name = common.create_test_file()
-
-    result = common.run_shell_command('git add .')
-    assert not result.stdout, f"Expected empty stdout, but got: {result.stdout}"
-
-    result = common.run_shell_command('git commit -m "initial commit"')
-    assert 'initial commit' in result.stdout, "Commit failed: expected message not found."
-
-    # Modify the file
-    with open(test_file_name, 'a', encoding='utf-8') as f:
-        f.write(' More content')
-
-    # Stash the changes
-    result = common.run_shell_command('git stash')
-    assert 'Saved working directory and index state WIP on main' in result.stdout, (
-        f"Expected stash save message, but got: {result.stdout}"
-    )
 
     # List the stashed changes
     result = common.run_shell_command('git stash list')
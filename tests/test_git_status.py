@@ -5,7 +5,7 @@ different scenarios.
 
 
 import config
-from helpers import common
+from helpers import common, porcelain
 
 
 def test_git_status_no_changes(api_create_git_repo):
@@ -115,3 +115,24 @@ def test_git_status_after_pushing_files(api_create_git_repo):
         "commit, working tree clean\n"
                        )
     common.compare_normalized_strings(result.stdout, expected_stdout)
+
+
+def test_git_status_porcelain_v2(api_create_git_repo):
+    """Test the machine-readable git status, independent of the platform's messages"""
+    
+    api_create_git_repo
+
+    common.create_test_file()
+    common.run_shell_command('git add .')
+    with open('untracked.txt', 'w', encoding='utf-8') as f:
+        f.write('untracked')
+
+    records = list(porcelain.status())
+    headers = {record.key: record.value for record in records
+               if isinstance(record, porcelain.StatusHeader)}
+    entries = [record for record in records if isinstance(record, porcelain.StatusEntry)]
+
+    assert headers['branch.head'] == config.DEFAULT_BRANCH, f"Got headers: {headers}"
+    assert [(entry.kind, entry.xy, entry.path) for entry in entries] == [
+        ('1', 'A.', config.TEST_FILE_NAME), ('?', None, 'untracked.txt')
+    ], f"Got entries: {entries}"
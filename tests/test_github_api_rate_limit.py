@@ -0,0 +1,67 @@
+"""
+Test suite for validating that the GitHub API helpers respect the rate limits signalled by
+the X-RateLimit-* and Retry-After headers, using a local stand-in that emits them.
+"""
+
+import time
+import pytest
+import config
+from helpers import common, git_utils, local_github, rate_limit
+
+
+@pytest.fixture
+def rate_limited_server(monkeypatch):
+    """
+    Fixture to start a local GitHub stand-in with a small rate limit window and route the
+    API helpers to it through a fresh rate limit governor
+    """
+    server = local_github.LocalGitHubServer(rate_limit=3, rate_limit_window=2)
+    server.start()
+    monkeypatch.setattr(config, "GH_API_URL", server.base_url)
+    monkeypatch.setattr(config, "GH_USERNAME", config.GH_USERNAME or "local-user")
+    monkeypatch.setattr(
+        git_utils, "_rate_governor", rate_limit.RateLimitGovernor(rate=0, burst=1, low_water=0)
+    )
+
+    yield server
+
+    server.stop()
+
+
+def test_api_waits_for_quota_reset(rate_limited_server):
+    """Test that calls over the quota wait for the reset instead of failing."""
+
+    rate_limited_server
+    repo_names = [common.generate_repo_name() for _ in range(4)]
+
+    start = time.monotonic()
+    for repo_name in repo_names:
+        response = git_utils.api_create_github_repo(repo_name)
+        assert response.status_code == 201, f"Expected 201 but got {response.status_code}"
+
+    assert time.monotonic() - start >= 0.5, "Expected the fourth call to wait for the reset."
+
+
+def test_api_honors_retry_after(rate_limited_server):
+    """Test that a secondary rate limit holds the calls back for the Retry-After period."""
+
+    rate_limited_server.throttle(1)
+
+    start = time.monotonic()
+    response = git_utils.api_create_github_repo(common.generate_repo_name())
+
+    assert response.status_code == 201, f"Expected 201 but got {response.status_code}"
+    assert time.monotonic() - start >= 0.9, "Expected the call to wait for Retry-After."
+
+
+def test_governor_paces_requests():
+    """Test that the token bucket spreads requests at the configured rate after a burst."""
+
+    governor = rate_limit.RateLimitGovernor(rate=20, burst=2, low_water=0)
+
+    start = time.monotonic()
+    for _ in range(12):
+        governor.acquire()
+
+    # 2 requests go out as a burst, the remaining 10 at 20 per second
+    assert time.monotonic() - start >= 0.45, "Expected the requests to be paced."
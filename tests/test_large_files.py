@@ -0,0 +1,49 @@
+"""
+Test suite for validating the large file generators used by the throughput scenarios.
+"""
+
+import os
+import zlib
+import pytest
+from helpers import large_files
+
+SIZE = 3 * large_files.CHUNK_SIZE + 123
+
+
+def test_sparse_file_is_not_allocated(tmp_path):
+    """Test that a sparse file has the requested size without its blocks allocated."""
+
+    path = large_files.create_sparse_file(str(tmp_path / "sparse.bin"), SIZE)
+
+    assert os.path.getsize(path) == SIZE
+    if hasattr(os.stat(path), "st_blocks"):
+        assert os.stat(path).st_blocks * 512 < SIZE, "Expected the file to be sparse."
+
+
+def test_allocated_file_has_requested_size(tmp_path):
+    """Test that a preallocated file has the requested size."""
+
+    path = large_files.create_allocated_file(str(tmp_path / "allocated.bin"), SIZE)
+
+    assert os.path.getsize(path) == SIZE
+
+
+@pytest.mark.parametrize("content, max_ratio", [
+    (large_files.COMPRESSIBLE, 0.1), (large_files.INCOMPRESSIBLE, 1.1), (large_files.ZEROS, 0.1)
+])
+def test_chunked_file_content(tmp_path, content, max_ratio):
+    """Test that the chunked writer produces the requested size and compressibility."""
+
+    path = large_files.create_file(str(tmp_path / f"{content}.bin"), SIZE, content)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert len(data) == SIZE
+    assert len(zlib.compress(data[:large_files.CHUNK_SIZE], 1)) < max_ratio * large_files.CHUNK_SIZE
+    if content != large_files.ZEROS:
+        step = large_files.CHUNK_SIZE
+        chunks = {data[index:index + step] for index in range(0, SIZE, step)}
+        assert len(chunks) == 4, "Expected every chunk of the file to be different."
+    if content == large_files.INCOMPRESSIBLE:
+        assert data[8:4096] != data[large_files.CHUNK_SIZE + 8:large_files.CHUNK_SIZE + 4096], \
+            "Expected fresh random bytes past the start of every chunk."
@@ -0,0 +1,72 @@
+"""
+Test suite for validating the clone/fetch load generator against the local GitHub stand-in.
+"""
+
+import os
+import subprocess
+import pytest
+import config
+from benchmarks import load
+from helpers import local_github, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=200, commits=10, changes_per_commit=5, seed=24)
+
+
+def test_load_result_summaries():
+    """Test the latencies, throughput, timeline and histogram of a set of operations."""
+
+    operations = [
+        {"kind": load.CLONE, "arrival": 0.0, "start": 0.0, "end": 0.005, "ok": True},
+        {"kind": load.CLONE, "arrival": 0.5, "start": 0.6, "end": 1.2, "ok": True},
+        {"kind": load.FETCH, "arrival": 1.0, "start": 1.0, "end": 1.03, "ok": True},
+        {"kind": load.FETCH, "arrival": 1.5, "start": 1.5, "end": 1.6, "ok": False},
+    ]
+    result = load.LoadResult(operations, duration=2.0, samples=[])
+
+    clones = result.latencies(load.CLONE)
+    assert [round(latency, 3) for latency in clones] == [0.005, 0.7], f"Got: {clones}"
+    assert result.failures == 1, f"Expected the failed fetch to be counted: {result.failures}"
+    assert result.throughput == 1.5, f"Expected 3 operations in 2s: {result.throughput}"
+    assert result.timeline(1.0) == [1.0, 2.0, 0.0], f"Got: {result.timeline(1.0)}"
+    counts = load.histogram(clones)
+    assert counts["10"] == 1 and counts["1000"] == 1 and sum(counts.values()) == 2, \
+        f"Expected the clones in the 10 ms and 1 s buckets: {counts}"
+    assert load.histogram([60.0])["+inf"] == 1, "Expected the open bucket past the last bound."
+
+
+def test_process_tree_sampler_measures_own_process():
+    """Test that the /proc fields of the sampler give a CPU time and RSS for this process."""
+
+    sampler = load.ProcessTreeSampler(os.getpid())
+    if not sampler.available:
+        pytest.skip("The process tree is only sampled from /proc")
+    cpu, rss = sampler.measure()
+    assert cpu > 0, f"Expected this process to have used CPU time: {cpu}"
+    assert rss > 1024 * 1024, f"Expected this process to be resident: {rss}"
+
+
+def test_closed_loop_load_clones_and_fetches(tmp_path):
+    """Test that a short closed-loop run clones and fetches without failures."""
+
+    source = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+    stale = load.make_stale_repo(source, str(tmp_path / "stale.git"), behind=3)
+    behind = subprocess.run(['git', '-C', stale, 'rev-list', '--count', config.DEFAULT_BRANCH],
+                            check=True, capture_output=True, text=True).stdout
+    assert int(behind) == SPEC.commits - 3, f"Expected the copy 3 commits behind: {behind}"
+
+    server = local_github.LocalGitHubServer(repo_root=str(tmp_path / "server"))
+    server.start()
+    try:
+        subprocess.run(['git', 'clone', '--quiet', '--bare', source,
+                        server.repo_path("load", "repo")], check=True)
+        operations, duration = load.run_load(f"{server.base_url}/load/repo.git",
+                                             str(tmp_path), stale, duration=1.5, concurrency=2,
+                                             fetch_ratio=0.5, seed=3)
+    finally:
+        server.stop()
+
+    result = load.LoadResult(operations, duration, [])
+    assert result.failures == 0, f"Expected no failed operations: {result.to_dict()}"
+    assert result.latencies(load.CLONE) and result.latencies(load.FETCH), \
+        f"Expected both clones and fetches: {result.to_dict()}"
+    assert duration >= 1.5, f"Expected the run to last the requested duration: {duration}"
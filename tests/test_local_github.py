@@ -0,0 +1,62 @@
+"""
+Test suite for validating the REST endpoints of the local GitHub stand-in.
+"""
+
+import http.client
+import urllib.parse
+import requests
+import config
+from helpers import local_github
+
+
+def test_repo_names_cannot_escape_the_repo_root(tmp_path, monkeypatch):
+    """Test that repo names reaching out of the repo root are rejected by the API."""
+
+    monkeypatch.setattr(config, "GH_USERNAME", config.GH_USERNAME or "local-user")
+    victim = tmp_path / "server" / "victim.git"
+    victim.mkdir(parents=True)
+    server = local_github.LocalGitHubServer(repo_root=str(tmp_path / "server" / "repos"))
+    server.start()
+    try:
+        valid = requests.post(f"{server.base_url}/user/repos", json={"name": "a-b_c.d"},
+                              timeout=10)
+        deletion = requests.delete(f"{server.base_url}/repos/{config.GH_USERNAME}/"
+                                   "..%2F..%2Fvictim", timeout=10)
+        creation = requests.post(f"{server.base_url}/user/repos", json={"name": "../../escaped"},
+                                 timeout=10)
+        dots = requests.post(f"{server.base_url}/user/repos", json={"name": ".."}, timeout=10)
+    finally:
+        server.stop()
+
+    assert deletion.status_code == 404, f"Expected 404 but got {deletion.status_code}"
+    assert victim.is_dir(), "Expected the directory outside the repo root to be left alone."
+    assert creation.status_code == 422 and dots.status_code == 422, \
+        f"Expected 422 but got {creation.status_code} and {dots.status_code}"
+    assert not any(tmp_path.glob("**/escaped*")), "Expected no repo outside the repo root."
+    assert valid.status_code == 201, f"Expected a valid name to be created: {valid.text}"
+
+
+def test_git_responses_keep_the_connection_alive(tmp_path):
+    """Test that the git transport responses leave the connection open for the next request."""
+
+    server = local_github.LocalGitHubServer(repo_root=str(tmp_path / "server"))
+    server.start()
+    server.create_repo("owner", "repo")
+    connection = http.client.HTTPConnection(urllib.parse.urlsplit(server.base_url).netloc,
+                                            timeout=10)
+    try:
+        sockets, advertisements = set(), []
+        for _ in range(3):
+            connection.request("GET", "/owner/repo.git/info/refs?service=git-upload-pack")
+            response = connection.getresponse()
+            advertisements.append(response.read())
+            sockets.add(connection.sock)
+    finally:
+        connection.close()
+        server.stop()
+
+    assert len(sockets) == 1 and None not in sockets, \
+        f"Expected the requests to share one open connection: {sockets}"
+    for advertisement in advertisements:
+        assert b"# service=git-upload-pack" in advertisement, \
+            f"Expected a ref advertisement: {advertisement[:100]}"
@@ -0,0 +1,39 @@
+"""
+Test suite for validating that the network emulator relays git's smart-HTTP traffic under the
+latency and bandwidth of its profile.
+"""
+
+import time
+from helpers import common, local_github, net_emulator, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=200, commits=3, changes_per_commit=5, seed=21)
+
+
+def test_clone_through_emulator_is_delayed_and_paced(tmp_path):
+    """Test that a clone through the emulator succeeds and takes the profile's delays."""
+
+    profile = net_emulator.NetworkProfile(down_bandwidth=256 * 1024, latency=0.05)
+    server = local_github.LocalGitHubServer(repo_root=str(tmp_path / "server"))
+    server.start()
+    emulator = net_emulator.NetworkEmulator(server.base_url, profile, seed=1)
+    emulator.start()
+    try:
+        source = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+        common.run_shell_command(
+            f'git clone --quiet --bare "{source}" "{server.repo_path("owner", "repo")}"'
+        )
+        start = time.monotonic()
+        common.run_shell_command(f'git clone --quiet {emulator.base_url}/owner/repo.git '
+                                 f'"{tmp_path / "clone"}"')
+        elapsed = time.monotonic() - start
+    finally:
+        emulator.stop()
+        server.stop()
+
+    summary = emulator.summary()
+    assert summary["connections"] >= 1, "Expected git to connect through the emulator."
+    assert summary["down"] > 0 and summary["up"] > 0, f"Expected traffic both ways: {summary}"
+    # Each smart-HTTP request pays the one-way latency at least once in each direction, and
+    # the response bytes cannot arrive faster than the bandwidth cap
+    minimum = max(2 * 2 * profile.latency, summary["down"] / profile.down_bandwidth)
+    assert elapsed >= minimum * 0.9, f"Expected the clone to take {minimum:.2f}s: {elapsed:.2f}s"
@@ -0,0 +1,62 @@
+"""
+Test suite for validating the pure-Python object store reader against repos written by git.
+"""
+
+import hashlib
+import pytest
+import config
+from helpers import common, object_store, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=300, commits=40, changes_per_commit=10, seed=9)
+
+
+def _object_id(obj_type: str, data: bytes) -> str:
+    return hashlib.sha1(f"{obj_type} {len(data)}".encode() + b"\0" + data).hexdigest()
+
+
+@pytest.mark.parametrize("repack", ["", "git repack -adf --depth=50 --window=50",
+                                    "git repack -adq && mv objects/pack/pack-*.pack pack.tmp && "
+                                    "rm -f objects/pack/* && git unpack-objects -q < pack.tmp && "
+                                    "rm pack.tmp"])
+def test_object_store_reads_every_object(tmp_path, repack):
+    """Test that every object (loose, packed or deltified) reads back to its object id."""
+
+    repo_path = str(tmp_path / "repo.git")
+    common.run_shell_command(f'git clone --quiet --bare --no-local '
+                             f'"{repo_generator.get_generated_repo(SPEC, str(tmp_path))}" '
+                             f'"{repo_path}"')
+    if repack:
+        common.run_shell_command(repack.replace('git ', 'git --git-dir=. '), cwd=repo_path)
+    expected = common.run_shell_command(
+        'git cat-file --batch-all-objects --batch-check="%(objectname)"', cwd=repo_path,
+        with_logging=False
+    ).stdout.split()
+    assert expected, "Expected git to list the objects of the repo."
+
+    with object_store.ObjectStore(repo_path) as store:
+        oids = set(store.oids())
+        for oid in expected:
+            assert _object_id(*store.read(oid)) == oid, f"Object {oid} read back corrupted."
+
+    assert oids == set(expected), "Expected the store to list exactly git's objects."
+
+
+@pytest.mark.skipif(not config.GH_LOCAL_SERVER, reason="Needs the bundled local GitHub stand-in")
+def test_pushed_commits_in_remote_store(api_create_git_repo, local_github_server,
+                                        get_repo_name):
+    """Test that the remote bare repo holds every pushed commit, read without spawning git."""
+
+    api_create_git_repo
+    for index in range(5):
+        with open(config.TEST_FILE_NAME, 'a', encoding='utf-8') as f:
+            f.write(f"change {index}\n")
+        common.run_shell_command(f'git add . && git commit --quiet -m "commit {index}"')
+    common.run_shell_command(f'git push --quiet origin {config.DEFAULT_BRANCH}')
+    local_head = common.run_shell_command('git rev-parse HEAD').stdout.strip()
+
+    remote_path = local_github_server.repo_path(config.GH_USERNAME, get_repo_name)
+    with object_store.ObjectStore(remote_path) as store:
+        assert store.resolve_ref(f"refs/heads/{config.DEFAULT_BRANCH}") == local_head
+        commits = list(store.walk_commits(local_head))
+
+    assert len(commits) == 5, f"Expected the 5 pushed commits, but got: {commits}"
@@ -0,0 +1,37 @@
+"""
+Test suite for validating the streaming, bounded-memory output capture of shell commands.
+"""
+
+from helpers import output_stream, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=200, commits=300, changes_per_commit=2, seed=11)
+
+
+def test_stream_keeps_bounded_head_and_tail(tmp_path):
+    """Test that a streamed 'git log' yields every line but keeps only its head and tail."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+
+    with output_stream.stream_shell_command(f'git --git-dir="{repo_path}" log --oneline',
+                                            head_lines=5, tail_lines=5) as stream:
+        count = sum(1 for _ in stream)
+
+    assert count == stream.lines == 300, f"Expected 300 log lines, but got: {count}"
+    assert len(stream.head) == 5 and len(stream.tail) == 5, "Expected a bounded head and tail."
+    assert stream.returncode == 0, f"Expected return code 0, but got: {stream.returncode}"
+
+
+def test_stream_stops_on_match(tmp_path):
+    """Test that the command is stopped as soon as all the matchers matched."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+
+    stream = output_stream.run_streamed(
+        f'git --git-dir="{repo_path}" log --format=%s',
+        [output_stream.Contains("commit 299"), output_stream.Matches(r"^commit \d+$")],
+        head_lines=1, tail_lines=1
+    )
+
+    assert stream.matched, f"Expected all the matchers to match, got: {stream.matchers}"
+    assert stream.stopped and stream.lines < 300, f"Expected an early stop at {stream.lines}"
+    assert len(stream.tail) <= 1, "Expected only a bounded tail to be kept."
@@ -0,0 +1,87 @@
+"""
+Test suite for validating the streaming parsers of git's porcelain output.
+"""
+
+import itertools
+import os
+import sys
+import time
+from helpers import command_metrics, common, porcelain, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=500, commits=5, changes_per_commit=3, branches=3, tags=2,
+                               seed=5)
+
+
+def test_status_streams_every_entry(tmp_path):
+    """Test that the porcelain v2 status lists every modified and untracked file."""
+
+    repo_path = repo_generator.clone_generated_repo(SPEC, str(tmp_path / "repo"))
+    for index in range(0, SPEC.files, 5):
+        with open(os.path.join(repo_path, repo_generator.generated_file_path(SPEC, index)), 'a',
+                  encoding='utf-8') as f:
+            f.write("change\n")
+    with open(os.path.join(repo_path, "new file.txt"), 'w', encoding='utf-8') as f:
+        f.write("new\n")
+
+    entries = [record for record in porcelain.status(repo_path)
+               if isinstance(record, porcelain.StatusEntry)]
+
+    assert len([entry for entry in entries if entry.xy == '.M']) == SPEC.files // 5
+    assert [entry.path for entry in entries if entry.kind == '?'] == ["new file.txt"]
+
+
+def test_refs_streamed(tmp_path):
+    """Test that for-each-ref lists the branches and tags with the checked out branch."""
+
+    repo_path = repo_generator.clone_generated_repo(SPEC, str(tmp_path / "repo"))
+
+    refs = list(porcelain.refs(cwd=repo_path))
+    branches = [ref for ref in refs if ref.name.startswith('refs/heads/')]
+    tags = [ref for ref in refs if ref.name.startswith('refs/tags/')]
+
+    assert len(tags) == 2, f"Got refs: {refs}"
+    assert [ref.name for ref in branches if ref.head] == ['refs/heads/main'], f"Got: {branches}"
+    assert all(ref.type == 'commit' and len(ref.object) == 40 for ref in branches)
+
+
+def test_stashes_streamed(tmp_path):
+    """Test that the stash entries are listed with their index, most recent first."""
+
+    repo_path = repo_generator.clone_generated_repo(SPEC, str(tmp_path / "repo"))
+    readme = os.path.join(repo_path, repo_generator.generated_file_path(SPEC, 0))
+    for message in ("first", "second"):
+        with open(readme, 'a', encoding='utf-8') as f:
+            f.write(f"{message}\n")
+        common.run_shell_command(f'git stash push --quiet -m "{message}"', cwd=repo_path)
+
+    stashes = list(porcelain.stashes(repo_path))
+
+    assert [(stash.index, stash.subject) for stash in stashes] == [
+        (0, "On main: second"), (1, "On main: first")
+    ], f"Got stashes: {stashes}"
+
+
+def test_abandoned_stream_kills_command(request):
+    """Test that closing a stream early kills its command, with its children, and records it."""
+
+    # The trailing command keeps the shell from exec'ing python, which runs as its child and
+    # stays blocked once its records are out, so only a kill can end it
+    command = (f'"{sys.executable}" -c "import os, time; print(os.getpid()); '
+               f'print(3 * \'record\\n\', flush=True); time.sleep(60)"; true')
+    records = porcelain.stream_records(command,
+                                       lambda chunks: porcelain.split_records(chunks, b"\n"))
+
+    child = int(next(records))
+    first = list(itertools.islice(records, 3))
+    records.close()
+
+    assert first == [b"record"] * 3, f"Got records: {first}"
+    entry = command_metrics.pop_records(request.node.nodeid)[-1]
+    assert entry["returncode"] != 0, f"Expected the command to be killed: {entry}"
+    time.sleep(0.2)
+    try:
+        with open(f"/proc/{child}/stat", encoding='utf-8') as f:
+            state = f.read().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        state = None
+    assert state in (None, "Z"), f"Expected the child of the shell to be killed: {state}"
@@ -0,0 +1,29 @@
+"""
+Test suite for validating concurrent pushes to one remote on the local GitHub stand-in.
+"""
+
+import config
+from benchmarks import contention
+from helpers import local_github, object_store
+
+
+def test_concurrent_pushes_all_land(tmp_path):
+    """Test that racing clients retry until every commit of every client is on the remote."""
+
+    server = local_github.LocalGitHubServer(repo_root=str(tmp_path / "server"))
+    server.start()
+    try:
+        result = contention.run(server, str(tmp_path), clients=4, pushes=3,
+                                shared_fraction=0.5, repo_name="contention")
+    finally:
+        server.stop()
+
+    assert result.failures == 0, f"Expected no failed pushes, but got: {result.to_dict()}"
+    assert result.pushes == 12, f"Expected all 12 pushes to succeed, but got: {result.pushes}"
+    with object_store.ObjectStore(server.repo_path("stress", "contention")) as store:
+        shared = list(store.walk_commits(store.resolve_ref(f"refs/heads/{config.DEFAULT_BRANCH}")))
+        own = [list(store.walk_commits(store.resolve_ref(f"refs/heads/client-{index}")))
+               for index in (2, 3)]
+    # The initial commit and the 3 commits of each of the 2 clients racing on the default branch
+    assert len(shared) == 7, f"Expected 7 commits on {config.DEFAULT_BRANCH}: {len(shared)}"
+    assert [len(commits) for commits in own] == [4, 4], "Expected 3 commits per own branch."
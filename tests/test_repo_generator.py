@@ -0,0 +1,53 @@
+"""
+Test suite for validating the synthetic repo generator built on 'git fast-import'.
+"""
+
+import os
+from helpers import common, repo_generator
+
+SPEC = repo_generator.RepoSpec(files=50, commits=5, changes_per_commit=3, branches=2, tags=2,
+                               seed=7)
+
+
+def _head(repo_path: str) -> str:
+    result = common.run_shell_command(f'git --git-dir="{repo_path}" rev-parse HEAD')
+    return result.stdout.strip()
+
+
+def test_generated_repo_is_deterministic(tmp_path):
+    """Test that the same spec yields the same history in separate caches."""
+
+    first = repo_generator.get_generated_repo(SPEC, str(tmp_path / "first"))
+    second = repo_generator.get_generated_repo(SPEC, str(tmp_path / "second"))
+
+    assert _head(first) == _head(second), "Expected identical history for the same spec."
+
+
+def test_generated_repo_shape(tmp_path):
+    """Test that the generated repo has the requested files, commits, branches and tags."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+
+    result = common.run_shell_command(f'git --git-dir="{repo_path}" rev-list --count HEAD')
+    assert result.stdout.strip() == "5", f"Expected 5 commits, but got: {result.stdout}"
+
+    result = common.run_shell_command(f'git --git-dir="{repo_path}" ls-tree -r --name-only HEAD')
+    assert len(result.stdout.split()) == 50, "Expected 50 files in the head commit."
+
+    result = common.run_shell_command(
+        f'git --git-dir="{repo_path}" for-each-ref --format="%(refname)"'
+    )
+    refs = result.stdout.split()
+    assert len([ref for ref in refs if ref.startswith('refs/tags/')]) == 2, f"Got refs: {refs}"
+    assert len([ref for ref in refs if ref.startswith('refs/heads/')]) == 3, f"Got refs: {refs}"
+
+
+def test_generated_repo_is_cached(tmp_path):
+    """Test that a spec already in the cache is not generated again."""
+
+    repo_path = repo_generator.get_generated_repo(SPEC, str(tmp_path))
+    marker = os.path.join(repo_path, 'generator-spec.json')
+    mtime = os.path.getmtime(marker)
+
+    assert repo_generator.get_generated_repo(SPEC, str(tmp_path)) == repo_path
+    assert os.path.getmtime(marker) == mtime, "Expected the cached repo to be reused."
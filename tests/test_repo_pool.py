@@ -0,0 +1,103 @@
+"""
+Test suite for validating the batch repo API helpers and the remote repo pool against the local
+GitHub stand-in.
+"""
+
+import os
+import pytest
+import requests
+import config
+from helpers import common, git_utils, repo_pool
+
+pytestmark = pytest.mark.skipif(not config.GH_LOCAL_SERVER,
+                                reason="Needs the bundled local GitHub stand-in")
+
+
+def test_batch_create_and_delete_repos(local_github_server):
+    """Test that the batch helpers create and delete every repo and report each one."""
+
+    repo_names = [common.generate_repo_name() for _ in range(5)]
+
+    created = dict(git_utils.api_create_github_repos(repo_names, max_workers=3))
+    existed = [os.path.isdir(local_github_server.repo_path(config.GH_USERNAME, name))
+               for name in repo_names]
+    deleted = dict(git_utils.api_delete_github_repos(repo_names + ["no-such-repo"]))
+
+    assert sorted(created) == sorted(repo_names), f"Expected a result per repo: {created}"
+    assert all(response.status_code == 201 for response in created.values()), f"Got: {created}"
+    assert all(existed), "Expected every repo to exist on the server."
+    assert isinstance(deleted.pop("no-such-repo"), requests.exceptions.HTTPError), \
+        "Expected the failed deletion to be reported as its error."
+    assert all(response.status_code == 204 for response in deleted.values()), f"Got: {deleted}"
+    assert not any(os.path.isdir(local_github_server.repo_path(config.GH_USERNAME, name))
+                   for name in repo_names), "Expected every repo to be deleted."
+
+
+def test_pool_provision_failure_deletes_created_repos(local_github_server, monkeypatch):
+    """Test that a failed provisioning deletes the repos the batch did create."""
+
+    taken = common.generate_repo_name()
+    git_utils.api_create_github_repo(taken)
+    names = iter([common.generate_repo_name(), common.generate_repo_name(), taken])
+    created = []
+
+    def generate_repo_name():
+        created.append(next(names))
+        return created[-1]
+
+    monkeypatch.setattr(common, "generate_repo_name", generate_repo_name)
+    pool = repo_pool.RemoteRepoPool(3)
+    try:
+        with pytest.raises(requests.exceptions.HTTPError):
+            pool.provision()
+        leftovers = [name for name in created
+                     if os.path.isdir(local_github_server.repo_path(config.GH_USERNAME, name))]
+    finally:
+        git_utils.api_delete_github_repo(taken)
+
+    assert leftovers == [taken], f"Expected only the existing repo to be left: {leftovers}"
+
+
+def test_pool_release_survives_failed_replacement(local_github_server, monkeypatch):
+    """Test that a repo that can be neither reset nor deleted is dropped, then deleted on close."""
+
+    pool = repo_pool.RemoteRepoPool(1)
+    pool.provision()
+    repo_name = pool.acquire()
+
+    def fail_deletion(name):
+        raise requests.exceptions.HTTPError(f"Repo deletion failed: {name}")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pool, "_reset", lambda name: False)
+        patch.setattr(git_utils, "api_delete_github_repo", fail_deletion)
+        pool.release(repo_name)
+    replacement = pool.acquire()
+    pool.close()
+
+    assert replacement != repo_name, "Expected the failed repo not to be handed out again."
+    assert not any(os.path.isdir(local_github_server.repo_path(config.GH_USERNAME, name))
+                   for name in (repo_name, replacement)), "Expected close to delete both repos."
+
+
+def test_pool_release_empties_pushed_repo(tmp_path):
+    """Test that a released repo with pushed branches and tags is emptied and leased again."""
+
+    pool = repo_pool.RemoteRepoPool(1)
+    pool.provision()
+    repo_name = pool.acquire()
+    repo_url = f"{config.GH_URL}/{config.GH_USERNAME}/{repo_name}.git"
+    try:
+        common.run_shell_command(f'git init --quiet "{tmp_path}"')
+        common.run_shell_command('git commit --quiet --allow-empty -m "pushed"', cwd=str(tmp_path))
+        common.run_shell_command('git tag v1 && git branch other', cwd=str(tmp_path))
+        common.run_shell_command(f'git push --quiet {repo_url} --all && git push --quiet '
+                                 f'{repo_url} --tags', cwd=str(tmp_path))
+        pool.release(repo_name)
+        leased_again = pool.acquire()
+        refs = common.run_shell_command(f'git ls-remote {repo_url}').stdout
+    finally:
+        pool.close()
+
+    assert leased_again == repo_name, "Expected the emptied repo to be leased again."
+    assert not refs, f"Expected no refs left on the remote, but got: {refs}"